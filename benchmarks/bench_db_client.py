@@ -0,0 +1,59 @@
+"""
+Requests/sec of the API with a Motor client per request (old ContextDb)
+versus the shared client opened once per worker.
+
+Usage: python -m benchmarks.bench_db_client --requests 500 --concurrency 20
+(needs DATABASE_URI in .env, like the app itself)
+"""
+from argparse import ArgumentParser
+from asyncio import Semaphore, gather, run
+from time import perf_counter
+
+from httpx import AsyncClient
+
+from main import app
+from server.database import ContextDb, get_db, shared_db
+
+
+async def get_db_per_request():
+    with ContextDb() as db:
+        yield db
+
+
+async def run_mode(mode: str, total: int, concurrency: int) -> float:
+    if mode == "per_request":
+        app.dependency_overrides[get_db] = get_db_per_request
+    else:
+        app.dependency_overrides.pop(get_db, None)
+
+    semaphore = Semaphore(concurrency)
+
+    async def one_request(client):
+        async with semaphore:
+            await client.get("/user/bench_unexisting_id")
+
+    async with AsyncClient(app=app, base_url="http://bench") as client:
+        await one_request(client)
+        start = perf_counter()
+        await gather(*(one_request(client) for _ in range(total)))
+        elapsed = perf_counter() - start
+
+    app.dependency_overrides.pop(get_db, None)
+    return total / elapsed
+
+
+async def main(total: int, concurrency: int):
+    results = {}
+    for mode in ("per_request", "shared"):
+        results[mode] = await run_mode(mode, total, concurrency)
+        print(f"{mode:<12} {results[mode]:>10.1f} req/s")
+    print(f"speedup      {results['shared'] / results['per_request']:>10.2f}x")
+    shared_db.disconnect_db()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    run(main(args.requests, args.concurrency))
@@ -0,0 +1,552 @@
+"""
+Throughput and p50/p95/p99 latency of every router (user, products, address,
+cart and cart item) through an ASGI client, with the in-memory backend seeded
+at realistic sizes: 100k users, 50k products and carts with 1 to 200 items.
+
+The results can be saved as a JSON baseline; the next runs compare with it and
+exit with status 1 when an endpoint regresses more than --max-regression
+percent in --metric (p95 by default) or returns a higher error rate. Failed
+requests (4xx/5xx) only count in the error rate, never in the latencies or the
+throughput, so an endpoint that starts failing fast is not an improvement.
+With --errors-only the latency regressions are still shown but only a higher
+error rate fails the run.
+
+The CI workflow keeps the baseline of the last push to Main in the GitHub
+Actions cache and compares the pull requests with it. Short runs on shared
+runners are too noisy to gate on p95, so the CI only fails on more errors and
+publishes the table in the job summary.
+
+Usage: python -m benchmarks.bench_routes --save
+       python -m benchmarks.bench_routes --max-regression 15
+       python -m benchmarks.bench_routes --scale 0.05 --requests 50 (quick run)
+(no database needed)
+"""
+from argparse import ArgumentParser
+from asyncio import Semaphore, gather, run
+from datetime import datetime
+from gc import collect, freeze
+from json import dump, load
+from os import path
+from random import Random
+from time import perf_counter
+
+from httpx import AsyncClient
+
+from benchmarks.latency import latency_summary
+from main import app
+from server.database import DataBase, RequestDataBase, get_db
+from server.migrations import apply_migrations
+from utils.ids import new_id
+from utils.normalize_email import email_domain
+
+DEFAULT_BASELINE = path.join(path.dirname(__file__), "routes_baseline.json")
+SEED_CHUNK_SIZE = 5000
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "throughput")
+DOMAINS = [f"loja{n}.com.br" for n in range(50)]
+
+
+def fake_address(rng: Random) -> dict:
+    return {
+        "street": f"Rua {rng.randint(1, 9999)}",
+        "zipcode": f"{rng.randint(0, 99999):05d}-{rng.randint(0, 999):03d}",
+        "district": "East Zone",
+        "city": "GG",
+        "state": "SS",
+        "is_delivery": True,
+    }
+
+
+def fake_user(rng: Random, index: int) -> dict:
+    # mesmo formato que o create_user grava
+    email = f"cliente{index}@{rng.choice(DOMAINS)}"
+    return {
+        "_id": new_id(),
+        "name": f"Cliente {index % 5000}",
+        "email": email,
+        "email_domain": email_domain(email),
+        "pwd": "**********",
+        "address": [fake_address(rng)],
+    }
+
+
+def fake_product(rng: Random, index: int) -> dict:
+    return {
+        "_id": new_id(),
+        "name": f"Produto {index}",
+        "description": "Doce gelado de morango",
+        "price": round(rng.uniform(1, 500), 2),
+    }
+
+
+async def insert_chunks(collection, documents: list) -> None:
+    for start in range(0, len(documents), SEED_CHUNK_SIZE):
+        end = start + SEED_CHUNK_SIZE
+        await collection.insert_many(documents[start:end], ordered=False)
+
+
+async def seed(
+    database, rng: Random, users: int, products: int, carts: int, max_items: int
+):
+    """
+    Fills the collections and returns the ids the scenarios draw from
+    """
+
+    user_documents = [fake_user(rng, index) for index in range(users)]
+    product_documents = [fake_product(rng, index) for index in range(products)]
+    cart_documents, item_documents = [], []
+    for user in rng.sample(user_documents, min(carts, users)):
+        cart = {
+            "_id": new_id(),
+            "user": user,
+            "paid": False,
+            "create": datetime.now().isoformat(),
+            "address": user["address"][0],
+            "authority": "",
+        }
+        items = [
+            {
+                "_id": new_id(),
+                "cart_id": cart["_id"],
+                "product": product,
+                "quantity": (quantity := rng.randint(1, 5)),
+                "item_price": round(product["price"] * quantity, 2),
+            }
+            for product in rng.sample(
+                product_documents, min(rng.randint(1, max_items), products)
+            )
+        ]
+        cart["price"] = round(sum(item["item_price"] for item in items), 2)
+        cart["items_quantity"] = sum(item["quantity"] for item in items)
+        cart_documents.append(cart)
+        item_documents.extend(items)
+
+    await insert_chunks(database.users_collection, user_documents)
+    await insert_chunks(database.product_collection, product_documents)
+    await insert_chunks(database.cart_collection, cart_documents)
+    await insert_chunks(database.cart_items_collection, item_documents)
+
+    cart_user_ids = {cart["user"]["_id"] for cart in cart_documents}
+    return {
+        "users": [user for user in user_documents if user["_id"] not in cart_user_ids],
+        "products": product_documents,
+        "carts": cart_documents,
+        "items": item_documents,
+        "added_addresses": [],
+    }
+
+
+# cada cenário: (endpoint, função que recebe o dataset e o Random e devolve
+# method, url e json). A ordem importa: os deletes vêm depois do que leem.
+def user_scenarios():
+    return [
+        (
+            "POST /user/",
+            lambda d, r: (
+                "POST",
+                "/user/",
+                {
+                    "name": "Bruna",
+                    "email": f"nova{new_id()[:8]}@gmail.com",
+                    "pwd": "265",
+                },
+            ),
+        ),
+        ("GET /user/", lambda d, r: ("GET", "/user/?page_size=50", None)),
+        (
+            "GET /user/{user_id}",
+            lambda d, r: (
+                "GET",
+                f"/user/{r.choice(d['users'])['_id']}",
+                None,
+            ),
+        ),
+        (
+            "GET /user/batch",
+            lambda d, r: (
+                "GET",
+                "/user/batch?ids="
+                + ",".join(u["_id"] for u in r.sample(d["users"], 20)),
+                None,
+            ),
+        ),
+        (
+            "GET /user/name/{user_name}",
+            lambda d, r: (
+                "GET",
+                f"/user/name/{r.choice(d['users'])['name']}",
+                None,
+            ),
+        ),
+        (
+            "GET /user/emails/",
+            lambda d, r: (
+                "GET",
+                f"/user/emails/?domain_name={r.choice(DOMAINS)}",
+                None,
+            ),
+        ),
+        (
+            "GET /user/emails/domains",
+            lambda d, r: (
+                "GET",
+                "/user/emails/domains",
+                None,
+            ),
+        ),
+        (
+            "PUT /user/{user_id}",
+            lambda d, r: (
+                "PUT",
+                f"/user/{r.choice(d['users'])['_id']}",
+                {"name": f"Cliente {r.randint(0, 99999)}"},
+            ),
+        ),
+    ]
+
+
+def product_scenarios():
+    return [
+        (
+            "POST /products/",
+            lambda d, r: (
+                "POST",
+                "/products/",
+                {
+                    "name": "Sabonete",
+                    "description": "Produto de higiene",
+                    "price": 7.99,
+                },
+            ),
+        ),
+        ("GET /products/", lambda d, r: ("GET", "/products/?page_size=50", None)),
+        (
+            "GET /products/{product_id}",
+            lambda d, r: (
+                "GET",
+                f"/products/{r.choice(d['products'])['_id']}",
+                None,
+            ),
+        ),
+        (
+            "GET /products/batch",
+            lambda d, r: (
+                "GET",
+                "/products/batch?ids="
+                + ",".join(p["_id"] for p in r.sample(d["products"], 20)),
+                None,
+            ),
+        ),
+        (
+            "PUT /products/{product_id}",
+            lambda d, r: (
+                "PUT",
+                f"/products/{r.choice(d['products'])['_id']}",
+                {"price": round(r.uniform(1, 500), 2)},
+            ),
+        ),
+    ]
+
+
+def add_address(d, r):
+    user, address = r.choice(d["users"]), fake_address(r)
+    d["added_addresses"].append((user["_id"], address))
+    return "PUT", f"/user/{user['_id']}/address/", address
+
+
+def delete_address(d, r):
+    user_id, address = d["added_addresses"].pop()
+    return "DELETE", f"/user/{user_id}/address/", address
+
+
+def address_scenarios():
+    return [
+        ("PUT /user/{user_id}/address/", add_address),
+        (
+            "GET /user/{user_id}/address/",
+            lambda d, r: (
+                "GET",
+                f"/user/{r.choice(d['users'])['_id']}/address/",
+                None,
+            ),
+        ),
+        ("DELETE /user/{user_id}/address/", delete_address),
+    ]
+
+
+def cart_scenarios():
+    return [
+        (
+            "POST /cart/{user_id}",
+            lambda d, r: (
+                "POST",
+                f"/cart/{r.choice(d['users'])['_id']}",
+                {
+                    "price": 0,
+                    "paid": False,
+                    "address": fake_address(r),
+                    "authority": "",
+                },
+            ),
+        ),
+        (
+            "GET /cart/{user_id}",
+            lambda d, r: (
+                "GET",
+                f"/cart/{r.choice(d['carts'])['user']['_id']}",
+                None,
+            ),
+        ),
+        (
+            "GET /cart/{user_id}/full",
+            lambda d, r: (
+                "GET",
+                f"/cart/{r.choice(d['carts'])['user']['_id']}/full?page_size=50",
+                None,
+            ),
+        ),
+        (
+            "PUT /cart/{user_id}",
+            lambda d, r: (
+                "PUT",
+                f"/cart/{r.choice(d['carts'])['user']['_id']}",
+                {"authority": f"auth-{r.randint(0, 999)}"},
+            ),
+        ),
+    ]
+
+
+def cart_item_scenarios():
+    return [
+        (
+            "PUT /cart/{cart_id}/item/",
+            lambda d, r: (
+                "PUT",
+                f"/cart/{r.choice(d['carts'])['_id']}/item/",
+                {"product": r.choice(d["products"]), "quantity": r.randint(1, 3)},
+            ),
+        ),
+        (
+            "GET /cart/{cart_id}/item/",
+            lambda d, r: (
+                "GET",
+                f"/cart/{r.choice(d['carts'])['_id']}/item/?page_size=50",
+                None,
+            ),
+        ),
+        (
+            "GET /cart/{cart_id}/item/{product_id}",
+            lambda d, r: (
+                "GET",
+                "/cart/{cart_id}/item/{product[_id]}".format(**r.choice(d["items"])),
+                None,
+            ),
+        ),
+        (
+            "DELETE /cart/{cart_id}/item/{product_id}",
+            lambda d, r: (
+                "DELETE",
+                "/cart/{cart_id}/item/{product[_id]}".format(**r.choice(d["items"])),
+                None,
+            ),
+        ),
+    ]
+
+
+def delete_scenarios():
+    # destrutivos: por último, cada um com os seus documentos
+    return [
+        (
+            "DELETE /cart/{user_id}",
+            lambda d, r: (
+                "DELETE",
+                f"/cart/{d['carts'].pop()['user']['_id']}",
+                None,
+            ),
+        ),
+        (
+            "DELETE /user/{user_id}",
+            lambda d, r: (
+                "DELETE",
+                f"/user/{d['users'].pop()['_id']}",
+                None,
+            ),
+        ),
+    ]
+
+
+SCENARIOS = (
+    user_scenarios()
+    + product_scenarios()
+    + address_scenarios()
+    + cart_scenarios()
+    + cart_item_scenarios()
+    + delete_scenarios()
+)
+
+
+async def run_scenario(client, build, dataset, rng, total: int, concurrency: int):
+    semaphore = Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one_request(method, url, json):
+        nonlocal errors
+        async with semaphore:
+            start = perf_counter()
+            response = await client.request(method, url, json=json)
+            # erros rápidos não entram na amostra: melhorariam o p95
+            if response.status_code >= 400:
+                errors += 1
+            else:
+                latencies.append(perf_counter() - start)
+
+    # as requisições são montadas antes, fora do tempo medido
+    requests = []
+    for _ in range(total):
+        try:
+            requests.append(build(dataset, rng))
+        except IndexError:
+            # acabaram os documentos de um cenário destrutivo
+            break
+    total = len(requests)
+    start = perf_counter()
+    await gather(*(one_request(*request) for request in requests))
+    elapsed = perf_counter() - start
+    if total == 0:
+        return {"requests": 0, "errors": 0, "error_rate": 0.0, "throughput": 0.0}
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total * 100, 2),
+        # vazão só das respostas com sucesso
+        "throughput": round(len(latencies) / elapsed, 1),
+        **latency_summary(latencies),
+    }
+
+
+def regression(baseline: dict, result: dict, metric: str) -> float:
+    # variação em % no sentido ruim: latência maior ou vazão menor
+    old, new = baseline[metric], result[metric]
+    if not old:
+        return 0.0
+    change = (new - old) / old * 100
+    return -change if metric == "throughput" else change
+
+
+def error_rate(result: dict) -> float:
+    # baselines antigos não têm error_rate
+    if "error_rate" in result:
+        return result["error_rate"]
+    return result["errors"] / result["requests"] * 100 if result["requests"] else 0.0
+
+
+async def main(args):
+    rng = Random(args.seed)
+    database = DataBase()
+    database.backend = "memory"
+    database.connect_db()
+
+    async def get_bench_db():
+        yield RequestDataBase(database)
+
+    app.dependency_overrides[get_db] = get_bench_db
+    await apply_migrations(database)
+    sizes = {
+        "users": int(100_000 * args.scale),
+        "products": int(50_000 * args.scale),
+        "carts": int(args.carts * args.scale) or 1,
+        "max_items": args.max_items,
+    }
+    start = perf_counter()
+    dataset = await seed(database, rng, **sizes)
+    # os documentos semeados não são lixo: fora das coletas do GC, que senão
+    # varreriam milhões de objetos no meio das medições
+    collect()
+    freeze()
+    print(
+        f"seeded {sizes['users']} users, {sizes['products']} products, "
+        f"{len(dataset['carts'])} carts and {len(dataset['items'])} cart items "
+        f"in {perf_counter() - start:.1f}s"
+    )
+
+    baseline = None
+    if not args.save and path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = load(baseline_file)
+
+    results, regressions = {}, []
+    print(f"{'endpoint':<42} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'err':>5}")
+    async with AsyncClient(app=app, base_url="http://bench") as client:
+        for endpoint, build in SCENARIOS:
+            if args.only and not any(name in endpoint for name in args.only):
+                continue
+            await run_scenario(client, build, dataset, rng, args.warmup, 1)
+            result = await run_scenario(
+                client, build, dataset, rng, args.requests, args.concurrency
+            )
+            if result["requests"] == 0:
+                print(f"{endpoint:<42} skipped: no documents left")
+                continue
+            results[endpoint] = result
+            line = (
+                f"{endpoint:<42} {result['throughput']:>8.1f} {result['p50_ms']:>8.2f}"
+                f" {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f}"
+                f" {result['errors']:>5}"
+            )
+            if baseline and endpoint in baseline["endpoints"]:
+                endpoint_baseline = baseline["endpoints"][endpoint]
+                change = regression(endpoint_baseline, result, args.metric)
+                line += f" {change:>+7.1f}%"
+                more_errors = error_rate(result) > error_rate(endpoint_baseline)
+                if change > args.max_regression:
+                    line += " REGRESSION"
+                if more_errors:
+                    line += " MORE ERRORS"
+                if more_errors or (
+                    change > args.max_regression and not args.errors_only
+                ):
+                    regressions.append((endpoint, change))
+            print(line)
+
+    app.dependency_overrides.pop(get_db, None)
+    if args.save:
+        with open(args.baseline, "w") as baseline_file:
+            dump(
+                {
+                    "sizes": sizes,
+                    "requests": args.requests,
+                    "concurrency": args.concurrency,
+                    "endpoints": results,
+                },
+                baseline_file,
+                indent=2,
+            )
+        print(f"baseline saved in {args.baseline}")
+    if regressions and args.errors_only:
+        print(f"{len(regressions)} endpoint(s) returned more errors")
+        raise SystemExit(1)
+    if regressions:
+        print(
+            f"{len(regressions)} endpoint(s) regressed more than "
+            f"{args.max_regression}% in {args.metric} or returned more errors"
+        )
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--carts", type=int, default=1000)
+    parser.add_argument("--max-items", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", nargs="*", help="run the endpoints with these words")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="save as the baseline")
+    parser.add_argument("--metric", choices=METRICS, default="p95_ms")
+    parser.add_argument("--max-regression", type=float, default=10.0)
+    parser.add_argument(
+        "--errors-only", action="store_true", help="fail only on more errors"
+    )
+    run(main(parser.parse_args()))
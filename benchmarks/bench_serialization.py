@@ -0,0 +1,120 @@
+"""
+Milliseconds to serialize a 1k items page of list_products and of
+get_all_cart_items: FastAPI's response_model path (validate the Union,
+jsonable_encoder, json.dumps) versus FAST_JSON (validate once, orjson).
+
+Usage: python -m benchmarks.bench_serialization --items 1000 --rounds 20
+(no database needed, the documents are built in memory)
+"""
+from argparse import ArgumentParser
+from asyncio import run
+from datetime import datetime
+from time import perf_counter
+from typing import Union
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from schemas.cart_item import CartItem
+from schemas.page import Page
+from schemas.product import Product
+from schemas.project_errors import ProjectErrors
+from utils.fast_json import FastJSONResponse
+from utils.ids import new_id
+
+
+def fake_products(total: int) -> dict:
+    return {
+        "items": [
+            {
+                "_id": new_id(),
+                "name": f"Produto {i}",
+                "description": "Doce gelado de morango",
+                "price": 9.99,
+            }
+            for i in range(total)
+        ],
+        "next_cursor": None,
+    }
+
+
+def fake_cart_items(total: int) -> dict:
+    cart = {
+        "_id": new_id(),
+        "user": {
+            "_id": new_id(),
+            "name": "Bruna",
+            "email": "bruna@gmail.com",
+            "pwd": "**********",
+            "address": [],
+        },
+        "price": 9.99 * total,
+        "paid": False,
+        "create": datetime.now(),
+        "address": {
+            "street": "Rua X",
+            "zipcode": "00000-000",
+            "district": "West Zone",
+            "city": "GG",
+            "state": "HH",
+            "is_delivery": True,
+        },
+        "authority": None,
+        "items_quantity": total,
+    }
+    return {
+        "items": [
+            {
+                "_id": new_id(),
+                "cart_id": cart["_id"],
+                "cart": cart,
+                "product": product,
+                "quantity": 1,
+                "item_price": 9.99,
+            }
+            for product in fake_products(total)["items"]
+        ],
+        "next_cursor": None,
+    }
+
+
+async def response_model_path(field, content) -> bytes:
+    return JSONResponse(
+        await serialize_response(field=field, response_content=content)
+    ).body
+
+
+async def fast_json_path(model, content) -> bytes:
+    return FastJSONResponse(model.parse_obj(content)).body
+
+
+async def timed(rounds: int, path, *args) -> float:
+    await path(*args)
+    start = perf_counter()
+    for _ in range(rounds):
+        await path(*args)
+    return (perf_counter() - start) / rounds * 1000
+
+
+async def main(total: int, rounds: int):
+    for name, model, content in (
+        ("list_products", Page[Product], fake_products(total)),
+        ("get_all_cart_items", Page[CartItem], fake_cart_items(total)),
+    ):
+        field = create_response_field(
+            name=f"response_{name}", type_=Union[model, ProjectErrors]
+        )
+        default = await timed(rounds, response_model_path, field, content)
+        fast = await timed(rounds, fast_json_path, model, content)
+        print(f"{name:<20} response_model {default:>8.2f} ms")
+        print(f"{name:<20} FAST_JSON      {fast:>8.2f} ms")
+        print(f"{name:<20} speedup        {default / fast:>8.2f}x")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    run(main(args.items, args.rounds))
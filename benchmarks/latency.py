@@ -0,0 +1,18 @@
+from math import ceil
+
+
+def percentile(sorted_values: list, percent: float) -> float:
+    # nearest-rank
+    index = max(ceil(percent / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def latency_summary(latencies: list) -> dict:
+    # p50/p95/p99 em ms
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    return {
+        f"p{percent}_ms": round(percentile(latencies, percent) * 1000, 2)
+        for percent in (50, 95, 99)
+    }
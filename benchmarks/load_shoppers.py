@@ -0,0 +1,404 @@
+"""
+Open-loop load of concurrent shoppers against a running server, to find the
+saturation point of the API.
+
+Each shopper signs up, creates a cart, lists the products, adds and removes
+items, views the full cart, updates the address and deletes the cart and the
+user. The payloads come from utils/generate_fakes.py and the requests of
+http_tests/*.http (their ids are replaced by the shopper's ones). Redirects
+are followed, like the REST Client of the .http files, and count in the step
+latency.
+
+Shoppers arrive at --rate per second (Poisson arrivals) no matter how many are
+still running, so a slow server gets a growing queue instead of a lighter
+load. With --ramp-steps the rate grows by --ramp every --duration seconds;
+the step where p95 passes --slo-ms or the errors pass --max-error-rate is the
+saturation point.
+
+Usage: DATABASE_BACKEND=memory uvicorn main:app (or any running server)
+       python -m benchmarks.load_shoppers --rate 5 --duration 30
+       python -m benchmarks.load_shoppers --rate 5 --ramp 5 --ramp-steps 6
+"""
+from argparse import ArgumentParser
+from asyncio import create_task, gather, run, sleep
+from collections import Counter
+from glob import glob
+from inspect import isawaitable
+from json import JSONDecodeError, dump, loads
+from os import path
+from random import Random
+from re import compile
+from time import perf_counter
+from urllib.parse import urlsplit
+from uuid import uuid4
+
+from httpx import AsyncClient, HTTPError, Limits, Timeout
+
+from benchmarks.latency import latency_summary
+from utils.generate_fakes import (
+    generate_fake_cart,
+    generate_fake_cart_item,
+    generate_fake_product,
+    generate_fake_products,
+    generate_fake_user,
+)
+
+HTTP_TESTS = path.join(path.dirname(__file__), "..", "http_tests", "*.http")
+REQUEST_LINE = compile(r"^(GET|POST|PUT|PATCH|DELETE) (.+?)(?: HTTP/1\.1)?$")
+# uuid, ObjectId ou número: os ids de exemplo dos .http
+EXAMPLE_ID = compile(r"^([0-9a-f]{8}-[0-9a-f-]{27}|[0-9a-f]{24}|\d+)$")
+
+
+class HttpRequest:
+    """
+    Request of a .http file, with {} in the place of the example ids
+    """
+
+    def __init__(self, title: str, method: str, url: str, body) -> None:
+        parts = urlsplit(url)
+        segments = [
+            "{}" if EXAMPLE_ID.match(segment) else segment
+            for segment in parts.path.split("/")
+        ]
+        self.title = title
+        self.method = method
+        self.path = "/".join(segments)
+        self.query = parts.query
+        self.body = body
+
+    @property
+    def key(self) -> str:
+        # ex.: "DELETE /cart/{}/item/{}"
+        query = f"?{self.query}" if self.query else ""
+        return f"{self.method} {self.path}{query}"
+
+    def url(self, *ids) -> str:
+        query = f"?{self.query}" if self.query else ""
+        return self.path.format(*ids) + query
+
+
+def parse_http_file(file_name: str) -> list:
+    requests, title, current, in_body = [], None, None, False
+
+    def flush():
+        if current is not None:
+            text = "\n".join(current[2]).strip()
+            try:
+                body = loads(text) if text else None
+            except JSONDecodeError:
+                # NDJSON e afins ficam como texto
+                body = text
+            requests.append(HttpRequest(title, current[0], current[1], body))
+
+    with open(file_name, encoding="utf-8") as http_file:
+        for line in http_file:
+            line = line.rstrip()
+            if line.startswith("#"):
+                if line.strip("# "):
+                    title = line.strip("# ")
+                continue
+            match = REQUEST_LINE.match(line)
+            if match:
+                flush()
+                current, in_body = (match[1], match[2], []), False
+            elif current is None:
+                continue
+            elif not in_body:
+                # cabeçalhos até a primeira linha em branco
+                in_body = not line
+            else:
+                current[2].append(line)
+    flush()
+    return requests
+
+
+def load_http_requests(pattern: str = HTTP_TESTS) -> dict:
+    # o primeiro de cada método + caminho vale
+    requests = {}
+    for file_name in sorted(glob(pattern)):
+        for request in parse_http_file(file_name):
+            requests.setdefault(request.key, request)
+    return requests
+
+
+class StepFailed(Exception):
+    pass
+
+
+class LoadStats:
+    """
+    Requests and sessions of the run, by step and by time window
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.start = perf_counter()
+        # (segundos desde o início, passo, latência, ok)
+        self.requests = []
+        self.reasons = {}
+        self.arrivals = []
+        self.sessions = Counter()
+        self.max_lag = 0.0
+
+    def now(self) -> float:
+        return perf_counter() - self.start
+
+    async def call(self, step: str, request):
+        # os geradores do generate_fakes devolvem a requisição sem o await
+        start = perf_counter()
+        reason = None
+        try:
+            response = await request
+            if isawaitable(response):
+                response = await response
+        except HTTPError as e:
+            response, reason = None, type(e).__name__
+        seconds = perf_counter() - start
+        data = None
+        if response is not None:
+            try:
+                data = response.json()
+            except ValueError:
+                data = None
+            if response.status_code >= 400:
+                reason = str(response.status_code)
+            elif isinstance(data, dict) and "error_type" in data:
+                # os models devolvem os erros com status 2xx
+                reason = data["error_type"]
+        self.requests.append((self.now(), step, seconds, reason is None))
+        if reason is not None:
+            self.reasons.setdefault(step, Counter())[reason] += 1
+            raise StepFailed(f"{step}: {reason}")
+        return data
+
+    def windows(self) -> list:
+        timeline = {}
+        for finished, _, seconds, ok in self.requests:
+            window = timeline.setdefault(int(finished // self.interval), ([], [0]))
+            window[0].append(seconds)
+            window[1][0] += 0 if ok else 1
+        arrivals = Counter(int(t // self.interval) for t in self.arrivals)
+        last = max([*timeline, *arrivals], default=-1)
+        result = []
+        for index in range(last + 1):
+            latencies, (errors,) = timeline.get(index, ([], [0]))
+            result.append(
+                {
+                    "t": round(index * self.interval, 1),
+                    "arrivals": arrivals[index],
+                    "requests": len(latencies),
+                    "throughput": round(len(latencies) / self.interval, 1),
+                    "error_rate": round(errors / len(latencies) * 100, 2)
+                    if latencies
+                    else 0.0,
+                    **latency_summary(latencies),
+                }
+            )
+        return result
+
+    def steps(self) -> dict:
+        by_step = {}
+        for _, step, seconds, ok in self.requests:
+            latencies, errors = by_step.setdefault(step, ([], [0]))
+            latencies.append(seconds)
+            errors[0] += 0 if ok else 1
+        return {
+            step: {
+                "requests": len(latencies),
+                "errors": errors,
+                "error_rate": round(errors / len(latencies) * 100, 2),
+                "reasons": dict(self.reasons.get(step, {})),
+                **latency_summary(latencies),
+            }
+            for step, (latencies, (errors,)) in by_step.items()
+        }
+
+    def stage(self, rate: float, begin: float, end: float) -> dict:
+        # as requisições que terminaram durante o degrau
+        requests = [r for r in self.requests if begin <= r[0] < end]
+        errors = sum(1 for r in requests if not r[3])
+        return {
+            "rate": rate,
+            "requests": len(requests),
+            "throughput": round(len(requests) / (end - begin), 1),
+            "error_rate": round(errors / len(requests) * 100, 2) if requests else 0.0,
+            **latency_summary([r[2] for r in requests]),
+        }
+
+
+async def shopper(client, stats, http_requests, rng, email: str) -> None:
+    stats.sessions["started"] += 1
+    try:
+        user = await stats.call("sign up", generate_fake_user(client, email=email))
+        user_id = user["_id"]
+        cart = await stats.call("create cart", generate_fake_cart(client, user_id))
+
+        products = http_requests["GET /products/"]
+        page = await stats.call("list products", client.get(products.url()))
+        chosen = rng.sample(page["items"], min(rng.randint(1, 3), len(page["items"])))
+        for product in chosen:
+            await stats.call(
+                "add item",
+                generate_fake_cart_item(client, cart, product, rng.randint(1, 3)),
+            )
+
+        remove_item = http_requests["DELETE /cart/{}/item/{}"]
+        await stats.call(
+            "remove item",
+            client.delete(remove_item.url(cart["_id"], chosen[0]["_id"])),
+        )
+        full_cart = http_requests["GET /cart/{}/full?page_size=20"]
+        await stats.call("view cart", client.get(full_cart.url(user_id)))
+
+        address = http_requests["PUT /user/{}/address/"]
+        await stats.call(
+            "update address",
+            client.put(address.url(user_id), json=address.body),
+        )
+
+        delete_cart = http_requests["DELETE /cart/{}/"]
+        await stats.call("delete cart", client.delete(delete_cart.url(user_id)))
+        delete_user = http_requests["DELETE /user/{}/"]
+        await stats.call("delete user", client.delete(delete_user.url(user_id)))
+    except StepFailed:
+        stats.sessions["failed"] += 1
+    else:
+        stats.sessions["completed"] += 1
+
+
+async def prepare_catalog(client, stats) -> None:
+    # garante produtos para os carrinhos; os ids 10 e 20 podem já existir
+    for request in (generate_fake_products(client), generate_fake_product(client)):
+        try:
+            await stats.call("seed products", request)
+        except StepFailed:
+            pass
+
+
+async def arrivals(client, stats, http_requests, rng, stages, run_id) -> list:
+    tasks = []
+    scheduled = stats.now()
+    for rate, duration in stages:
+        stage_end = scheduled + duration
+        while True:
+            scheduled += rng.expovariate(rate)
+            if scheduled >= stage_end:
+                scheduled = stage_end
+                break
+            await sleep(max(scheduled - stats.now(), 0))
+            # atraso do próprio gerador: se crescer, quem saturou foi ele
+            stats.max_lag = max(stats.max_lag, stats.now() - scheduled)
+            stats.arrivals.append(stats.now())
+            email = f"shopper{len(stats.arrivals)}x{run_id}@loadtest.com"
+            tasks.append(create_task(shopper(client, stats, http_requests, rng, email)))
+    await sleep(max(scheduled - stats.now(), 0))
+    return tasks
+
+
+async def main(args):
+    rng = Random(args.seed)
+    run_id = uuid4().hex[:8]
+    http_requests = load_http_requests()
+    stages = [
+        (args.rate + step * args.ramp, args.duration) for step in range(args.ramp_steps)
+    ]
+
+    async with AsyncClient(
+        base_url=args.url,
+        follow_redirects=True,
+        timeout=Timeout(args.timeout),
+        limits=Limits(max_connections=args.connections),
+    ) as client:
+        stats = LoadStats(args.interval)
+        await prepare_catalog(client, stats)
+        stats = LoadStats(args.interval)
+        tasks = await arrivals(client, stats, http_requests, rng, stages, run_id)
+        # os que chegaram no fim ainda terminam, fora do último degrau
+        await gather(*tasks)
+
+    windows = stats.windows()
+    print(
+        f"{'t(s)':>6} {'arrivals':>8} {'req/s':>8} {'err%':>6}"
+        f" {'p50':>8} {'p95':>8} {'p99':>8}"
+    )
+    for window in windows:
+        print(
+            f"{window['t']:>6.1f} {window['arrivals']:>8} {window['throughput']:>8.1f}"
+            f" {window['error_rate']:>6.2f} {window['p50_ms']:>8.2f}"
+            f" {window['p95_ms']:>8.2f} {window['p99_ms']:>8.2f}"
+        )
+
+    steps = stats.steps()
+    print(
+        f"\n{'step':<16} {'requests':>8} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8}"
+    )
+    for step, result in steps.items():
+        reasons = ", ".join(f"{r}: {n}" for r, n in result["reasons"].items())
+        print(
+            f"{step:<16} {result['requests']:>8} {result['error_rate']:>6.2f}"
+            f" {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f}"
+            f" {result['p99_ms']:>8.2f} {reasons}"
+        )
+
+    results, saturation, begin = [], None, 0.0
+    print(f"\n{'sessions/s':>10} {'req/s':>8} {'err%':>6} {'p95':>8} {'p99':>8}")
+    for rate, duration in stages:
+        result = stats.stage(rate, begin, begin + duration)
+        begin += duration
+        results.append(result)
+        saturated = (
+            result["p95_ms"] > args.slo_ms or result["error_rate"] > args.max_error_rate
+        )
+        if saturated and saturation is None:
+            saturation = rate
+        print(
+            f"{rate:>10.1f} {result['throughput']:>8.1f} {result['error_rate']:>6.2f}"
+            f" {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f}"
+            + (" SATURATED" if saturated else "")
+        )
+
+    sessions = stats.sessions
+    print(
+        f"\n{sessions['started']} shoppers: {sessions['completed']} completed, "
+        f"{sessions['failed']} failed; arrival lag up to {stats.max_lag * 1000:.0f}ms"
+    )
+    if stats.max_lag * 1000 > args.slo_ms:
+        print("the load generator fell behind the arrival rate: its numbers are low")
+    if saturation is not None:
+        print(
+            f"saturation at {saturation} shoppers/s "
+            f"(p95 > {args.slo_ms}ms or errors > {args.max_error_rate}%)"
+        )
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            dump(
+                {
+                    "url": args.url,
+                    "stages": results,
+                    "saturation": saturation,
+                    "sessions": dict(sessions),
+                    "steps": steps,
+                    "timeline": windows,
+                },
+                output_file,
+                indent=2,
+            )
+        print(f"results saved in {args.output}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--rate", type=float, default=5.0, help="shoppers/s")
+    parser.add_argument("--duration", type=float, default=30.0, help="s per step")
+    parser.add_argument("--ramp", type=float, default=0.0, help="shoppers/s per step")
+    parser.add_argument("--ramp-steps", type=int, default=1)
+    parser.add_argument("--interval", type=float, default=5.0, help="s per window")
+    parser.add_argument("--slo-ms", type=float, default=500.0)
+    parser.add_argument("--max-error-rate", type=float, default=1.0, help="percent")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--output", help="JSON file with the results")
+    parser.add_argument("--seed", type=int, default=42)
+    run(main(parser.parse_args()))
@@ -6,9 +6,10 @@ from models.model_address import add_address, delete_Address, list_address
 from schemas.address import Address
 from schemas.project_errors import ProjectErrors
 from server.database import get_db
+from utils.request_timing import TimedRoute
 
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
 @router.put("/", response_description="Add a new Address", response_model=ProjectErrors)
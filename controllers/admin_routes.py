@@ -0,0 +1,47 @@
+from hmac import compare_digest
+from os import getenv
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from fastapi import APIRouter, Depends, Header, Query, Request, status
+from fastapi.exceptions import HTTPException
+
+from schemas.slow_query import SlowQuery
+from server.command_monitor import SLOW_QUERY_BUFFER_SIZE, list_slow_queries
+from server.database import get_db
+from utils.request_timing import TimedRoute
+
+load_dotenv()
+ADMIN_TOKEN = getenv("ADMIN_TOKEN")
+# só em desenvolvimento: rotas de admin abertas sem ADMIN_TOKEN
+ADMIN_ROUTES_OPEN = getenv("ADMIN_ROUTES_OPEN", "false").lower() == "true"
+
+router = APIRouter(route_class=TimedRoute)
+
+
+def check_admin_token(x_admin_token: Optional[str] = Header(default=None)):
+    # fecha por padrão: sem ADMIN_TOKEN as rotas de admin nem aparecem
+    if not ADMIN_TOKEN:
+        if ADMIN_ROUTES_OPEN:
+            return
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_admin_token is None or not compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid admin token",
+        )
+
+
+@router.get(
+    "/slow-queries",
+    response_description="The latest MongoDB commands slower than SLOW_QUERY_MS",
+    response_model=List[SlowQuery],
+    dependencies=[Depends(check_admin_token)],
+)
+async def route_list_slow_queries(
+    request: Request,
+    limit: int = Query(default=20, ge=1, le=SLOW_QUERY_BUFFER_SIZE),
+    explain: bool = False,
+    db: get_db = Depends(),
+):
+    return await list_slow_queries(db.client, limit, explain)
@@ -1,6 +1,6 @@
-from typing import List, Union
+from typing import Optional, Union
 
-from fastapi import APIRouter, Body, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, status
 
 from models.model_cart_item import (
     create_update_cart_item,
@@ -9,11 +9,16 @@ from models.model_cart_item import (
     get_cart_item,
 )
 from schemas.cart_item import CartItem, CartItemUpdate
+from schemas.page import Page
 from schemas.project_errors import ProjectErrors
 from server.database import get_db
+from utils.fast_json import model_response
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from utils.projection import FIELDS_DESCRIPTION, fields_projection, narrowed_response
+from utils.request_timing import TimedRoute
 
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
 @router.put(
@@ -26,22 +31,33 @@ async def route_create_update_cart_item(
     cart_id: str,
     request: Request,
     cart_item: CartItemUpdate = Body(...),
+    with_cart: bool = False,
     db: get_db = Depends(),
 ):
-    return await create_update_cart_item(db, cart_id, cart_item)
+    return await create_update_cart_item(db, cart_id, cart_item, with_cart)
 
 
 @router.get(
     "/",
     response_description="Return all cart_items from a cart",
-    response_model=Union[List[CartItem], ProjectErrors],
+    response_model=Union[Page[CartItem], ProjectErrors],
 )
 async def route_get_all_cart_items(
     cart_id: str,
     request: Request,
+    cursor: Optional[str] = None,
+    page_size: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    with_cart: bool = False,
+    fields: Optional[str] = Query(default=None, description=FIELDS_DESCRIPTION),
     db: get_db = Depends(),
 ):
-    return await get_all_cart_items(db, cart_id)
+    projection = fields_projection(fields, CartItem)
+    cart_items = await get_all_cart_items(
+        db, cart_id, cursor, page_size, with_cart, projection
+    )
+    if projection is None:
+        return model_response(Page[CartItem], cart_items)
+    return narrowed_response(cart_items, CartItem, projection, page=True)
 
 
 @router.get(
@@ -53,10 +69,11 @@ async def route_get_a_cart_item(
     cart_id: str,
     product_id: str,
     request: Request,
+    with_cart: bool = False,
     db: get_db = Depends(),
 ):
     if (
-        cart_item := await get_cart_item(db, cart_id, product_id)
+        cart_item := await get_cart_item(db, cart_id, product_id, with_cart)
     ) is not None:
         return cart_item
 
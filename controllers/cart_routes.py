@@ -1,13 +1,24 @@
-from typing import Union
+from typing import Optional, Union
 
-from fastapi import APIRouter, Body, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, status
 
-from models.model_cart import create_cart, delete_cart, get_user_cart, update_cart
+from models.model_cart import (
+    create_cart,
+    delete_cart,
+    get_user_cart,
+    get_user_cart_with_items,
+    update_cart,
+)
 from schemas.cart import Cart, CartInsert, CartUpdate
+from schemas.cart_item import CartWithItems
 from schemas.project_errors import ProjectErrors
 from server.database import get_db
+from utils.fast_json import model_response
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from utils.projection import FIELDS_DESCRIPTION, fields_projection, narrowed_response
+from utils.request_timing import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
 @router.post(
@@ -33,10 +44,12 @@ async def route_create_cart(
 async def route_get_user_cart(
     user_id: str,
     request: Request,
+    fields: Optional[str] = Query(default=None, description=FIELDS_DESCRIPTION),
     db: get_db = Depends(),
 ):
-    if (get_cart := await get_user_cart(db, user_id)) is not None:
-        return get_cart
+    projection = fields_projection(fields, Cart)
+    if (get_cart := await get_user_cart(db, user_id, projection)) is not None:
+        return narrowed_response(get_cart, Cart, projection)
 
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
@@ -47,6 +60,23 @@ async def route_get_user_cart(
     )
 
 
+@router.get(
+    "/{user_id}/full",
+    response_description="Return an active User cart with a page of its items",
+    response_model=CartWithItems,
+)
+async def route_get_user_cart_with_items(
+    user_id: str,
+    request: Request,
+    cursor: Optional[str] = None,
+    page_size: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: get_db = Depends(),
+):
+    return model_response(
+        CartWithItems, await get_user_cart_with_items(db, user_id, cursor, page_size)
+    )
+
+
 @router.put(
     "/{user_id}",
     response_description="Update a cart",
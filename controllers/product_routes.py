@@ -1,38 +1,107 @@
-from typing import List, Union
+from typing import List, Optional, Union
 
-from fastapi import APIRouter, Body, Depends, Request, status
+from fastapi import APIRouter, Body, Depends, Query, Request, Response, status
 
 from models.model_product import (
     create_products,
     delete_product,
+    get_product_cache_stats,
+    import_products,
     list_product_by_id,
+    list_products_by_ids,
     list_products,
     update_product,
 )
+from schemas.batch import Batch
+from schemas.cache_stats import CacheStats
+from schemas.page import Page
 from schemas.product import Product, ProductUpdate
 from schemas.project_errors import ProjectErrors
 from server.database import get_db
+from utils.batch import IDS_DESCRIPTION, parse_ids
+from utils.fast_json import model_response
+from utils.ndjson import NdjsonStreamingResponse, iter_ndjson_lines
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from utils.projection import FIELDS_DESCRIPTION, fields_projection, narrowed_response
+from utils.request_timing import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
 @router.post(
     "/",
     response_description="Create new Products",
     status_code=status.HTTP_201_CREATED,
-    response_model=Union[List[Product], Product],
+    response_model=Union[List[Union[Product, ProjectErrors]], Product, ProjectErrors],
 )
 async def route_create_products(
     request: Request,
+    response: Response,
     products: Union[List[Product], Product] = Body(...),
     db: get_db = Depends()
 ):
-    return await create_products(db, products)
+    created_products = await create_products(db, products)
+    results = (
+        created_products if isinstance(created_products, list) else [created_products]
+    )
+    # 201 só quando todos foram criados: com falhas, 207 no lote e 400 no avulso
+    if any("error_type" in result for result in results):
+        response.status_code = (
+            status.HTTP_207_MULTI_STATUS
+            if isinstance(products, list)
+            else status.HTTP_400_BAD_REQUEST
+        )
+    return created_products
 
 
-@router.get("/", response_description="List all Products", response_model=List[Product])
-async def route_list_products(request: Request, db: get_db = Depends()):
-    return await list_products(db)
+@router.post(
+    "/import",
+    response_description="Upsert Products sent as NDJSON, streaming progress and errors",
+    response_class=NdjsonStreamingResponse,
+)
+async def route_import_products(request: Request, db: get_db = Depends()):
+    return NdjsonStreamingResponse(
+        import_products(db, iter_ndjson_lines(request.stream()))
+    )
+
+
+@router.get("/", response_description="List all Products", response_model=Page[Product])
+async def route_list_products(
+    request: Request,
+    cursor: Optional[str] = None,
+    page_size: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(default=None, description=FIELDS_DESCRIPTION),
+    db: get_db = Depends(),
+):
+    projection = fields_projection(fields, Product)
+    products = await list_products(db, cursor, page_size, projection)
+    if projection is None:
+        return model_response(Page[Product], products)
+    return narrowed_response(products, Product, projection, page=True)
+
+
+@router.get(
+    "/cache/stats",
+    response_description="Hits, misses and evictions of the Products cache",
+    response_model=CacheStats,
+)
+async def route_get_product_cache_stats(request: Request):
+    return get_product_cache_stats()
+
+
+@router.get(
+    "/batch",
+    response_description="Return the Products of a list of IDs, in the same order",
+    response_model=Batch[Product],
+)
+async def route_list_products_by_ids(
+    request: Request,
+    ids: str = Query(..., description=IDS_DESCRIPTION),
+    db: get_db = Depends(),
+):
+    return model_response(
+        Batch[Product], await list_products_by_ids(db, parse_ids(ids))
+    )
 
 
 @router.get(
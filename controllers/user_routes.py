@@ -1,21 +1,30 @@
 from typing import List, Optional, Union
 
-from fastapi import APIRouter, Body, Depends, Request, status
+from fastapi import APIRouter, Body, Depends, Query, Request, status
 
 from models.model_user import (
+    count_emails_by_domain,
     create_user,
     delete_user,
     get_emails_by_domain,
     get_user_by_id,
+    get_users_by_ids,
     get_users_by_name,
     list_users,
     update_user,
 )
+from schemas.batch import Batch
+from schemas.page import Page
 from schemas.project_errors import ProjectErrors
-from schemas.user import EmailsList, User, UserUpdate
+from schemas.user import DomainCount, EmailsList, User, UserUpdate
 from server.database import get_db
+from utils.batch import IDS_DESCRIPTION, parse_ids
+from utils.fast_json import model_response
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from utils.projection import FIELDS_DESCRIPTION, fields_projection, narrowed_response
+from utils.request_timing import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
 @router.post(
@@ -33,11 +42,31 @@ async def route_create_user(
     return await create_user(db, user)
 
 
-@router.get("/", response_description="List users")
+@router.get(
+    "/",
+    response_description="List users",
+    response_model=Union[Page[User], ProjectErrors],
+)
 async def route_list_users(
-    request: Request, page: Optional[int] = None, db: get_db = Depends()
+    request: Request,
+    cursor: Optional[str] = None,
+    page_size: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: get_db = Depends(),
+):
+    return model_response(Page[User], await list_users(db, cursor, page_size))
+
+
+@router.get(
+    "/batch",
+    response_description="Return the Users of a list of IDs, in the same order",
+    response_model=Batch[User],
+)
+async def route_get_users_by_ids(
+    request: Request,
+    ids: str = Query(..., description=IDS_DESCRIPTION),
+    db: get_db = Depends(),
 ):
-    return await list_users(db, page)
+    return model_response(Batch[User], await get_users_by_ids(db, parse_ids(ids)))
 
 
 @router.get(
@@ -45,8 +74,15 @@ async def route_list_users(
     response_description="Return an User by Id",
     response_model=Union[User, ProjectErrors],
 )
-async def route_get_user_by_id(user_id: str, request: Request, db: get_db = Depends()):
-    return await get_user_by_id(db, user_id)
+async def route_get_user_by_id(
+    user_id: str,
+    request: Request,
+    fields: Optional[str] = Query(default=None, description=FIELDS_DESCRIPTION),
+    db: get_db = Depends(),
+):
+    projection = fields_projection(fields, User)
+    user = await get_user_by_id(db, user_id, projection)
+    return narrowed_response(user, User, projection)
 
 
 @router.get(
@@ -66,9 +102,26 @@ async def route_get_users_by_name(
     response_model=Union[EmailsList, ProjectErrors],
 )
 async def route_get_emails_by_domain(
-    domain_name: str, request: Request, db: get_db = Depends()
+    domain_name: str,
+    request: Request,
+    cursor: Optional[str] = None,
+    page_size: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: get_db = Depends(),
+):
+    return await get_emails_by_domain(db, domain_name, cursor, page_size)
+
+
+@router.get(
+    "/emails/domains",
+    response_description="Return the number of emails of each domain",
+    response_model=Union[List[DomainCount], ProjectErrors],
+)
+async def route_count_emails_by_domain(
+    request: Request,
+    limit: int = Query(default=100, ge=1, le=1000),
+    db: get_db = Depends(),
 ):
-    return await get_emails_by_domain(db, domain_name)
+    return await count_emails_by_domain(db, limit)
 
 
 @router.put(
@@ -1,47 +1,69 @@
 from fastapi import FastAPI, Request, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 
+from controllers.admin_routes import router as admin_router
 from controllers.address_routes import router as address_router
 from controllers.cart_items_routes import router as cart_items_router
 from controllers.cart_routes import router as cart_router
 from controllers.product_routes import router as product_router
 from controllers.user_routes import router as user_router
-from project_logs.logging import set_logging
+from models.model_product import product_cache
+from project_logs.logging import get_logger, setup_logging, shutdown_logging
+from server.database import shared_db
+from server.migrations import apply_migrations
+from utils import metrics
+from utils.fast_json import FAST_JSON, FastJSONResponse
+from utils.request_timing import TimedRoute, TimingMiddleware
+
+
+error_log = get_logger("errors")
 
 
 async def startup_db_client():
-    global app
-    app.test = True
-    # app.database = DataBase()
-    # await app.database.connect_db()
+    shared_db.connect_db()
+    await apply_migrations(shared_db)
 
 
 async def shutdown_db_client():
-    global app
-    # await app.database.disconnect_db()
+    shared_db.disconnect_db()
 
 
-app = FastAPI()
+app = FastAPI(
+    default_response_class=FastJSONResponse if FAST_JSON else JSONResponse,
+    on_startup=[setup_logging, startup_db_client, metrics.start_metrics_flush],
+    on_shutdown=[metrics.stop_metrics_flush, shutdown_db_client, shutdown_logging],
+)
+app.router.route_class = TimedRoute
+app.add_middleware(TimingMiddleware)
+metrics.register_cache("products", product_cache)
 app.include_router(user_router, tags=["user"], prefix="/user")
 app.include_router(product_router, tags=["products"], prefix="/products")
 app.include_router(address_router, tags=["address"], prefix="/user/{user_id}/address")
 app.include_router(cart_router, tags=["cart"], prefix="/cart")
 app.include_router(cart_items_router, tags=["cart_item"], prefix="/cart/{cart_id}/item")
+app.include_router(admin_router, tags=["admin"], prefix="/admin")
 
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     project_errors = []
-    project_error = {}
-    error_log = set_logging("errors")
     for error in exc.errors():
-        project_error["error_loc"] = error["loc"]
-        project_error["error_type"] = error["type"]
-        project_error["error_msg"] = error["msg"]
+        project_error = {
+            "error_loc": error["loc"],
+            "error_type": error["type"],
+            "error_msg": error["msg"],
+        }
         project_errors.append(project_error)
-        error_log.error(project_error)
+        error_log.error(
+            {
+                "event": "validation_error",
+                "method": request.method,
+                "path": request.url.path,
+                **project_error,
+            }
+        )
     return JSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content=jsonable_encoder(project_errors),
@@ -54,3 +76,8 @@ async def home(request: Request):
         "status": "OK",
         "msg": "Welcome to LFE Shooping Cart LuizaCode",
     }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def route_metrics(request: Request):
+    return PlainTextResponse(metrics.collect(), media_type=metrics.CONTENT_TYPE)
@@ -1,12 +1,15 @@
-from bson.objectid import ObjectId
 from fastapi import APIRouter, Body, HTTPException, status
 from fastapi.encoders import jsonable_encoder
 from pydantic import ValidationError, validate_model
+from pymongo import ASCENDING, ReturnDocument
 
 from models.model_user import get_user_by_id
 from schemas.cart import Cart, CartUpdate
 from schemas.project_errors import ProjectErrors
 from utils.cascade_delete import cascade_delete
+from utils.data_loader import load_by_id, prime_loader
+from utils.ids import new_id
+from utils.pagination import DEFAULT_PAGE_SIZE, decode_cursor, encode_cursor
 
 router = APIRouter()
 
@@ -41,9 +44,12 @@ async def create_cart(database, user_id: str, cart: Cart = Body(...)):
             }
         else:
             _cart = jsonable_encoder(cart)
+            _cart["_id"] = new_id()
             _cart["user"] = user
             try:
                 new_cart = await database.cart_collection.insert_one(_cart)
+                # o documento inserido é o que o banco tem: sem reler
+                prime_loader(database, "carts", _cart)
             except Exception:
                 return {
                     "error_type": "create_cart",
@@ -61,11 +67,11 @@ async def create_cart(database, user_id: str, cart: Cart = Body(...)):
                 )
 
 
-async def get_user_cart(database, user_id: str):
+async def get_user_cart(database, user_id: str, projection: dict = None):
     try:
         if (
             user := await database.cart_collection.find_one(
-                {"$and": [{"user._id": user_id}, {"paid": False}]}
+                {"$and": [{"user._id": user_id}, {"paid": False}]}, projection
             )
         ) is not None:
             return user
@@ -76,26 +82,50 @@ async def get_user_cart(database, user_id: str):
         }
 
 
+async def get_user_cart_with_items(
+    database, user_id: str, cursor: str = None, page_size: int = DEFAULT_PAGE_SIZE
+):
+    # carrinho ativo e uma página dos seus itens numa só agregação
+    items_pipeline = [{"$sort": {"_id": ASCENDING}}, {"$limit": page_size + 1}]
+    if cursor:
+        items_pipeline.insert(0, {"$match": {"_id": {"$gt": decode_cursor(cursor)}}})
+    carts = database.cart_collection.aggregate(
+        [
+            {"$match": {"$and": [{"user._id": user_id}, {"paid": False}]}},
+            {"$limit": 1},
+            {
+                "$lookup": {
+                    "from": database.cart_items_collection.name,
+                    "localField": "_id",
+                    "foreignField": "cart_id",
+                    "pipeline": items_pipeline,
+                    "as": "items",
+                }
+            },
+        ]
+    )
+    if len(carts := await carts.to_list(length=1)) == 0:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "error_type": "get_user_cart_with_items",
+                "error_msg": f"Cart with user ID {user_id} not found",
+            },
+        )
+    cart = carts[0]
+    cart["next_cursor"] = (
+        encode_cursor(cart["items"][page_size - 1]["_id"])
+        if len(cart["items"]) > page_size
+        else None
+    )
+    cart["items"] = cart["items"][:page_size]
+    return cart
+
+
 async def get_cart_by_id(database, cart_id: str):
     try:
-        if ObjectId.is_valid(cart_id):
-            if (
-                cart := await database.cart_collection.find_one(
-                    {
-                        "$or": [
-                            {"$and": [{"_id": cart_id}, {"paid": False}]},
-                            {"$and": [{"_id": ObjectId(cart_id)}, {"paid": False}]},
-                        ]
-                    }
-                )
-            ) is not None:
-                return cart
-        if (
-            cart := await database.cart_collection.find_one(
-                {"$and": [{"_id": cart_id}, {"paid": False}]}
-            )
-        ) is not None:
-            return cart
+        if (cart := await load_by_id(database, "carts", cart_id)) is not None:
+            return cart if cart.get("paid") is False else None
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -110,18 +140,16 @@ async def update_cart(database, user_id: str, cart: CartUpdate = Body(...)):
     cart = jsonable_encoder(cart)
     cart = {k: v for k, v in cart.items() if v is not None}
 
-    update_result = await database.cart_collection.update_one(
-        {"user._id": user_id}, {"$set": cart}
-    )
-    if update_result.modified_count == 0:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Cart with ID {user_id} not found",
-        )
-
     if (
-        existing_cart := await database.cart_collection.find_one({"user._id": user_id})
+        existing_cart := await database.cart_collection.find_one_and_update(
+            {"user._id": user_id},
+            {"$set": cart},
+            return_document=ReturnDocument.AFTER,
+        )
+        if len(cart) >= 1
+        else await database.cart_collection.find_one({"user._id": user_id})
     ) is not None:
+        prime_loader(database, "carts", existing_cart)
         return existing_cart
 
     raise HTTPException(
@@ -130,6 +158,27 @@ async def update_cart(database, user_id: str, cart: CartUpdate = Body(...)):
     )
 
 
+async def increment_cart_totals(
+    database, cart_id: str, price: float, items_quantity: int
+):
+    # soma atômica no servidor: adições concorrentes no mesmo carrinho não se
+    # perdem, e o $round evita que o preço acumule erro de ponto flutuante
+    cart = await database.cart_collection.find_one_and_update(
+        {"$and": [{"_id": cart_id}, {"paid": False}]},
+        [
+            {
+                "$set": {
+                    "price": {"$round": [{"$add": ["$price", round(price, 2)]}, 2]},
+                    "items_quantity": {"$add": ["$items_quantity", items_quantity]},
+                }
+            }
+        ],
+        return_document=ReturnDocument.AFTER,
+    )
+    prime_loader(database, "carts", cart)
+    return cart
+
+
 async def delete_cart(database, user_id: str):
     if (response := await cascade_delete(database, user_id)) is None:
         raise HTTPException(
@@ -1,117 +1,117 @@
-from typing import Union
+from typing import Optional
 
-from bson.objectid import ObjectId
 from fastapi import APIRouter, Body, HTTPException, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import RedirectResponse
+from pymongo import ReturnDocument
 
-from models.model_cart import get_cart_by_id, update_cart
+from models.model_cart import get_cart_by_id, increment_cart_totals
 from schemas.cart_item import CartItemUpdate
+from utils.data_loader import clear_loader, load_by_id, prime_loader
+from utils.ids import new_id
+from utils.pagination import DEFAULT_PAGE_SIZE, find_page
 
 router = APIRouter()
 
 
 async def create_update_cart_item(
-    database, cart_id: str, cart_item: CartItemUpdate = Body(...)
+    database, cart_id: str, cart_item: CartItemUpdate = Body(...), with_cart=False
 ):
+    cart_item = jsonable_encoder(cart_item)
+    product_id = cart_item["product"].get("_id")
+    _quantity = cart_item["quantity"]
+
+    _quantity = 1 if not _quantity else _quantity
+    _quantity = 1 if not str(_quantity).isdigit() else int(_quantity)
+    _quantity = 1 if _quantity < 1 else _quantity
+
+    # o preço nunca vem do cliente: o item já gravado mantém o seu produto,
+    # senão vale o do catálogo; a remoção desconta esse mesmo product.price
+    stored_item = await database.cart_items_collection.find_one(
+        {"cart_id": cart_id, "product._id": product_id}, {"product": 1}
+    )
+    if stored_item is not None:
+        _product = stored_item["product"]
+    else:
+        _product = await load_by_id(database, "products", product_id)
+    if _product is None:
+        return {"error_type": "create_update_cart_item", "error_msg": "Unknown product"}
+    aux_price = round(_product.get("price") * _quantity, 2)
+
+    # somar no carrinho ativo primeiro também confirma que ele existe
     try:
-        cart = await get_cart_by_id(database, cart_id)
-        if cart is None:
-            return {
-                "error_type": "create_update_cart_item",
-                "error_msg": "Unknown cart",
-            }
+        cart = await increment_cart_totals(database, cart_id, aux_price, _quantity)
     except Exception:
+        cart = None
+    if cart is None:
         return {"error_type": "create_update_cart_item", "error_msg": "Unknown cart"}
-    else:
-        try:
-            cart_item = jsonable_encoder(cart_item)
-            _product = cart_item["product"]
-            _quantity = cart_item["quantity"]
-
-            _quantity = 1 if not _quantity else _quantity
-            _quantity = 1 if not str(_quantity).isdigit() else int(_quantity)
-            _quantity = 1 if _quantity < 1 else _quantity
 
-            if (
-                cart_item_to_update := await get_cart_item_by_product_id(
-                    database, _product.get("_id")
-                )
-            ) is not None:
-                if (
-                    await update_cart(
-                        database,
-                        cart.get("user").get("_id"),
-                        {
-                            "price": cart.get("price")
-                            + round(_product.get("price") * _quantity, 2),
-                            "items_quantity": cart.get("items_quantity") + _quantity,
-                        },
-                    )
-                ) is not None:
-                    aux_item_quantity = cart_item_to_update.get("quantity") + _quantity
-                    aux_price = round(
-                        cart_item_to_update.get("product").get("price")
-                        * aux_item_quantity,
-                        2,
-                    )
-                    return await update_cart_item_quantity_price(
-                        database, _product.get("_id"), aux_item_quantity, aux_price
-                    )
-                return {
-                    "error_type": "create_update_cart_item",
-                    "error_msg": "Update cart error. Contact the admnistrator",
-                }
-
-            aux_price = round(_product.get("price") * _quantity, 2)
-            new_cart_item = await database.cart_items_collection.insert_one(
+    try:
+        # upsert pela chave (cart_id, product._id): cria ou soma numa só ida;
+        # pipeline com $round para o item_price não acumular resíduo de float
+        is_new = {"$eq": [{"$ifNull": ["$_id", None]}, None]}
+        upserted_cart_item = await database.cart_items_collection.find_one_and_update(
+            {"cart_id": cart_id, "product._id": product_id},
+            [
                 {
-                    "cart": cart,
-                    "product": _product,
-                    "quantity": _quantity,
-                    "item_price": aux_price,
-                }
-            )
-            if new_cart_item is None:
-                return {
-                    "error_type": "create_update_cart_item",
-                    "error_msg": "Insert update error. Contact the admnistrator",
+                    "$set": {
+                        "_id": {"$ifNull": ["$_id", new_id()]},
+                        # o filtro já cria product com só o _id no upsert
+                        "product": {
+                            "$cond": [is_new, {"$literal": _product}, "$product"]
+                        },
+                        "quantity": {
+                            "$add": [{"$ifNull": ["$quantity", 0]}, _quantity]
+                        },
+                        "item_price": {
+                            "$round": [
+                                {"$add": [{"$ifNull": ["$item_price", 0]}, aux_price]},
+                                2,
+                            ]
+                        },
+                    }
                 }
-            if (
-                await update_cart(
-                    database,
-                    cart.get("user").get("_id"),
-                    {
-                        "price": cart.get("price")
-                        + round(_product.get("price") * _quantity, 2),
-                        "items_quantity": cart.get("items_quantity") + _quantity,
-                    },
-                )
-            ) is not None:
-                return await get_cart_item_by_id(database, new_cart_item.inserted_id)
-
-            return {
-                "error_type": "create_update_cart_item",
-                "error_msg": "Update cart error. Contact the admnistrator",
-            }
-        except Exception:
-            return {
-                "error_type": "create_update_cart_item",
-                "error_msg": "Insert update error. Contact the admnistrator",
-            }
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except Exception:
+        await increment_cart_totals(database, cart_id, -aux_price, -_quantity)
+        return {
+            "error_type": "create_update_cart_item",
+            "error_msg": "Insert update error. Contact the admnistrator",
+        }
+    prime_loader(database, "cart_items", upserted_cart_item)
+    if with_cart:
+        # cópia: o documento primado no loader não leva o carrinho junto
+        return {**upserted_cart_item, "cart": cart}
+    return upserted_cart_item
 
 
-async def get_all_cart_items(database, cart_id: Union[str, ObjectId]):
+async def get_all_cart_items(
+    database,
+    cart_id: str,
+    cursor: Optional[str] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    with_cart=False,
+    projection: dict = None,
+):
     try:
-        if ObjectId.is_valid(cart_id):
-            cart_item = database.cart_items_collection.find(
-                {"$or": [{"cart._id": cart_id}, {"cart._id": ObjectId(cart_id)}]}
-            )
-            return await cart_item.to_list(length=100)
-
-        cart_item = database.cart_items_collection.find({"cart._id": cart_id})
-        return await cart_item.to_list(length=100)
+        cart_items = await find_page(
+            database.cart_items_collection,
+            {"cart_id": cart_id},
+            cursor,
+            page_size,
+            projection,
+        )
+        if with_cart and len(cart_items["items"]) > 0:
+            cart = await load_by_id(database, "carts", cart_id)
+            for cart_item in cart_items["items"]:
+                cart_item["cart"] = cart
+        return cart_items
 
+    except HTTPException:
+        raise
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -119,22 +119,9 @@ async def get_all_cart_items(database, cart_id: Union[str, ObjectId]):
         )
 
 
-async def get_cart_item_by_id(database, cart_item_id: Union[str, ObjectId]):
-    if ObjectId.is_valid(cart_item_id):
-        if (
-            cart_item := await database.cart_items_collection.find_one(
-                {"$or": [{"_id": cart_item_id}, {"_id": ObjectId(cart_item_id)}]}
-            )
-        ) is not None:
-            return cart_item
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Cart item with ID {cart_item_id} not found",
-        )
+async def get_cart_item_by_id(database, cart_item_id: str):
     if (
-        cart_item := await database.cart_items_collection.find_one(
-            {"_id": cart_item_id}
-        )
+        cart_item := await load_by_id(database, "cart_items", cart_item_id)
     ) is not None:
         return cart_item
     raise HTTPException(
@@ -143,7 +130,7 @@ async def get_cart_item_by_id(database, cart_item_id: Union[str, ObjectId]):
     )
 
 
-async def get_cart_item(database, cart_id: str, product_id: str):
+async def get_cart_item(database, cart_id: str, product_id: str, with_cart=False):
     try:
         cart = await get_cart_by_id(database, cart_id)
         if cart is None:
@@ -154,26 +141,17 @@ async def get_cart_item(database, cart_id: str, product_id: str):
     except Exception:
         return {"error_type": "create_update_cart_item", "error_msg": "Unknown cart"}
     else:
-        return await get_cart_item_by_product_id(database, product_id)
+        cart_item = await get_cart_item_by_product_id(database, cart_id, product_id)
+        if with_cart and cart_item is not None:
+            cart_item["cart"] = cart
+        return cart_item
 
 
-async def get_cart_item_by_product_id(database, product_id: str):
+async def get_cart_item_by_product_id(database, cart_id: str, product_id: str):
     try:
-        if ObjectId.is_valid(product_id):
-            if (
-                cart_item := await database.cart_items_collection.find_one(
-                    {
-                        "$or": [
-                            {"product._id": product_id},
-                            {"product._id": ObjectId(product_id)},
-                        ]
-                    }
-                )
-            ) is not None:
-                return cart_item
         if (
             cart_item := await database.cart_items_collection.find_one(
-                {"product._id": product_id}
+                {"cart_id": cart_id, "product._id": product_id}
             )
         ) is not None:
             return cart_item
@@ -185,131 +163,47 @@ async def get_cart_item_by_product_id(database, product_id: str):
         )
 
 
-async def update_cart_item_quantity_price(
-    database, product_id, new_quantity, new_item_price
-):
-    try:
-        update_result = await database.cart_items_collection.update_one(
-            {"product._id": product_id},
-            {"$set": {"quantity": new_quantity, "item_price": new_item_price}},
-        )
-
-        if update_result.modified_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail={
-                    "error_type": "update_user",
-                    "error_msg": f"User with product id {product_id} not found",
-                },
-            )
-        if (
-            cart_item := await get_cart_item_by_product_id(database, product_id)
-        ) is not None:
-            return cart_item
-
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail={
-                "error_type": "update_user",
-                "error_msg": f"User with product id {product_id} not found",
-            },
-        )
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail={
-                "error_type": "update_user",
-                "error_msg": f"User with product id {product_id} not found",
-            },
-        )
-
-
 async def delete_cart_item(database, cart_id: str, product_id: str, quantity=1):
     try:
-        cart = await get_cart_by_id(database, cart_id)
-        if cart is None:
+        # carrinho pago ou inexistente: nada muda, nem o item nem os totais
+        if await get_cart_by_id(database, cart_id) is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail={"error_type": "delete_cart_item", "error_msg": "Unknown cart"},
             )
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail={"error_type": "delete_cart_item", "error_msg": "Unknown cart"},
-        )
-    else:
-        try:
-            _quantity = quantity
-            if (
-                cart_item_to_delete := await get_cart_item_by_product_id(
-                    database, product_id
-                )
-            ) is None:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail={
-                        "error_type": "get_cart_by_id",
-                        "error_msg": "No cart_item to delete",
-                    },
-                )
-            _product_price = cart_item_to_delete.get("product").get("price")
-            _quantity = (
-                _quantity
-                if cart_item_to_delete.get("quantity") >= _quantity
-                else cart_item_to_delete.get("quantity")
-            )
-            aux_item_quantity = cart_item_to_delete.get("quantity") - _quantity
-            aux_item_price = round(_product_price * aux_item_quantity, 2)
-            if aux_item_quantity >= 1:
-                _new_cart_price = cart.get("price") - round(
-                    _product_price * _quantity, 2
-                )
-                _new_cart_price = 0 if _new_cart_price < 0 else _new_cart_price
-                if (
-                    await update_cart(
-                        database,
-                        cart.get("user").get("_id"),
-                        {
-                            "price": _new_cart_price,
-                            "items_quantity": cart.get("items_quantity") - _quantity
-                            if cart.get("items_quantity") - _quantity >= 0
-                            else 0,
-                        },
-                    )
-                ) is not None:
-                    return await update_cart_item_quantity_price(
-                        database, product_id, aux_item_quantity, aux_item_price
-                    )
+        cart_item_key = {"cart_id": cart_id, "product._id": product_id}
+        _quantity = quantity
 
-            deleted_cart_item = await database.cart_items_collection.delete_one(
-                {"product._id": product_id}
-            )
-            if deleted_cart_item.deleted_count == 0:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail={
-                        "error_type": "delete_cart_item",
-                        "error_msg": "Delete error. Contact the administrator",
+        # ainda sobra quantidade: decrementa e recalcula item_price no servidor
+        if (
+            cart_item := await database.cart_items_collection.find_one_and_update(
+                {**cart_item_key, "quantity": {"$gt": _quantity}},
+                [
+                    {"$set": {"quantity": {"$subtract": ["$quantity", _quantity]}}},
+                    {
+                        "$set": {
+                            "item_price": {
+                                "$round": [
+                                    {"$multiply": ["$product.price", "$quantity"]},
+                                    2,
+                                ]
+                            }
+                        }
                     },
-                )
-            _new_cart_price = cart.get("price") - round(_product_price * _quantity, 2)
-            _new_cart_price = 0 if _new_cart_price < 0 else _new_cart_price
+                ],
+                return_document=ReturnDocument.AFTER,
+            )
+        ) is not None:
+            prime_loader(database, "cart_items", cart_item)
             if (
-                await update_cart(
+                await increment_cart_totals(
                     database,
-                    cart.get("user").get("_id"),
-                    {
-                        "price": _new_cart_price,
-                        "items_quantity": cart.get("items_quantity") - _quantity
-                        if cart.get("items_quantity") - _quantity >= 0
-                        else 0,
-                    },
+                    cart_id,
+                    -cart_item.get("product").get("price") * _quantity,
+                    -_quantity,
                 )
             ) is not None:
-                return RedirectResponse(
-                    f"/cart/{cart.get('user').get('_id')}",
-                    status_code=status.HTTP_303_SEE_OTHER,
-                )
+                return cart_item
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail={
@@ -317,11 +211,48 @@ async def delete_cart_item(database, cart_id: str, product_id: str, quantity=1):
                     "error_msg": "Update cart error. Contact the administrator",
                 },
             )
-        except Exception:
+
+        # quantidade chega a zero: o item removido já traz o que falta descontar
+        if (
+            deleted_cart_item := await database.cart_items_collection.find_one_and_delete(
+                cart_item_key
+            )
+        ) is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail={
-                    "error_type": "delete_cart_item",
-                    "error_msg": "Update cart error. Contact the administrator",
+                    "error_type": "get_cart_by_id",
+                    "error_msg": "No cart_item to delete",
                 },
             )
+        clear_loader(database, "cart_items", deleted_cart_item["_id"])
+        _quantity = deleted_cart_item.get("quantity")
+        if (
+            cart := await increment_cart_totals(
+                database,
+                cart_id,
+                -deleted_cart_item.get("product").get("price") * _quantity,
+                -_quantity,
+            )
+        ) is not None:
+            return RedirectResponse(
+                f"/cart/{cart.get('user').get('_id')}",
+                status_code=status.HTTP_303_SEE_OTHER,
+            )
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "error_type": "delete_cart_item",
+                "error_msg": "Update cart error. Contact the administrator",
+            },
+        )
+    except HTTPException:
+        raise
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "error_type": "delete_cart_item",
+                "error_msg": "Update cart error. Contact the administrator",
+            },
+        )
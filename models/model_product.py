@@ -1,45 +1,201 @@
-from typing import List, Union
+from os import getenv
+from typing import List, Optional, Union
 
+from dotenv import load_dotenv
 from fastapi import APIRouter, Body, HTTPException, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import RedirectResponse
+from pydantic import ValidationError
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
 
-from schemas.product import Product, ProductUpdate
+from schemas.product import Product, ProductImport, ProductUpdate
+from utils.batch import find_by_ids
+from utils.data_loader import clear_loader, load_by_id, prime_loader
+from utils.lru_ttl_cache import LruTtlCache
+from utils.ndjson import ndjson_line
+from utils.pagination import DEFAULT_PAGE_SIZE, find_page
 
 router = APIRouter()
 
+PRODUCTS_CHUNK_SIZE = 1000
+PRODUCTS_IMPORT_BATCH_SIZE = 500
+DUPLICATE_KEY_ERROR = 11000
 
-async def create_products(database, products: Union[List[Product], Product] = Body(...)):
+load_dotenv()
+# catálogo muda pouco: leituras servidas da memória, escritas invalidam
+product_cache = LruTtlCache(
+    max_size=int(getenv("PRODUCT_CACHE_MAX_SIZE", "1024")),
+    ttl=float(getenv("PRODUCT_CACHE_TTL", "60")),
+)
+
+
+def product_insert_error(product_id: str, write_error: dict) -> dict:
+    if write_error.get("code") == DUPLICATE_KEY_ERROR:
+        return {
+            "error_type": "create_products",
+            "error_msg": f"Product with ID {product_id} already exists",
+        }
+    return {
+        "error_type": "create_products",
+        "error_msg": f"Insert error of the product with ID {product_id}. "
+        "Contact the administrator",
+    }
+
+
+async def create_products(
+    database, products: Union[List[Product], Product] = Body(...)
+):
     created_products = []
     new_products = products if isinstance(products, list) else [products]
-    for product in new_products:
-        _product = jsonable_encoder(product)
+    new_products = [jsonable_encoder(product) for product in new_products]
+    for start in range(0, len(new_products), PRODUCTS_CHUNK_SIZE):
+        end = start + PRODUCTS_CHUNK_SIZE
+        chunk = new_products[start:end]
+        insert_errors = {}
         try:
-            new_product = await database.product_collection.insert_one(_product)
+            await database.product_collection.insert_many(chunk, ordered=False)
+        except BulkWriteError as e:
+            insert_errors = {
+                write_error["index"]: write_error
+                for write_error in e.details.get("writeErrors", [])
+            }
         except Exception as e:
-            print("Erro na inserção", e)
-        else:
-            created_product = await database.product_collection.find_one(
-                {"_id": new_product.inserted_id}
+            print("create_products.error", e)
+            insert_errors = {index: {} for index in range(len(chunk))}
+
+        inserted_ids = [
+            product["_id"]
+            for index, product in enumerate(chunk)
+            if index not in insert_errors
+        ]
+        found_products = {}
+        if len(inserted_ids) > 0:
+            found_products = database.product_collection.find(
+                {"_id": {"$in": inserted_ids}}
             )
-            created_products.append(created_product)
+            found_products = {
+                product["_id"]: product
+                for product in await found_products.to_list(length=len(inserted_ids))
+            }
+        for index, product in enumerate(chunk):
+            if index not in insert_errors and product["_id"] in found_products:
+                created_products.append(found_products[product["_id"]])
+            else:
+                created_products.append(
+                    product_insert_error(product["_id"], insert_errors.get(index, {}))
+                )
+    product_cache.invalidate_prefix("list")
+    return created_products if len(created_products) != 1 else created_products[0]
+
+
+def product_import_error(line_number: int, error_msg: str) -> dict:
+    return {
+        "line": line_number,
+        "error_type": "import_products",
+        "error_msg": error_msg,
+    }
+
+
+async def upsert_products_batch(database, batch: list):
+    write_errors = []
+    try:
+        result = await database.product_collection.bulk_write(
+            [
+                ReplaceOne({"_id": product["_id"]}, product, upsert=True)
+                for _, product in batch
+            ],
+            ordered=False,
+        )
+        details = result.bulk_api_result
+    except BulkWriteError as e:
+        details = e.details
+        write_errors = details.get("writeErrors", [])
+    except Exception as e:
+        print("import_products.error", e)
+        details = {}
+        write_errors = [{"index": index} for index in range(len(batch))]
+
+    for _, product in batch:
+        product_cache.invalidate(("product", product["_id"]))
+    product_cache.invalidate_prefix("list")
     return (
-        created_products
-        if len(new_products) != 1 or len(created_products) != 1
-        else created_products[0]
+        details.get("nUpserted", 0),
+        details.get("nModified", 0),
+        [
+            product_import_error(
+                batch[write_error["index"]][0],
+                f"Upsert error of the product with ID "
+                f"{batch[write_error['index']][1]['_id']}. Contact the administrator",
+            )
+            for write_error in write_errors
+        ],
     )
 
 
-async def list_products(database):
-    products = database.product_collection.find()
-    products = await products.to_list(length=100)
+async def import_products(database, lines):
+    # cada linha é validada ao chegar; só um lote fica em memória por vez
+    totals = {"processed": 0, "upserted": 0, "modified": 0, "errors": 0}
+    batch = []
+
+    async def flush():
+        upserted, modified, errors = await upsert_products_batch(database, batch)
+        batch.clear()
+        totals["upserted"] += upserted
+        totals["modified"] += modified
+        totals["errors"] += len(errors)
+        return errors
+
+    async for line_number, line in lines:
+        totals["processed"] += 1
+        try:
+            # sem _id um novo uuid faria todo re-sync duplicar o catálogo
+            product = jsonable_encoder(ProductImport.parse_raw(line))
+        except ValidationError as e:
+            totals["errors"] += 1
+            yield ndjson_line(
+                product_import_error(
+                    line_number,
+                    "; ".join(
+                        f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+                        for error in e.errors()
+                    ),
+                )
+            )
+            continue
+        batch.append((line_number, product))
+        if len(batch) >= PRODUCTS_IMPORT_BATCH_SIZE:
+            for error in await flush():
+                yield ndjson_line(error)
+            yield ndjson_line(totals)
+
+    if len(batch) > 0:
+        for error in await flush():
+            yield ndjson_line(error)
+    yield ndjson_line({**totals, "done": True})
+
+
+async def list_products(
+    database,
+    cursor: Optional[str] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    projection: dict = None,
+):
+    cache_key = ("list", cursor, page_size, tuple(sorted(projection or ())))
+    if (products := product_cache.get(cache_key)) is not None:
+        return products
+    products = await find_page(
+        database.product_collection, {}, cursor, page_size, projection
+    )
+    product_cache.set(cache_key, products)
     return products
 
 
 async def list_product_by_id(database, product_id: str):
-    if (
-        product := await database.product_collection.find_one({"_id": product_id})
-    ) is not None:
+    if (product := product_cache.get(("product", product_id))) is not None:
+        return product
+    if (product := await load_by_id(database, "products", product_id)) is not None:
+        product_cache.set(("product", product_id), product)
         return product
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
@@ -47,6 +203,25 @@ async def list_product_by_id(database, product_id: str):
     )
 
 
+async def list_products_by_ids(database, product_ids: List[str]):
+    # só os que não estão no cache vão ao banco, todos num mesmo $in
+    cached = {}
+    for product_id in product_ids:
+        if (product := product_cache.get(("product", product_id))) is not None:
+            cached[product_id] = product
+    found = {"items": [], "missing_ids": []}
+    if missing_ids := [i for i in product_ids if i not in cached]:
+        found = await find_by_ids(database.product_collection, missing_ids)
+        for product in found["items"]:
+            prime_loader(database, "products", product)
+            product_cache.set(("product", product["_id"]), product)
+            cached[product["_id"]] = product
+    return {
+        "items": [cached[i] for i in product_ids if i in cached],
+        "missing_ids": found["missing_ids"],
+    }
+
+
 async def update_product(database, product_id: str, product: ProductUpdate = Body(...)):
     product = {k: v for k, v in product.dict().items() if v is not None}
 
@@ -54,6 +229,8 @@ async def update_product(database, product_id: str, product: ProductUpdate = Bod
         update_result = await database.product_collection.update_one(
             {"_id": product_id}, {"$set": product}
         )
+        invalidate_product(product_id)
+        clear_loader(database, "products", product_id)
 
         if update_result.modified_count == 0:
             raise HTTPException(
@@ -62,9 +239,7 @@ async def update_product(database, product_id: str, product: ProductUpdate = Bod
             )
 
     if (
-        existing_product := await database.product_collection.find_one(
-            {"_id": product_id}
-        )
+        existing_product := await load_by_id(database, "products", product_id)
     ) is not None:
         return existing_product
 
@@ -76,6 +251,8 @@ async def update_product(database, product_id: str, product: ProductUpdate = Bod
 
 async def delete_product(database, product_id: str):
     delete_result = await database.product_collection.delete_one({"_id": product_id})
+    invalidate_product(product_id)
+    clear_loader(database, "products", product_id)
 
     if delete_result.deleted_count == 1:
         return RedirectResponse("/products/", status_code=status.HTTP_303_SEE_OTHER)
@@ -84,3 +261,12 @@ async def delete_product(database, product_id: str):
         status_code=status.HTTP_404_NOT_FOUND,
         detail=f"Product with ID {product_id} not found",
     )
+
+
+def invalidate_product(product_id: str):
+    product_cache.invalidate(("product", product_id))
+    product_cache.invalidate_prefix("list")
+
+
+def get_product_cache_stats():
+    return product_cache.stats()
@@ -4,11 +4,23 @@ from typing import List, Optional, Union
 from fastapi import APIRouter, Body, HTTPException, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import RedirectResponse
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
 
+from schemas.batch import Batch
+from schemas.page import Page
 from schemas.project_errors import ProjectErrors
-from schemas.user import EmailsList, User, UserUpdate
+from schemas.user import DomainCount, EmailsList, User, UserUpdate
+from utils.batch import find_by_ids
 from utils.cascade_delete import cascade_delete
-from utils.validade_unique_email import validade_unique_email
+from utils.data_loader import clear_loader, load_by_id, prime_loader
+from utils.normalize_email import email_domain, normalize_email
+from utils.pagination import (
+    DEFAULT_PAGE_SIZE,
+    decode_cursor,
+    encode_cursor,
+    find_page,
+)
 
 router = APIRouter()
 
@@ -16,18 +28,19 @@ router = APIRouter()
 async def create_user(database, user):
     try:
         user = jsonable_encoder(user)
-        list_of_users = await list_users(database)
-        if not await validade_unique_email(list_of_users, user["email"]):
-            return {
-                "error_type": "create_user",
-                "error_msg": "It was not possible to create a new user. Contact the administrator",
-            }
+        user["email"] = normalize_email(user["email"])
+        user["email_domain"] = email_domain(user["email"])
         new_user = await database.users_collection.insert_one(user)
         created_user = await database.users_collection.find_one(
             {"_id": new_user.inserted_id}
         )
         return created_user
 
+    except DuplicateKeyError:
+        return {
+            "error_type": "create_user",
+            "error_msg": "This email is already in use. Use another one",
+        }
     except Exception as e:
         print("create_user.error", e)
         return {
@@ -36,38 +49,30 @@ async def create_user(database, user):
         }
 
 
-async def list_users(database, page: Optional[int] = None) -> Union[List[User], ProjectErrors]:
-    if page is None:
-        try:
-            users = database.users_collection.find()
-            users_list = await users.to_list(length=100)
-            return users_list
-
-        except Exception as e:
-            print("list_users.error", e)
-            return {
-                "error_type": "list_users",
-                "error_msg": "It was not possible to list users. Contact the administrator",
-            }
-
+async def list_users(
+    database, cursor: Optional[str] = None, page_size: int = DEFAULT_PAGE_SIZE
+) -> Union[Page[User], ProjectErrors]:
     try:
-        limit_per_page = 2
-        page = 1 if page < 1 else page
-        skip_page = limit_per_page * (page - 1) if page > 0 else 0
-        users = database.users_collection.find(skip=skip_page, limit=limit_per_page)
-        users_list = await users.to_list(length=limit_per_page)
-        return users_list
+        return await find_page(database.users_collection, {}, cursor, page_size)
 
+    except HTTPException:
+        raise
     except Exception as e:
-        print("list_users_by_page.error", e)
+        print("list_users.error", e)
         return {
-            "error_type": "list_users_by_page",
-            "error_msg": "It was not possible to list users by this page. Contact the administrator",
+            "error_type": "list_users",
+            "error_msg": "It was not possible to list users. Contact the administrator",
         }
 
 
-async def get_user_by_id(database, user_id: str) -> Union[User, ProjectErrors]:
-    user = await database.users_collection.find_one({"_id": user_id})
+async def get_user_by_id(
+    database, user_id: str, projection: dict = None
+) -> Union[User, ProjectErrors]:
+    user = (
+        await load_by_id(database, "users", user_id)
+        if projection is None
+        else await database.users_collection.find_one({"_id": user_id}, projection)
+    )
     if user is not None:
         return user
     raise HTTPException(
@@ -79,6 +84,13 @@ async def get_user_by_id(database, user_id: str) -> Union[User, ProjectErrors]:
     )
 
 
+async def get_users_by_ids(database, user_ids: List[str]) -> Batch[User]:
+    users = await find_by_ids(database.users_collection, user_ids)
+    for user in users["items"]:
+        prime_loader(database, "users", user)
+    return users
+
+
 async def get_users_by_name(database, user_name: str) -> Union[List[User], ProjectErrors]:
     try:
         user = database.users_collection.find({"name": user_name})
@@ -99,11 +111,21 @@ async def update_user(
     database, user_id: str, user: UserUpdate = Body(...)
 ) -> ProjectErrors:
     user = {k: v for k, v in user.dict().items() if v is not None}
+    if "email" in user:
+        user["email"] = normalize_email(user["email"])
+        user["email_domain"] = email_domain(user["email"])
 
     if len(user) >= 1:
-        update_result = await database.users_collection.update_one(
-            {"_id": user_id}, {"$set": user}
-        )
+        try:
+            update_result = await database.users_collection.update_one(
+                {"_id": user_id}, {"$set": user}
+            )
+            clear_loader(database, "users", user_id)
+        except DuplicateKeyError:
+            return {
+                "error_type": "update_user",
+                "error_msg": "This email is already in use. Use another one",
+            }
 
         if update_result.modified_count == 0:
             raise HTTPException(
@@ -114,7 +136,7 @@ async def update_user(
                 },
             )
 
-    if await database.users_collection.find_one({"_id": user_id}) is not None:
+    if await load_by_id(database, "users", user_id) is not None:
         return RedirectResponse(
             f"/user/{user_id}/", status_code=status.HTTP_303_SEE_OTHER
         )
@@ -131,6 +153,7 @@ async def update_user(
 async def delete_user(database, user_id: str):
     try:
         delete_result = await database.users_collection.delete_one({"_id": user_id})
+        clear_loader(database, "users", user_id)
         if delete_result.deleted_count == 1:
             await cascade_delete(database, user_id)
             return RedirectResponse("/user/", status_code=status.HTTP_303_SEE_OTHER)
@@ -152,22 +175,37 @@ async def delete_user(database, user_id: str):
         )
 
 
-async def get_emails_by_domain(database, domain: str) -> Union[EmailsList, ProjectErrors]:
+async def get_emails_by_domain(
+    database,
+    domain: str,
+    cursor: Optional[str] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> Union[EmailsList, ProjectErrors]:
+    if not match(r"^@[a-zA-Z]+\.[a-zA-Z]{1,3}$", domain):
+        return {
+            "error_type": "get_emails_by_domain",
+            "error_msg": "Invalid domain",
+        }
+    # keyset pelo email, a página e a contagem cobertas pelo índice
+    # (email_domain, email)
+    query = {"email_domain": email_domain(domain)}
+    emails_query = (
+        {**query, "email": {"$gt": decode_cursor(cursor)}} if cursor else query
+    )
     try:
-        if not match(r"^@[a-zA-Z]+\.[a-zA-Z]{1,3}$", domain):
-            return {
-                "error_type": "get_emails_by_domain",
-                "error_msg": "Invalid domain",
-            }
-        emails_list = database.users_collection.find(
-            {"email": {"$regex": f"{domain}$", "$options": "i"}},
-            {"_id": 0, "email": 1},
+        emails_list = (
+            database.users_collection.find(emails_query, {"_id": 0, "email": 1})
+            .sort("email", ASCENDING)
+            .limit(page_size + 1)
         )
-        emails_list = await emails_list.to_list(length=100)
+        emails_list = await emails_list.to_list(length=page_size + 1)
         emails_list = [v["email"] for v in emails_list]
         return {
-            "emails_count": len(emails_list),
-            "emails_list": emails_list,
+            "emails_count": await database.users_collection.count_documents(query),
+            "emails_list": emails_list[:page_size],
+            "next_cursor": encode_cursor(emails_list[page_size - 1])
+            if len(emails_list) > page_size
+            else None,
         }
 
     except Exception as e:
@@ -176,3 +214,27 @@ async def get_emails_by_domain(database, domain: str) -> Union[EmailsList, Proje
             "error_type": "get_emails_by_domain",
             "error_msg": "Get emails by domain failured. Contact the administrator",
         }
+
+
+async def count_emails_by_domain(
+    database, limit: int = 100
+) -> Union[List[DomainCount], ProjectErrors]:
+    try:
+        domains = database.users_collection.aggregate(
+            [
+                # usuários sem email_domain formariam um grupo _id: null
+                {"$match": {"email_domain": {"$type": "string"}}},
+                {"$group": {"_id": "$email_domain", "emails_count": {"$sum": 1}}},
+                {"$sort": {"emails_count": DESCENDING, "_id": ASCENDING}},
+                {"$limit": limit},
+                {"$project": {"_id": 0, "domain": "$_id", "emails_count": 1}},
+            ]
+        )
+        return await domains.to_list(length=limit)
+
+    except Exception as e:
+        print("count_emails_by_domain.error", e)
+        return {
+            "error_type": "count_emails_by_domain",
+            "error_msg": "Count emails by domain failured. Contact the administrator",
+        }
@@ -1,42 +1,20 @@
+from os import getenv
+
+from dotenv import load_dotenv
+
 from utils.blender_bcolors import bcolors
 
+load_dotenv()
+
+LOGS_DIR = "project_logs/logs"
+LOG_FILES = ("errors", "access")
+# rotação por tamanho; com LOG_ROTATE_WHEN (ex.: midnight) passa a ser por tempo
+LOG_MAX_BYTES = int(getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(getenv("LOG_BACKUP_COUNT", "5"))
+LOG_ROTATE_WHEN = getenv("LOG_ROTATE_WHEN")
+LOG_LEVEL = getenv("LOG_LEVEL", "INFO").upper()
+# com vários workers cada processo rotaciona o seu arquivo (errors.<pid>.log)
+LOG_FILE_PER_PROCESS = getenv("LOG_FILE_PER_PROCESS", "false").lower() == "true"
 
-def config(dados):
-    return {
-        "version": 1,
-        "formatters": {
-            "console": {
-                "class": "logging.Formatter",
-                "format": f"""{bcolors.WARNING}%(threadName)s %(processName)s %(asctime)s {bcolors.FAIL}{bcolors.BOLD
-            }%(levelname)s{bcolors.WARNING} %(name)s{bcolors.ENDC}\n%(message)s\n""",
-            },
-            "file": {
-                "class": "logging.Formatter",
-                "format": "%(threadName)s %(processName)s %(asctime)s %(levelname)s %(name)s\n%(message)s\n",
-            },
-        },
-        "handlers": {
-            "console": {
-                "class": "logging.StreamHandler",
-                "level": "INFO",
-                "formatter": "console",
-            },
-            "file": {
-                "class": "logging.FileHandler",
-                "filename": f"{dados['filename']}.log",
-                "mode": "a",
-                "formatter": "file",
-                "level": "INFO",
-                "encoding": "UTF-8",
-            },
-        },
-        "loggers": {
-            dados["filename"]: {
-                "handlers": ["file"],
-            },
-        },
-        "root": {
-            "level": "DEBUG",
-            "handlers": ["console"],
-        },
-    }
+CONSOLE_FORMAT = f"""{bcolors.WARNING}%(threadName)s %(processName)s %(asctime)s {bcolors.FAIL}{bcolors.BOLD
+}%(levelname)s{bcolors.WARNING} %(name)s{bcolors.ENDC}\n%(message)s\n"""
@@ -1,15 +1,133 @@
-from logging import getLogger
-from logging.config import dictConfig
+from copy import copy
+from json import dumps
+from logging import Filter, Formatter, LogRecord, StreamHandler, getLogger
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler,
+)
+from os import getpid
+from queue import SimpleQueue
 
-from project_logs.config import config
+from project_logs import config
 
+log_queue = SimpleQueue()
+log_listener = None
+queue_handler = None
+root_level = None
 
-def set_logging(file_name):
-    _file_name = f"project_logs/logs/{file_name}"
-    log_config = config({"filename": _file_name})
-    dictConfig(log_config)
-    auxLogger = getLogger(
-        _file_name,
+
+class JsonFormatter(Formatter):
+    """
+    One JSON object per line, with the fields of the dict messages
+    """
+
+    def format(self, record: LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        if isinstance(record.msg, dict):
+            entry.update(record.msg)
+        else:
+            entry["message"] = record.getMessage()
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return dumps(entry, default=str)
+
+
+class StructuredQueueHandler(QueueHandler):
+    """
+    QueueHandler that keeps the dict messages for the JsonFormatter
+    """
+
+    def prepare(self, record: LogRecord) -> LogRecord:
+        # o QueueHandler padrão achata a mensagem em texto antes de enfileirar
+        record = copy(record)
+        if record.exc_info:
+            record.exc_text = Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if not isinstance(record.msg, dict):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+def logger_name(file_name: str) -> str:
+    return f"{config.LOGS_DIR}/{file_name}"
+
+
+def file_handler(file_name: str):
+    filename = f"{logger_name(file_name)}.log"
+    if config.LOG_FILE_PER_PROCESS:
+        # dois processos rotacionando o mesmo arquivo perdem registros
+        filename = f"{logger_name(file_name)}.{getpid()}.log"
+    if config.LOG_ROTATE_WHEN:
+        handler = TimedRotatingFileHandler(
+            filename,
+            when=config.LOG_ROTATE_WHEN,
+            backupCount=config.LOG_BACKUP_COUNT,
+            encoding="UTF-8",
+            delay=True,
+        )
+    else:
+        handler = RotatingFileHandler(
+            filename,
+            maxBytes=config.LOG_MAX_BYTES,
+            backupCount=config.LOG_BACKUP_COUNT,
+            encoding="UTF-8",
+            delay=True,
+        )
+    handler.setLevel(config.LOG_LEVEL)
+    handler.setFormatter(JsonFormatter())
+    # cada arquivo só recebe o seu logger
+    handler.addFilter(Filter(logger_name(file_name)))
+    return handler
+
+
+def setup_logging(file_names=config.LOG_FILES):
+    # uma vez por processo, no startup: o event loop só enfileira os registros,
+    # a escrita em console e arquivos fica na thread do QueueListener
+    global log_listener, queue_handler, root_level
+    if log_listener is not None:
+        return log_listener
+    console_handler = StreamHandler()
+    console_handler.setLevel(config.LOG_LEVEL)
+    console_handler.setFormatter(Formatter(config.CONSOLE_FORMAT))
+
+    # junto dos handlers que já existem (uvicorn, bibliotecas); o nível do
+    # root barra o DEBUG antes da fila
+    root_logger = getLogger()
+    root_level = root_logger.level
+    root_logger.setLevel(config.LOG_LEVEL)
+    queue_handler = StructuredQueueHandler(log_queue)
+    root_logger.addHandler(queue_handler)
+    log_listener = QueueListener(
+        log_queue,
+        console_handler,
+        *[file_handler(file_name) for file_name in file_names],
+        respect_handler_level=True,
     )
-    auxLogger.disabled = False
-    return auxLogger
+    log_listener.start()
+    return log_listener
+
+
+def shutdown_logging():
+    global log_listener, queue_handler, root_level
+    if log_listener is None:
+        return
+    log_listener.stop()
+    for handler in log_listener.handlers:
+        handler.close()
+    getLogger().removeHandler(queue_handler)
+    # devolve o nível que o root tinha antes do setup_logging
+    getLogger().setLevel(root_level)
+    log_listener = None
+    queue_handler = None
+    root_level = None
+
+
+def get_logger(file_name: str):
+    return getLogger(logger_name(file_name))
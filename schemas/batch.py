@@ -0,0 +1,15 @@
+from typing import Generic, List, TypeVar
+
+from pydantic import Field
+from pydantic.generics import GenericModel
+
+T = TypeVar("T")
+
+
+class Batch(GenericModel, Generic[T]):
+    """
+    Class for documents asked by a list of IDs, in the asked order
+    """
+
+    items: List[T] = Field(...)
+    missing_ids: List[str] = Field(default=[])
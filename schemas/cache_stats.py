@@ -0,0 +1,15 @@
+from pydantic import BaseModel, Field
+
+
+class CacheStats(BaseModel):
+    """
+    Class for the counters of an in-process cache
+    """
+
+    size: int = Field(...)
+    max_size: int = Field(...)
+    ttl: float = Field(...)
+    hits: int = Field(...)
+    misses: int = Field(...)
+    evictions: int = Field(...)
+    hit_ratio: float = Field(...)
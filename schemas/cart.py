@@ -1,14 +1,12 @@
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional, Union
-from uuid import uuid4
+from typing import Optional
 
-from bson.objectid import ObjectId
 from pydantic import BaseModel, Field
 
 from schemas.address import Address
 from schemas.user import User
-from utils.pydantic_objectid import PyObjectId
+from utils.ids import new_id
 
 
 class Cart(BaseModel):
@@ -16,7 +14,7 @@ class Cart(BaseModel):
     Class for a Cart of the User
     """
 
-    id: Union[PyObjectId, str] = Field(default_factory=uuid4, alias="_id")
+    id: str = Field(default_factory=new_id, alias="_id")
     user: User
     price: Decimal = Field(max_digits=10, decimal_places=2)
     paid: bool = Field(default=False)
@@ -28,8 +26,6 @@ class Cart(BaseModel):
     class Config:
         allow_population_by_field_name = True
         arbitrary_types_allowed = True
-        smart_union = True
-        json_encoders = {ObjectId: str}
 
 
 class CartInsert(BaseModel):
@@ -1,4 +1,5 @@
-from bson.objectid import ObjectId
+from typing import List, Optional
+
 from pydantic import BaseModel
 
 from schemas.cart import Cart
@@ -7,16 +8,16 @@ from schemas.product import Product
 
 class CartItem(BaseModel):
     """
-    Class for a Cart Item
+    Class for a Cart Item, the cart only comes when asked with with_cart
     """
 
-    cart: Cart
+    cart_id: str
+    cart: Optional[Cart] = None
     product: Product
     quantity: int = 1
 
     class Config:
         allow_population_by_field_name = True
-        json_encoders = {ObjectId: str}
 
 
 class CartItemUpdate(BaseModel):
@@ -27,3 +28,12 @@ class CartItemUpdate(BaseModel):
     product: Product
     quantity: int = 1
     item_price: int = 0
+
+
+class CartWithItems(Cart):
+    """
+    Class for a Cart with a page of its items
+    """
+
+    items: List[CartItem] = []
+    next_cursor: Optional[str] = None
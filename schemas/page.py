@@ -0,0 +1,15 @@
+from typing import Generic, List, Optional, TypeVar
+
+from pydantic import Field
+from pydantic.generics import GenericModel
+
+T = TypeVar("T")
+
+
+class Page(GenericModel, Generic[T]):
+    """
+    Class for a page of a list, with the cursor of the next page
+    """
+
+    items: List[T] = Field(...)
+    next_cursor: Optional[str] = Field(default=None)
@@ -1,10 +1,8 @@
-from typing import Optional, Union
-from uuid import uuid4
+from typing import Optional
 
-from bson.objectid import ObjectId
 from pydantic import BaseModel, Field
 
-from utils.pydantic_objectid import PyObjectId
+from utils.ids import new_id
 
 
 class Product(BaseModel):
@@ -12,15 +10,21 @@ class Product(BaseModel):
     Product data class
     """
 
-    id: Union[str, PyObjectId] = Field(default_factory=uuid4, alias="_id")
+    id: str = Field(default_factory=new_id, alias="_id")
     name: str = Field(...)
     description: str = Field(...)
     price: float = Field(...)
 
     class Config:
         allow_population_by_field_name = True
-        smart_union = True
-        json_encoders = {ObjectId: str}
+
+
+class ProductImport(Product):
+    """
+    Product of an import line, the _id is the key of the upsert
+    """
+
+    id: str = Field(..., alias="_id")
 
 
 class ProductUpdate(BaseModel):
@@ -0,0 +1,19 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class SlowQuery(BaseModel):
+    """
+    Class for a MongoDB command slower than SLOW_QUERY_MS
+    """
+
+    time: datetime = Field(...)
+    command_name: str = Field(...)
+    database: str = Field(...)
+    collection: Optional[str] = None
+    duration_ms: float = Field(...)
+    route: Optional[str] = None
+    command: dict = Field(...)
+    explain: Optional[str] = None
@@ -1,11 +1,9 @@
-from typing import List, Optional, Union
-from uuid import uuid4
+from typing import List, Optional
 
-from bson.objectid import ObjectId
 from pydantic import BaseModel, Field, SecretStr
 
 from schemas.address import Address
-from utils.pydantic_objectid import PyObjectId
+from utils.ids import new_id
 
 email_pattern = r"^([\da-zA-Z]+){3,}@[\da-zA-Z]+\.[a-zA-Z]+(\.[a-zA-Z]+)?$"
 
@@ -15,7 +13,7 @@ class User(BaseModel):
     Class for Users
     """
 
-    id: Union[str, PyObjectId] = Field(default_factory=uuid4, alias="_id")
+    id: str = Field(default_factory=new_id, alias="_id")
     name: str = Field(...)
     email: str = Field(regex=email_pattern)
     pwd: SecretStr = Field(...)
@@ -23,8 +21,6 @@ class User(BaseModel):
 
     class Config:
         allow_population_by_field_name = True
-        smart_union = True
-        json_encoders = {ObjectId: str}
 
 
 class UserUpdate(BaseModel):
@@ -44,3 +40,13 @@ class EmailsList(BaseModel):
 
     emails_count: int = Field(...)
     emails_list: List[str] = Field(...)
+    next_cursor: Optional[str] = Field(default=None)
+
+
+class DomainCount(BaseModel):
+    """
+    Class to show the number of Emails of a domain
+    """
+
+    domain: str = Field(...)
+    emails_count: int = Field(...)
@@ -0,0 +1,147 @@
+from collections import deque
+from datetime import datetime
+from json import loads
+from os import getenv
+from threading import Lock
+
+from bson import json_util
+from dotenv import load_dotenv
+from pymongo import monitoring
+
+from utils.request_timing import request_timing
+
+load_dotenv()
+SLOW_QUERY_MS = float(getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_BUFFER_SIZE = int(getenv("SLOW_QUERY_BUFFER_SIZE", "100"))
+# campos do protocolo que não dizem nada sobre a consulta
+IGNORED_COMMAND_FIELDS = {
+    "$clusterTime",
+    "$db",
+    "$readPreference",
+    "lsid",
+    "txnNumber",
+}
+EXPLAINABLE_COMMANDS = {"aggregate", "count", "delete", "distinct", "find", "update"}
+
+
+def command_summary(command_name: str, command: dict) -> dict:
+    summary = {k: v for k, v in command.items() if k not in IGNORED_COMMAND_FIELDS}
+    # inserts levam os documentos inteiros: guarda só quantos eram
+    if command_name == "insert" and "documents" in summary:
+        summary["documents"] = len(summary["documents"])
+    return summary
+
+
+class RequestCommandListener(monitoring.CommandListener):
+    """
+    Counts the commands of each request and keeps the slowest ones
+    """
+
+    def __init__(self) -> None:
+        self.slow_queries = deque(maxlen=SLOW_QUERY_BUFFER_SIZE)
+        self._started = {}
+        self._lock = Lock()
+
+    def started(self, event) -> None:
+        if event.command_name == "explain":
+            # o explain pedido pelo endpoint não entra no buffer
+            return
+        # roda na thread do executor do Motor, que copia o contexto da
+        # requisição: o contextvar ainda aponta para ela
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            # getMore leva o id do cursor; a collection vem em "collection"
+            collection = event.command.get("collection")
+        self._started[(event.connection_id, event.request_id)] = (
+            request_timing.get(),
+            event.database_name,
+            collection,
+            event.command,
+        )
+
+    def succeeded(self, event) -> None:
+        self._finished(event)
+
+    def failed(self, event) -> None:
+        self._finished(event)
+
+    def _finished(self, event) -> None:
+        started = self._started.pop((event.connection_id, event.request_id), None)
+        if started is None:
+            return
+        timing, database_name, collection, command = started
+        seconds = event.duration_micros / 1_000_000
+        if timing is not None:
+            with self._lock:
+                timing.add_command(seconds)
+        if seconds * 1000 >= SLOW_QUERY_MS:
+            command = command_summary(event.command_name, command)
+            self.slow_queries.append(
+                {
+                    "time": datetime.now(),
+                    "command_name": event.command_name,
+                    "database": database_name,
+                    "collection": collection,
+                    "duration_ms": round(seconds * 1000, 2),
+                    "route": timing.route if timing is not None else None,
+                    # versão JSON para o endpoint; o dict original vai para o explain
+                    "command": loads(json_util.dumps(command)),
+                    "explain": None,
+                    "_command": command,
+                }
+            )
+
+
+command_listener = RequestCommandListener()
+
+
+def plan_stages(plan: dict) -> list:
+    stages = []
+    while plan:
+        stages.append(plan.get("stage", "?"))
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return stages
+
+
+def explain_summary(explain: dict) -> str:
+    # ex.: "IXSCAN(cart_id__id) > FETCH" ou "COLLSCAN"
+    planner = explain.get("queryPlanner")
+    if planner is None:
+        stages = explain.get("stages") or [{}]
+        planner = stages[0].get("$cursor", {}).get("queryPlanner", {})
+    plan = planner.get("winningPlan", {})
+    plan = plan.get("queryPlan", plan)
+    index_names = []
+    node = plan
+    while node:
+        if node.get("indexName"):
+            index_names.append(node["indexName"])
+        node = node.get("inputStage") or (node.get("inputStages") or [None])[0]
+    stages = " > ".join(reversed(plan_stages(plan))) or "?"
+    if index_names:
+        stages = f"{stages} ({', '.join(index_names)})"
+    return stages
+
+
+async def explain_slow_query(client, slow_query: dict) -> None:
+    if (
+        slow_query["explain"] is not None
+        or slow_query["command_name"] not in EXPLAINABLE_COMMANDS
+    ):
+        return
+    try:
+        explain = await client[slow_query["database"]].command(
+            {"explain": slow_query["_command"], "verbosity": "queryPlanner"}
+        )
+        slow_query["explain"] = explain_summary(explain)
+    except Exception as e:
+        slow_query["explain"] = f"explain failed: {e}"
+
+
+async def list_slow_queries(client, limit: int, explain: bool = False) -> list:
+    # as mais recentes primeiro
+    slow_queries = list(reversed(command_listener.slow_queries))[:limit]
+    if explain:
+        for slow_query in slow_queries:
+            await explain_slow_query(client, slow_query)
+    return slow_queries
@@ -4,39 +4,63 @@ from os import getenv
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from server.command_monitor import command_listener
+from server.memory_db import AsyncMemoryClient
+from server.timed_collection import TimedCollection
+from utils.data_loader import DataLoaders
+
 
 class DataBase:
     client: AsyncIOMotorClient = None
     database_uri = None
+    max_pool_size = None
+    min_pool_size = None
+    backend = None
     users_collection = None
     address_collection = None
     product_collection = None
     cart_collection = None
     cart_items_collection = None
+    migrations_collection = None
     logger = None
 
     def __init__(self) -> None:
         load_dotenv()
         self.database_uri = getenv("DATABASE_URI")
+        self.max_pool_size = int(getenv("DATABASE_MAX_POOL_SIZE", "100"))
+        self.min_pool_size = int(getenv("DATABASE_MIN_POOL_SIZE", "10"))
+        self.backend = getenv("DATABASE_BACKEND", "mongo")
 
     def connect_db(self):
-        # conexao mongo, com no máximo 10 conexões async
-        self.client = AsyncIOMotorClient(
+        # conexao mongo, pool configurado por DATABASE_MAX_POOL_SIZE/DATABASE_MIN_POOL_SIZE
+        # backend "memory": sem cluster, os dados ficam no processo
+        client_class = (
+            AsyncMemoryClient if self.backend == "memory" else AsyncIOMotorClient
+        )
+        self.client = client_class(
             self.database_uri,
-            maxPoolSize=10,
-            minPoolSize=10,
+            maxPoolSize=self.max_pool_size,
+            minPoolSize=self.min_pool_size,
             tls=True,
             tlsAllowInvalidCertificates=True,
+            event_listeners=[command_listener],
         )
         self.client.get_io_loop = get_event_loop
-        self.users_collection = self.client.shopping_cart.users
-        self.address_collection = self.client.shopping_cart.address
-        self.product_collection = self.client.shopping_cart.products
-        self.cart_collection = self.client.shopping_cart.cart
-        self.cart_items_collection = self.client.shopping_cart.cart_items
+        self.users_collection = TimedCollection(self.client.shopping_cart.users)
+        self.address_collection = TimedCollection(self.client.shopping_cart.address)
+        self.product_collection = TimedCollection(self.client.shopping_cart.products)
+        self.cart_collection = TimedCollection(self.client.shopping_cart.cart)
+        self.cart_items_collection = TimedCollection(
+            self.client.shopping_cart.cart_items
+        )
+        self.migrations_collection = TimedCollection(
+            self.client.shopping_cart.migrations
+        )
 
     def disconnect_db(self):
-        self.client.close()
+        if self.client is not None:
+            self.client.close()
+            self.client = None
 
 
 class ContextDb:
@@ -51,6 +75,24 @@ class ContextDb:
         self.db.client.close()
 
 
+class RequestDataBase:
+    """
+    The shared database of the worker with the DataLoaders of one request
+    """
+
+    def __init__(self, database) -> None:
+        self.database = database
+        self.loaders = DataLoaders(database)
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+
+# um único client (e pool) por processo worker, aberto no startup do app
+shared_db = DataBase()
+
+
 async def get_db():
-    with ContextDb() as db:
-        yield db
+    if shared_db.client is None:
+        shared_db.connect_db()
+    yield RequestDataBase(shared_db)
@@ -1,8 +1,15 @@
+from asyncio import get_event_loop
 from os import getenv
 
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from server.command_monitor import command_listener
+from server.database import RequestDataBase
+from server.memory_db import AsyncMemoryClient
+from server.migrations import apply_migrations
+from server.timed_collection import TimedCollection
+
 
 class DataBaseTest:
     client: AsyncIOMotorClient = None
@@ -11,26 +18,48 @@ class DataBaseTest:
     product_collection = None
     cart_collection = None
     cart_items_collection = None
+    migrations_collection = None
     database_uri = None
+    max_pool_size = None
+    min_pool_size = None
+    backend = None
 
     def __init__(self) -> None:
         load_dotenv()
         self.database_uri = getenv("DATABASE_URI")
+        self.max_pool_size = int(getenv("DATABASE_MAX_POOL_SIZE", "10"))
+        self.min_pool_size = int(getenv("DATABASE_MIN_POOL_SIZE", "10"))
+        self.backend = getenv("TEST_DATABASE_BACKEND", "memory")
 
     def connect_db(self):
-        # conexao mongo, com no máximo 10 conexões async
-        self.client = AsyncIOMotorClient(
+        # conexao mongo, pool configurado por DATABASE_MAX_POOL_SIZE/DATABASE_MIN_POOL_SIZE
+        # backend "memory": sem cluster, os dados ficam no processo
+        client_class = (
+            AsyncMemoryClient if self.backend == "memory" else AsyncIOMotorClient
+        )
+        self.client = client_class(
             self.database_uri,
-            maxPoolSize=10,
-            minPoolSize=10,
+            maxPoolSize=self.max_pool_size,
+            minPoolSize=self.min_pool_size,
             tls=True,
             tlsAllowInvalidCertificates=True,
+            event_listeners=[command_listener],
+        )
+        self.client.get_io_loop = get_event_loop
+        self.users_collection = TimedCollection(self.client.shopping_cart_test.users)
+        self.address_collection = TimedCollection(
+            self.client.shopping_cart_test.address
+        )
+        self.product_collection = TimedCollection(
+            self.client.shopping_cart_test.products
+        )
+        self.cart_collection = TimedCollection(self.client.shopping_cart_test.carts)
+        self.cart_items_collection = TimedCollection(
+            self.client.shopping_cart_test.cart_items
+        )
+        self.migrations_collection = TimedCollection(
+            self.client.shopping_cart_test.migrations
         )
-        self.users_collection = self.client.shopping_cart_test.users
-        self.address_collection = self.client.shopping_cart_test.address
-        self.product_collection = self.client.shopping_cart_test.products
-        self.cart_collection = self.client.shopping_cart_test.carts
-        self.cart_items_collection = self.client.shopping_cart_test.cart_items
 
     async def disconnect_db(self):
         await self.users_collection.drop()
@@ -38,7 +67,9 @@ class DataBaseTest:
         await self.product_collection.drop()
         await self.cart_collection.drop()
         await self.cart_items_collection.drop()
+        await self.migrations_collection.drop()
         self.client.close()
+        self.client = None
 
 
 class ContextDb:
@@ -53,11 +84,22 @@ class ContextDb:
         self.db.client.close()
 
 
+shared_db = DataBaseTest()
+
+
 async def get_db():
-    with ContextDb() as db:
-        yield db
+    if shared_db.client is None:
+        shared_db.connect_db()
+    yield RequestDataBase(shared_db)
 
 
 async def drop_databases_to_test():
-    with ContextDb() as db:
-        await db.disconnect_db()
+    if shared_db.client is None:
+        shared_db.connect_db()
+    await shared_db.disconnect_db()
+
+
+async def apply_migrations_to_test():
+    if shared_db.client is None:
+        shared_db.connect_db()
+    await apply_migrations(shared_db)
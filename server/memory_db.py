@@ -0,0 +1,1379 @@
+"""
+In-memory backend with the subset of the Motor API used by the models.
+
+AsyncMemoryClient takes the place of AsyncIOMotorClient: client[db][collection]
+gives a MemoryCollection with find, find_one, insert, update (operators and
+pipelines), delete, find_one_and_*, bulk_write, aggregate and the index
+methods, all as coroutines. Unique indexes raise DuplicateKeyError and the first
+field of each index is kept in a hash map, so lookups by key don't scan the
+collection. There is no I/O: each process (or each pytest-xdist worker) has its
+own data, so the tests and the benchmarks run offline and in parallel.
+
+Like a round trip to the server, every operation yields to the event loop
+(sleep(0)) before running: concurrent callers interleave between operations,
+so a read-modify-write split in two calls races as it would on MongoDB, while
+each single operation stays atomic.
+
+    server.database_test uses it unless TEST_DATABASE_BACKEND=mongo, and the app
+    uses it with DATABASE_BACKEND=memory
+"""
+import re
+from asyncio import sleep
+from bisect import bisect_left, insort
+from datetime import datetime
+from heapq import nlargest, nsmallest
+from itertools import count
+
+from bson import Decimal128, ObjectId
+from pymongo import (
+    DeleteMany,
+    DeleteOne,
+    IndexModel,
+    InsertOne,
+    ReplaceOne,
+    UpdateMany,
+)
+from pymongo.errors import (
+    BulkWriteError,
+    DuplicateKeyError,
+    OperationFailure,
+    WriteError,
+)
+from pymongo.results import (
+    BulkWriteResult,
+    DeleteResult,
+    InsertManyResult,
+    InsertOneResult,
+    UpdateResult,
+)
+
+MISSING = object()
+# um "servidor" por host: clients com a mesma uri veem os mesmos dados
+memory_servers = {}
+
+
+def clone(value):
+    # documentos só têm tipos BSON: dict, list e escalares imutáveis
+    if isinstance(value, dict):
+        return {k: clone(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [clone(v) for v in value]
+    return value
+
+
+def freeze(value):
+    # versão hashable de um valor, para chaves de índice e de $group
+    if isinstance(value, dict):
+        return ("dict", tuple((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return ("list", tuple(freeze(v) for v in value))
+    if isinstance(value, bool):
+        return ("bool", value)
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    return value
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float, Decimal128)) and not isinstance(value, bool)
+
+
+def type_rank(value) -> int:
+    # ordem de comparação entre tipos BSON
+    if value is None or value is MISSING:
+        return 1
+    if is_number(value):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, list):
+        return 5
+    if isinstance(value, bytes):
+        return 6
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+
+def sort_key(value):
+    rank = type_rank(value)
+    if rank == 1:
+        return (rank, 0)
+    if isinstance(value, Decimal128):
+        return (rank, value.to_decimal())
+    if rank == 4:
+        return (rank, tuple((k, sort_key(v)) for k, v in value.items()))
+    if rank == 5:
+        return (rank, tuple(sort_key(v) for v in value))
+    return (rank, value)
+
+
+def values_equal(a, b) -> bool:
+    if a is MISSING:
+        a = None
+    if type_rank(a) != type_rank(b):
+        return False
+    if isinstance(a, Decimal128) or isinstance(b, Decimal128):
+        return sort_key(a) == sort_key(b)
+    return a == b
+
+
+def get_values(document, path: str) -> list:
+    # todos os valores do caminho, entrando nos arrays de subdocumentos
+    values = [document]
+    for part in path.split("."):
+        next_values = []
+        for value in values:
+            if isinstance(value, dict):
+                if part in value:
+                    next_values.append(value[part])
+            elif isinstance(value, list):
+                if part.isdigit() and int(part) < len(value):
+                    next_values.append(value[int(part)])
+                for item in value:
+                    if isinstance(item, dict) and part in item:
+                        next_values.append(item[part])
+        values = next_values
+    return values
+
+
+def get_value(document, path: str):
+    # valor de um caminho como nas expressões de agregação ("$a.b")
+    value = document
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part, MISSING)
+        elif isinstance(value, list):
+            value = [
+                item[part] for item in value if isinstance(item, dict) and part in item
+            ]
+        else:
+            return MISSING
+        if value is MISSING:
+            return MISSING
+    return value
+
+
+def set_value(document: dict, path: str, value) -> None:
+    parts = path.split(".")
+    target = document
+    for part in parts[:-1]:
+        if isinstance(target, list) and part.isdigit():
+            target = target[int(part)]
+            continue
+        if not isinstance(target.get(part), (dict, list)):
+            target[part] = {}
+        target = target[part]
+    if isinstance(target, list) and parts[-1].isdigit():
+        target[int(parts[-1])] = value
+    else:
+        target[parts[-1]] = value
+
+
+def unset_value(document: dict, path: str) -> None:
+    parts = path.split(".")
+    target = document
+    for part in parts[:-1]:
+        target = target.get(part) if isinstance(target, dict) else None
+        if target is None:
+            return
+    if isinstance(target, dict):
+        target.pop(parts[-1], None)
+
+
+def is_operator_dict(value) -> bool:
+    return (
+        isinstance(value, dict)
+        and len(value) > 0
+        and all(isinstance(k, str) and k.startswith("$") for k in value)
+    )
+
+
+TYPE_ALIASES = {
+    "double": lambda v: isinstance(v, float),
+    "string": lambda v: isinstance(v, str),
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "objectId": lambda v: isinstance(v, ObjectId),
+    "bool": lambda v: isinstance(v, bool),
+    "date": lambda v: isinstance(v, datetime),
+    "null": lambda v: v is None,
+    "int": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "long": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "decimal": lambda v: isinstance(v, Decimal128),
+    "number": is_number,
+}
+TYPE_CODES = {
+    1: "double",
+    2: "string",
+    3: "object",
+    4: "array",
+    7: "objectId",
+    8: "bool",
+    9: "date",
+    10: "null",
+    16: "int",
+    18: "long",
+    19: "decimal",
+}
+
+
+def expand(values: list) -> list:
+    # um array casa se algum dos seus elementos casar
+    expanded = list(values)
+    for value in values:
+        if isinstance(value, list):
+            expanded.extend(value)
+    return expanded
+
+
+def equals_any(values: list, expected) -> bool:
+    if not values:
+        return expected is None
+    if isinstance(expected, re.Pattern):
+        return any(
+            isinstance(v, str) and expected.search(v) is not None
+            for v in expand(values)
+        )
+    return any(values_equal(v, expected) for v in expand(values))
+
+
+def compare_any(values: list, expected, compare) -> bool:
+    rank = type_rank(expected)
+    expected_key = sort_key(expected)
+    return any(
+        type_rank(v) == rank and compare(sort_key(v), expected_key)
+        for v in expand(values)
+    )
+
+
+def match_field(values: list, condition) -> bool:
+    if not is_operator_dict(condition):
+        return equals_any(values, condition)
+    for operator, argument in condition.items():
+        if operator == "$eq":
+            matched = equals_any(values, argument)
+        elif operator == "$ne":
+            matched = not equals_any(values, argument)
+        elif operator == "$in":
+            matched = any(equals_any(values, item) for item in argument)
+        elif operator == "$nin":
+            matched = not any(equals_any(values, item) for item in argument)
+        elif operator == "$gt":
+            matched = compare_any(values, argument, lambda a, b: a > b)
+        elif operator == "$gte":
+            matched = compare_any(values, argument, lambda a, b: a >= b)
+        elif operator == "$lt":
+            matched = compare_any(values, argument, lambda a, b: a < b)
+        elif operator == "$lte":
+            matched = compare_any(values, argument, lambda a, b: a <= b)
+        elif operator == "$exists":
+            matched = bool(values) == bool(argument)
+        elif operator == "$type":
+            names = argument if isinstance(argument, list) else [argument]
+            checks = [TYPE_ALIASES[TYPE_CODES.get(name, name)] for name in names]
+            matched = any(check(v) for v in expand(values) for check in checks)
+        elif operator == "$size":
+            matched = any(isinstance(v, list) and len(v) == argument for v in values)
+        elif operator == "$all":
+            matched = all(equals_any(values, item) for item in argument)
+        elif operator == "$elemMatch":
+            matched = any(
+                isinstance(v, list) and any(match_element(i, argument) for i in v)
+                for v in values
+            )
+        elif operator == "$not":
+            matched = not match_field(values, argument)
+        elif operator == "$regex":
+            flags = 0
+            for option in condition.get("$options", ""):
+                flags |= {"i": re.I, "m": re.M, "s": re.S, "x": re.X}[option]
+            matched = equals_any(values, re.compile(argument, flags))
+        elif operator == "$options":
+            continue
+        else:
+            raise OperationFailure(f"unknown operator: {operator}", code=2)
+        if not matched:
+            return False
+    return True
+
+
+def match_element(element, condition) -> bool:
+    if isinstance(condition, dict) and not is_operator_dict(condition):
+        return isinstance(element, dict) and match_query(element, condition)
+    return match_field([element], condition)
+
+
+def match_query(document: dict, query: dict) -> bool:
+    for key, condition in (query or {}).items():
+        if key == "$and":
+            matched = all(match_query(document, q) for q in condition)
+        elif key == "$or":
+            matched = any(match_query(document, q) for q in condition)
+        elif key == "$nor":
+            matched = not any(match_query(document, q) for q in condition)
+        elif key == "$expr":
+            matched = bool(evaluate(condition, document))
+        elif key.startswith("$"):
+            raise OperationFailure(f"unknown top level operator: {key}", code=2)
+        else:
+            matched = match_field(get_values(document, key), condition)
+        if not matched:
+            return False
+    return True
+
+
+def equality_constraints(query: dict) -> dict:
+    # igualdades no topo do filtro (ou no $and): usadas para escolher o índice
+    # e para montar o documento de um upsert
+    constraints = {}
+    for key, condition in (query or {}).items():
+        if key == "$and":
+            for sub_query in condition:
+                constraints.update(equality_constraints(sub_query))
+        elif key.startswith("$"):
+            continue
+        elif not is_operator_dict(condition):
+            constraints[key] = [condition]
+        elif "$eq" in condition:
+            constraints[key] = [condition["$eq"]]
+        elif "$in" in condition and len(condition) == 1:
+            constraints[key] = list(condition["$in"])
+    return constraints
+
+
+def projection_tree(projection: dict) -> dict:
+    tree = {}
+    for path, value in projection.items():
+        node = tree
+        parts = path.split(".")
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+            if not isinstance(node, dict):
+                break
+        else:
+            node[parts[-1]] = value
+    return tree
+
+
+def include_fields(document, tree: dict):
+    if isinstance(document, list):
+        return [
+            include_fields(item, tree) for item in document if isinstance(item, dict)
+        ]
+    result = {}
+    for key, node in tree.items():
+        if key not in document:
+            continue
+        if isinstance(node, dict):
+            if isinstance(document[key], (dict, list)):
+                result[key] = include_fields(document[key], node)
+        else:
+            result[key] = clone(document[key])
+    return result
+
+
+def exclude_fields(document, tree: dict):
+    if isinstance(document, list):
+        return [
+            exclude_fields(item, tree) if isinstance(item, dict) else clone(item)
+            for item in document
+        ]
+    result = {}
+    for key, value in document.items():
+        node = tree.get(key, MISSING)
+        if node is MISSING:
+            result[key] = clone(value)
+        elif isinstance(node, dict) and isinstance(value, (dict, list)):
+            result[key] = exclude_fields(value, node)
+    return result
+
+
+def project(document: dict, projection) -> dict:
+    if not projection:
+        return clone(document)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    include_id = bool(projection.get("_id", 1))
+    fields = {k: v for k, v in projection.items() if k != "_id"}
+    if any(fields.values()) or (not fields and include_id is True and projection):
+        result = include_fields(document, projection_tree(fields))
+        if include_id and "_id" in document:
+            result = {"_id": document["_id"], **result}
+        return result
+    result = exclude_fields(document, projection_tree(fields))
+    if not include_id:
+        result.pop("_id", None)
+    return result
+
+
+def sort_documents(documents: list, sort) -> list:
+    if not sort:
+        return documents
+    if isinstance(sort, dict):
+        sort = list(sort.items())
+    # ordenação estável: da última chave para a primeira
+    for field, direction in reversed(sort):
+        documents.sort(
+            key=lambda document: sort_key(get_value(document, field)),
+            reverse=direction < 0,
+        )
+    return documents
+
+
+def to_number(value):
+    return value.to_decimal() if isinstance(value, Decimal128) else value
+
+
+def evaluate(expression, document):
+    """
+    Value of an aggregation expression for one document
+    """
+
+    if isinstance(expression, str) and expression.startswith("$"):
+        if expression == "$$ROOT":
+            return document
+        value = get_value(document, expression[1:])
+        return None if value is MISSING else value
+    if isinstance(expression, list):
+        return [evaluate(item, document) for item in expression]
+    if not isinstance(expression, dict):
+        return expression
+    if not is_operator_dict(expression) or len(expression) != 1:
+        return {k: evaluate(v, document) for k, v in expression.items()}
+
+    operator, argument = next(iter(expression.items()))
+    if operator == "$literal":
+        return argument
+    arguments = argument if isinstance(argument, list) else [argument]
+    values = [evaluate(item, document) for item in arguments]
+    numbers = [to_number(v) for v in values]
+    if operator == "$add":
+        return None if None in numbers else sum(numbers)
+    if operator == "$subtract":
+        return None if None in numbers else numbers[0] - numbers[1]
+    if operator == "$multiply":
+        if None in numbers:
+            return None
+        result = 1
+        for number in numbers:
+            result *= number
+        return result
+    if operator == "$divide":
+        return None if None in numbers else numbers[0] / numbers[1]
+    if operator == "$round":
+        places = numbers[1] if len(numbers) > 1 else 0
+        return None if numbers[0] is None else round(numbers[0], places)
+    if operator == "$toLower":
+        return "" if values[0] is None else str(values[0]).lower()
+    if operator == "$toUpper":
+        return "" if values[0] is None else str(values[0]).upper()
+    if operator == "$concat":
+        return None if None in values else "".join(values)
+    if operator == "$ifNull":
+        return next((v for v in values if v is not None), None)
+    if operator == "$size":
+        return len(values[0])
+    if operator == "$eq":
+        return values_equal(values[0], values[1])
+    if operator == "$ne":
+        return not values_equal(values[0], values[1])
+    if operator in ("$gt", "$gte", "$lt", "$lte"):
+        a, b = sort_key(values[0]), sort_key(values[1])
+        return {"$gt": a > b, "$gte": a >= b, "$lt": a < b, "$lte": a <= b}[operator]
+    if operator == "$cond":
+        if isinstance(argument, dict):
+            values = [evaluate(argument[k], document) for k in ("if", "then", "else")]
+        return values[1] if values[0] else values[2]
+    raise OperationFailure(f"Unrecognized expression '{operator}'", code=168)
+
+
+def apply_pipeline_update(document: dict, pipeline: list) -> None:
+    for stage in pipeline:
+        ((operator, fields),) = stage.items()
+        if operator in ("$set", "$addFields"):
+            # os campos do estágio são calculados com o documento de antes dele
+            values = {path: evaluate(value, document) for path, value in fields.items()}
+            for path, value in values.items():
+                set_value(document, path, value)
+        elif operator == "$unset":
+            for path in fields if isinstance(fields, list) else [fields]:
+                unset_value(document, path)
+        else:
+            raise OperationFailure(f"{operator} is not allowed in an update", code=72)
+
+
+def push_values(argument) -> list:
+    if isinstance(argument, dict) and "$each" in argument:
+        return list(argument["$each"])
+    return [argument]
+
+
+def apply_update(document: dict, update, is_insert: bool = False) -> None:
+    if isinstance(update, list):
+        return apply_pipeline_update(document, update)
+    for operator, fields in update.items():
+        for path, argument in fields.items():
+            current = get_value(document, path)
+            if operator == "$set":
+                set_value(document, path, clone(argument))
+            elif operator == "$setOnInsert":
+                if is_insert:
+                    set_value(document, path, clone(argument))
+            elif operator == "$unset":
+                unset_value(document, path)
+            elif operator in ("$inc", "$mul"):
+                if current is not MISSING and not is_number(current):
+                    raise WriteError(
+                        f"Cannot apply {operator} to a value of non-numeric type",
+                        code=14,
+                    )
+                if operator == "$inc":
+                    value = argument if current is MISSING else current + argument
+                else:
+                    value = 0 if current is MISSING else current * argument
+                set_value(document, path, value)
+            elif operator in ("$min", "$max"):
+                better = (
+                    (lambda a, b: a < b) if operator == "$min" else (lambda a, b: a > b)
+                )
+                if current is MISSING or better(sort_key(argument), sort_key(current)):
+                    set_value(document, path, clone(argument))
+            elif operator in ("$push", "$addToSet"):
+                if current is MISSING:
+                    current = []
+                    set_value(document, path, current)
+                elif not isinstance(current, list):
+                    raise WriteError(f"The field '{path}' must be an array", code=2)
+                for value in push_values(argument):
+                    if operator == "$push" or not any(
+                        values_equal(item, value) for item in current
+                    ):
+                        current.append(clone(value))
+            elif operator == "$pull":
+                if isinstance(current, list):
+                    current[:] = [
+                        item for item in current if not match_element(item, argument)
+                    ]
+            else:
+                raise WriteError(f"Unknown modifier: {operator}", code=9)
+
+
+class MemoryCursor:
+    """
+    Lazy cursor of a find or aggregate, with the chaining methods of Motor
+    """
+
+    def __init__(self, run, transform=clone) -> None:
+        # run devolve os documentos internos; a cópia (ou projeção) só é feita
+        # nos que saem pelo to_list ou pela iteração
+        self._run = run
+        self._transform = transform
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+        self._documents = None
+        self._position = 0
+
+    def sort(self, key_or_list, direction=None):
+        if isinstance(key_or_list, str):
+            key_or_list = [(key_or_list, direction or 1)]
+        self._sort = list(key_or_list)
+        return self
+
+    def skip(self, skip: int):
+        self._skip = skip
+        return self
+
+    def limit(self, limit: int):
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size: int):
+        return self
+
+    def _results(self) -> list:
+        if self._documents is None:
+            self._documents = self._run(self._sort, self._skip, self._limit)
+        return self._documents
+
+    async def to_list(self, length=None):
+        await sleep(0)
+        documents = self._results()
+        start = self._position
+        end = len(documents) if length is None else start + length
+        taken = documents[start:end]
+        self._position += len(taken)
+        return [self._transform(document) for document in taken]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._documents is None:
+            await sleep(0)
+        documents = self._results()
+        if self._position >= len(documents):
+            raise StopAsyncIteration
+        self._position += 1
+        return self._transform(documents[self._position - 1])
+
+    def close(self) -> None:
+        self._documents = []
+        self._position = 0
+
+
+class MemoryCollection:
+    """
+    A collection of the in-memory backend
+    """
+
+    def __init__(self, database, name: str) -> None:
+        self.database = database
+        self.name = name
+        self._reset()
+
+    def _reset(self) -> None:
+        # os dicts internos usam freeze(_id) como chave
+        self._documents = {}
+        self._sequence = {}
+        self._counter = count()
+        self._indexes = {"_id_": {"key": [("_id", 1)]}}
+        # primeiro campo de cada índice -> valor -> _ids
+        self._hashed = {}
+        # índice único -> chave -> _id
+        self._unique = {}
+        # (sort_key(_id), chave) em ordem, e as inserções ainda fora dela
+        self._id_index = []
+        self._id_pending = []
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.database.name}.{self.name}"
+
+    # -- índices --------------------------------------------------------
+
+    def _index_keys(self, document: dict, fields: list) -> tuple:
+        return tuple(
+            freeze(values[0] if (values := get_values(document, f)) else None)
+            for f in fields
+        )
+
+    def _hashed_keys(self, document: dict, field: str) -> set:
+        values = get_values(document, field)
+        if not values:
+            return {None}
+        keys = set()
+        for value in values:
+            keys.add(freeze(value))
+            if isinstance(value, list):
+                keys.update(freeze(item) for item in value)
+        return keys
+
+    def _check_unique(self, document: dict) -> None:
+        document_key = freeze(document["_id"])
+        for name, keys in self._unique.items():
+            fields = [f for f, _ in self._indexes[name]["key"]]
+            owner = keys.get(self._index_keys(document, fields), MISSING)
+            if owner is not MISSING and owner != document_key:
+                raise self._duplicate(
+                    name, dict(zip(fields, (get_value(document, f) for f in fields)))
+                )
+
+    def _duplicate(self, index_name: str, key: dict) -> DuplicateKeyError:
+        message = (
+            f"E11000 duplicate key error collection: {self.full_name} "
+            f"index: {index_name} dup key: {key}"
+        )
+        return DuplicateKeyError(
+            message, 11000, {"code": 11000, "errmsg": message, "keyValue": key}
+        )
+
+    def _add_to_indexes(self, document: dict) -> None:
+        for field, values in self._hashed.items():
+            for key in self._hashed_keys(document, field):
+                values.setdefault(key, set()).add(freeze(document["_id"]))
+        for name, keys in self._unique.items():
+            fields = [f for f, _ in self._indexes[name]["key"]]
+            keys[self._index_keys(document, fields)] = freeze(document["_id"])
+
+    def _remove_from_indexes(self, document: dict) -> None:
+        for field, values in self._hashed.items():
+            for key in self._hashed_keys(document, field):
+                if (ids := values.get(key)) is not None:
+                    ids.discard(freeze(document["_id"]))
+                    if not ids:
+                        del values[key]
+        for name, keys in self._unique.items():
+            fields = [f for f, _ in self._indexes[name]["key"]]
+            keys.pop(self._index_keys(document, fields), None)
+
+    def _rebuild_indexes(self) -> None:
+        fields = {index["key"][0][0] for index in self._indexes.values()}
+        fields.discard("_id")
+        self._hashed = {field: {} for field in fields}
+        self._unique = {
+            name: {} for name, index in self._indexes.items() if index.get("unique")
+        }
+        for document in self._documents.values():
+            self._add_to_indexes(document)
+
+    async def create_indexes(self, indexes, **kwargs) -> list:
+        await sleep(0)
+        names = []
+        for index in indexes:
+            spec = index.document
+            name = spec["name"]
+            key = list(spec["key"].items())
+            if name in self._indexes and self._indexes[name]["key"] != key:
+                raise OperationFailure(
+                    f"An existing index has the same name as the requested index: {name}",
+                    code=86,
+                )
+            self._indexes[name] = {"key": key}
+            if spec.get("unique"):
+                self._indexes[name]["unique"] = True
+            self._rebuild_indexes()
+            # chaves repetidas colapsam no mapa: o índice único não pode existir
+            if spec.get("unique") and len(self._unique[name]) < len(self._documents):
+                del self._indexes[name]
+                self._rebuild_indexes()
+                raise self._duplicate(name, dict.fromkeys(f for f, _ in key))
+            names.append(name)
+        return names
+
+    async def create_index(self, keys, **kwargs) -> str:
+        await sleep(0)
+        return (await self.create_indexes([IndexModel(keys, **kwargs)]))[0]
+
+    async def index_information(self) -> dict:
+        await sleep(0)
+        return {name: clone(index) for name, index in self._indexes.items()}
+
+    async def drop_index(self, index_or_name) -> None:
+        await sleep(0)
+        if index_or_name == "_id_" or index_or_name not in self._indexes:
+            raise OperationFailure(
+                f"index not found with name [{index_or_name}]", code=27
+            )
+        del self._indexes[index_or_name]
+        self._rebuild_indexes()
+
+    async def drop_indexes(self) -> None:
+        await sleep(0)
+        self._indexes = {"_id_": self._indexes["_id_"]}
+        self._rebuild_indexes()
+
+    async def drop(self) -> None:
+        await sleep(0)
+        # o objeto continua valendo, como um handle do Motor
+        self._reset()
+
+    # -- leitura --------------------------------------------------------
+
+    def _indexed_keys(self, query: dict):
+        # usa o _id ou o primeiro campo de um índice quando o filtro tem igualdade
+        constraints = equality_constraints(query)
+        if "_id" in constraints:
+            return {freeze(value) for value in constraints["_id"]}
+        matches = []
+        for field, values in constraints.items():
+            if field in self._hashed:
+                keys = set()
+                for value in values:
+                    keys.update(self._hashed[field].get(freeze(value), ()))
+                matches.append(keys)
+        if not matches:
+            return None
+        # com mais de um campo indexado no filtro, fica só a interseção
+        matches.sort(key=len)
+        return matches[0].intersection(*matches[1:])
+
+    def _sorted_ids(self) -> list:
+        # índice do _id ordenado só quando alguém precisa dele: muitas inserções
+        # pendentes (ex.: uma carga) reordenam tudo de uma vez
+        if self._id_pending:
+            if len(self._id_pending) > len(self._id_index) // 10 + 100:
+                self._id_index = sorted(
+                    (sort_key(document["_id"]), key)
+                    for key, document in self._documents.items()
+                )
+            else:
+                for item in self._id_pending:
+                    insort(self._id_index, item)
+            self._id_pending = []
+        return self._id_index
+
+    def _scan_by_id(self, query: dict, direction: int, limit: int) -> list:
+        # como um IXSCAN no _id: percorre em ordem até ter limit documentos
+        index = self._sorted_ids()
+        positions = range(len(index) - 1, -1, -1)
+        if direction > 0:
+            start = 0
+            bounds = [query] + list(query.get("$and", ())) if query else []
+            for bound in (b.get("_id") for b in bounds):
+                if is_operator_dict(bound) and ("$gt" in bound or "$gte" in bound):
+                    value = bound.get("$gt", bound.get("$gte"))
+                    start = max(start, bisect_left(index, (sort_key(value),)))
+            positions = range(start, len(index))
+        documents = []
+        for position in positions:
+            document = self._documents[index[position][1]]
+            if match_query(document, query):
+                documents.append(document)
+                if len(documents) == limit:
+                    break
+        return documents
+
+    def _candidates(self, query: dict) -> list:
+        if (keys := self._indexed_keys(query)) is None:
+            return list(self._documents.values())
+        # mantém a ordem natural (de inserção)
+        keys = sorted(
+            (key for key in keys if key in self._documents), key=self._sequence.get
+        )
+        return [self._documents[key] for key in keys]
+
+    def _matching(self, query: dict, limit: int = 0) -> list:
+        documents = []
+        for document in self._candidates(query):
+            if match_query(document, query):
+                documents.append(document)
+                if limit and len(documents) == limit:
+                    break
+        return documents
+
+    def find(
+        self, filter=None, projection=None, skip=0, limit=0, sort=None, **kwargs
+    ) -> MemoryCursor:
+        def run(cursor_sort, cursor_skip, cursor_limit):
+            sort_spec = cursor_sort or sort
+            skip_count = cursor_skip or skip
+            limit_count = abs(cursor_limit or limit)
+            wanted = skip_count + limit_count if limit_count else 0
+            if not sort_spec:
+                documents = self._matching(filter, wanted)
+            elif len(sort_spec) > 1 or not limit_count:
+                documents = sort_documents(self._matching(filter), sort_spec)
+            elif sort_spec[0][0] == "_id" and self._indexed_keys(filter) is None:
+                documents = self._scan_by_id(filter, sort_spec[0][1], wanted)
+            else:
+                # página ordenada por um campo: só os primeiros, sem ordenar tudo
+                field, direction = sort_spec[0]
+                documents = (nsmallest if direction > 0 else nlargest)(
+                    wanted,
+                    self._matching(filter),
+                    key=lambda document: sort_key(get_value(document, field)),
+                )
+            documents = documents[skip_count:]
+            return documents[:limit_count] if limit_count else documents
+
+        return MemoryCursor(run, lambda document: project(document, projection))
+
+    async def find_one(self, filter=None, projection=None, *args, **kwargs):
+        await sleep(0)
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        documents = await self.find(filter, projection, *args, **kwargs).to_list(1)
+        return documents[0] if documents else None
+
+    async def count_documents(self, filter, skip=0, limit=0, **kwargs) -> int:
+        await sleep(0)
+        total = max(len(self._matching(filter)) - skip, 0)
+        return min(total, limit) if limit else total
+
+    async def estimated_document_count(self, **kwargs) -> int:
+        await sleep(0)
+        return len(self._documents)
+
+    async def distinct(self, key: str, filter=None, **kwargs) -> list:
+        await sleep(0)
+        values = []
+        for document in self._matching(filter):
+            for value in expand(get_values(document, key)):
+                if not isinstance(value, list) and not any(
+                    values_equal(value, v) for v in values
+                ):
+                    values.append(clone(value))
+        return values
+
+    # -- escrita --------------------------------------------------------
+
+    def _store(self, document: dict, old: dict = None) -> None:
+        key = freeze(document["_id"])
+        if old is not None and freeze(old["_id"]) != key:
+            raise WriteError(
+                "Performing an update on the path '_id' would modify the immutable "
+                "field '_id'",
+                code=66,
+            )
+        if old is None and key in self._documents:
+            raise self._duplicate("_id_", {"_id": document["_id"]})
+        self._check_unique(document)
+        if old is None:
+            self._sequence[key] = next(self._counter)
+            self._id_pending.append((sort_key(document["_id"]), key))
+        else:
+            self._remove_from_indexes(old)
+        self._documents[key] = document
+        self._add_to_indexes(document)
+
+    def _insert(self, document: dict):
+        if "_id" not in document:
+            # como o pymongo, o _id gerado também vai para o dict de quem chamou
+            document["_id"] = ObjectId()
+        self._store(clone(document))
+        return document["_id"]
+
+    def _delete(self, document: dict) -> None:
+        self._remove_from_indexes(document)
+        item = (sort_key(document["_id"]), freeze(document["_id"]))
+        if item in self._id_pending:
+            self._id_pending.remove(item)
+        else:
+            position = bisect_left(self._id_index, item)
+            if position < len(self._id_index) and self._id_index[position] == item:
+                del self._id_index[position]
+        del self._documents[freeze(document["_id"])]
+        del self._sequence[freeze(document["_id"])]
+
+    def _update(self, filter, update, upsert=False, multi=False, sort=None):
+        """
+        Returns (matched, modified, upserted_id, [(before, after)])
+        """
+
+        if not update:
+            raise ValueError("update cannot be empty")
+        if isinstance(update, dict) and not is_operator_dict(update):
+            raise ValueError("update only works with $ operators")
+        documents = self._matching(filter, 0 if (multi or sort) else 1)
+        documents = sort_documents(documents, sort)
+        if not multi:
+            documents = documents[:1]
+        changes = []
+        modified = 0
+        for old in documents:
+            document = clone(old)
+            apply_update(document, update)
+            if document != old:
+                self._store(document, old)
+                modified += 1
+            changes.append((old, document))
+        if documents or not upsert:
+            return len(documents), modified, None, changes
+
+        document = {}
+        for path, values in equality_constraints(filter).items():
+            if len(values) == 1 and not is_operator_dict(values[0]):
+                set_value(document, path, clone(values[0]))
+        apply_update(document, update, is_insert=True)
+        upserted_id = self._insert(document)
+        return 0, 0, upserted_id, [(None, self._documents[freeze(upserted_id)])]
+
+    def _replace(self, filter, replacement: dict, upsert=False):
+        if is_operator_dict(replacement):
+            raise ValueError("replacement can not include $ operators")
+        documents = self._matching(filter, 1)
+        if documents:
+            old = documents[0]
+            document = {"_id": old["_id"], **clone(replacement)}
+            if document != old:
+                self._store(document, old)
+                return 1, 1, None, [(old, document)]
+            return 1, 0, None, [(old, old)]
+        if not upsert:
+            return 0, 0, None, []
+        document = clone(replacement)
+        if "_id" not in document:
+            constraints = equality_constraints(filter)
+            if len(constraints.get("_id", ())) == 1:
+                document["_id"] = constraints["_id"][0]
+        upserted_id = self._insert(document)
+        return 0, 0, upserted_id, [(None, self._documents[freeze(upserted_id)])]
+
+    async def insert_one(self, document: dict, **kwargs) -> InsertOneResult:
+        await sleep(0)
+        return InsertOneResult(self._insert(document), True)
+
+    async def insert_many(self, documents, ordered=True, **kwargs) -> InsertManyResult:
+        await sleep(0)
+        if not documents:
+            raise TypeError("documents must be a non-empty list")
+        await self.bulk_write(
+            [InsertOne(document) for document in documents], ordered=ordered
+        )
+        return InsertManyResult(
+            [document["_id"] for document in documents if "_id" in document], True
+        )
+
+    async def update_one(self, filter, update, upsert=False, **kwargs) -> UpdateResult:
+        await sleep(0)
+        matched, modified, upserted_id, _ = self._update(filter, update, upsert)
+        return update_result(matched, modified, upserted_id)
+
+    async def update_many(self, filter, update, upsert=False, **kwargs) -> UpdateResult:
+        await sleep(0)
+        matched, modified, upserted_id, _ = self._update(
+            filter, update, upsert, multi=True
+        )
+        return update_result(matched, modified, upserted_id)
+
+    async def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        await sleep(0)
+        matched, modified, upserted_id, _ = self._replace(filter, replacement, upsert)
+        return update_result(matched, modified, upserted_id)
+
+    async def delete_one(self, filter, **kwargs) -> DeleteResult:
+        await sleep(0)
+        documents = self._matching(filter, 1)
+        for document in documents:
+            self._delete(document)
+        return DeleteResult({"n": len(documents), "ok": 1.0}, True)
+
+    async def delete_many(self, filter, **kwargs) -> DeleteResult:
+        await sleep(0)
+        documents = self._matching(filter)
+        for document in documents:
+            self._delete(document)
+        return DeleteResult({"n": len(documents), "ok": 1.0}, True)
+
+    async def find_one_and_update(
+        self,
+        filter,
+        update,
+        projection=None,
+        sort=None,
+        upsert=False,
+        return_document=False,
+        **kwargs,
+    ):
+        await sleep(0)
+        _, _, _, changes = self._update(filter, update, upsert, sort=sort)
+        if not changes:
+            return None
+        before, after = changes[0]
+        document = after if return_document else before
+        return None if document is None else project(document, projection)
+
+    async def find_one_and_replace(
+        self,
+        filter,
+        replacement,
+        projection=None,
+        sort=None,
+        upsert=False,
+        return_document=False,
+        **kwargs,
+    ):
+        await sleep(0)
+        _, _, _, changes = self._replace(filter, replacement, upsert)
+        if not changes:
+            return None
+        before, after = changes[0]
+        document = after if return_document else before
+        return None if document is None else project(document, projection)
+
+    async def find_one_and_delete(self, filter, projection=None, sort=None, **kwargs):
+        await sleep(0)
+        documents = sort_documents(self._matching(filter, 0 if sort else 1), sort)
+        if not documents:
+            return None
+        self._delete(documents[0])
+        return project(documents[0], projection)
+
+    async def bulk_write(self, requests, ordered=True, **kwargs) -> BulkWriteResult:
+        await sleep(0)
+        details = {
+            "writeErrors": [],
+            "writeConcernErrors": [],
+            "nInserted": 0,
+            "nUpserted": 0,
+            "nMatched": 0,
+            "nModified": 0,
+            "nRemoved": 0,
+            "upserted": [],
+        }
+        for index, request in enumerate(requests):
+            try:
+                upserted_id = None
+                if isinstance(request, InsertOne):
+                    self._insert(request._doc)
+                    details["nInserted"] += 1
+                elif isinstance(request, (DeleteOne, DeleteMany)):
+                    documents = self._matching(
+                        request._filter, 1 if isinstance(request, DeleteOne) else 0
+                    )
+                    for document in documents:
+                        self._delete(document)
+                    details["nRemoved"] += len(documents)
+                else:
+                    if isinstance(request, ReplaceOne):
+                        matched, modified, upserted_id, _ = self._replace(
+                            request._filter, request._doc, request._upsert
+                        )
+                    else:
+                        matched, modified, upserted_id, _ = self._update(
+                            request._filter,
+                            request._doc,
+                            request._upsert,
+                            multi=isinstance(request, UpdateMany),
+                        )
+                    details["nMatched"] += matched
+                    details["nModified"] += modified
+                if upserted_id is not None:
+                    details["nUpserted"] += 1
+                    details["upserted"].append({"index": index, "_id": upserted_id})
+            except (WriteError, ValueError) as e:
+                details["writeErrors"].append(
+                    {
+                        "index": index,
+                        "code": getattr(e, "code", 2),
+                        "errmsg": str(e),
+                        "op": getattr(request, "_doc", None),
+                    }
+                )
+                if ordered:
+                    break
+        if details["writeErrors"]:
+            raise BulkWriteError(details)
+        return BulkWriteResult(details, True)
+
+    # -- agregação ------------------------------------------------------
+
+    def aggregate(self, pipeline: list, **kwargs) -> MemoryCursor:
+        def run(*cursor_options):
+            # um $match no início usa os índices, como no servidor
+            if pipeline and "$match" in pipeline[0]:
+                documents, stages = self._matching(pipeline[0]["$match"]), pipeline[1:]
+            else:
+                documents, stages = list(self._documents.values()), pipeline
+            return run_pipeline(documents, stages, self.database)
+
+        return MemoryCursor(run)
+
+
+def update_result(matched: int, modified: int, upserted_id) -> UpdateResult:
+    raw_result = {"n": matched, "nModified": modified, "ok": 1.0}
+    if upserted_id is not None:
+        raw_result.update(n=1, upserted=upserted_id)
+    return UpdateResult(raw_result, True)
+
+
+def group_documents(documents: list, spec: dict) -> list:
+    groups = {}
+    for document in documents:
+        key = evaluate(spec["_id"], document)
+        group = groups.setdefault(freeze(key), {"_id": key, "_documents": []})
+        group["_documents"].append(document)
+    results = []
+    for group in groups.values():
+        result = {"_id": group["_id"]}
+        grouped = group["_documents"]
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            ((operator, expression),) = accumulator.items()
+            values = [evaluate(expression, document) for document in grouped]
+            numbers = [to_number(v) for v in values if is_number(v)]
+            if operator == "$sum":
+                result[field] = sum(numbers)
+            elif operator == "$avg":
+                result[field] = sum(numbers) / len(numbers) if numbers else None
+            elif operator == "$min":
+                result[field] = min(values, key=sort_key) if values else None
+            elif operator == "$max":
+                result[field] = max(values, key=sort_key) if values else None
+            elif operator == "$first":
+                result[field] = values[0] if values else None
+            elif operator == "$last":
+                result[field] = values[-1] if values else None
+            elif operator == "$push":
+                result[field] = values
+            elif operator == "$addToSet":
+                result[field] = list({freeze(v): v for v in values}.values())
+            else:
+                raise OperationFailure(
+                    f"unknown group operator '{operator}'", code=15952
+                )
+        results.append(result)
+    return results
+
+
+def project_stage(document: dict, spec: dict) -> dict:
+    flags = {k: v for k, v in spec.items() if isinstance(v, (bool, int))}
+    computed = {k: v for k, v in spec.items() if k not in flags}
+    if not computed:
+        return project(document, flags)
+    # com campos calculados o $project é sempre de inclusão
+    included = {k: v for k, v in flags.items() if v and k != "_id"}
+    result = include_fields(document, projection_tree(included))
+    if flags.get("_id", 1) and "_id" in document:
+        result = {"_id": document["_id"], **result}
+    for path, expression in computed.items():
+        set_value(result, path, evaluate(expression, document))
+    return result
+
+
+def lookup_documents(documents: list, spec: dict, database) -> list:
+    if "let" in spec:
+        raise OperationFailure("$lookup with let is not supported in memory", code=2)
+    foreign = database[spec["from"]]
+    for document in documents:
+        if "localField" in spec:
+            local = get_value(document, spec["localField"])
+            local = None if local is MISSING else local
+            keys = local if isinstance(local, list) else [local]
+            matches = foreign._matching({spec["foreignField"]: {"$in": keys}})
+        else:
+            matches = list(foreign._documents.values())
+        if "pipeline" in spec:
+            matches = run_pipeline(matches, spec["pipeline"], database)
+        document[spec["as"]] = matches
+    return documents
+
+
+def unwind_documents(documents: list, spec) -> list:
+    if isinstance(spec, str):
+        spec = {"path": spec}
+    path = spec["path"][1:]
+    keep_empty = spec.get("preserveNullAndEmptyArrays", False)
+    results = []
+    for document in documents:
+        value = get_value(document, path)
+        if isinstance(value, list) and value:
+            for item in value:
+                unwound = clone(document)
+                set_value(unwound, path, item)
+                results.append(unwound)
+        elif keep_empty or (
+            value not in (MISSING, None) and not isinstance(value, list)
+        ):
+            results.append(document)
+    return results
+
+
+def run_pipeline(documents: list, pipeline: list, database) -> list:
+    # os documentos da collection só são copiados antes de um estágio que os
+    # altera; o cursor copia os que saem
+    owned = False
+    for stage in pipeline:
+        ((operator, spec),) = stage.items()
+        if operator in ("$addFields", "$set", "$lookup") and not owned:
+            documents, owned = [clone(d) for d in documents], True
+        if operator == "$match":
+            documents = [d for d in documents if match_query(d, spec)]
+        elif operator == "$limit":
+            documents = documents[:spec]
+        elif operator == "$skip":
+            documents = documents[spec:]
+        elif operator == "$sort":
+            documents = sort_documents(documents, spec)
+        elif operator == "$project":
+            documents, owned = [project_stage(d, spec) for d in documents], True
+        elif operator in ("$addFields", "$set"):
+            for document in documents:
+                apply_pipeline_update(document, [{"$set": spec}])
+        elif operator == "$unset":
+            documents = [
+                project(d, {f: 0 for f in (spec if isinstance(spec, list) else [spec])})
+                for d in documents
+            ]
+        elif operator == "$group":
+            documents, owned = group_documents(documents, spec), True
+        elif operator == "$lookup":
+            documents = lookup_documents(documents, spec, database)
+        elif operator == "$unwind":
+            documents = unwind_documents(documents, spec)
+        elif operator == "$count":
+            documents = [{spec: len(documents)}] if documents else []
+        else:
+            raise OperationFailure(
+                f"Unrecognized pipeline stage name: '{operator}'", code=40324
+            )
+    return documents
+
+
+class MemoryDatabase:
+    """
+    A database of the in-memory backend
+    """
+
+    def __init__(self, client, name: str, collections: dict) -> None:
+        self.client = client
+        self.name = name
+        self._collections = collections
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(self, name)
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name: str, **kwargs) -> MemoryCollection:
+        return self[name]
+
+    async def drop_collection(self, name: str) -> None:
+        await sleep(0)
+        if name in self._collections:
+            self._collections[name]._reset()
+
+    async def list_collection_names(self, **kwargs) -> list:
+        await sleep(0)
+        return [
+            name
+            for name, collection in self._collections.items()
+            if collection._documents or len(collection._indexes) > 1
+        ]
+
+    async def command(self, command, **kwargs):
+        await sleep(0)
+        name = command if isinstance(command, str) else next(iter(command))
+        if name == "ping":
+            return {"ok": 1.0}
+        raise OperationFailure(f"command {name} is not supported in memory", code=59)
+
+
+class AsyncMemoryClient:
+    """
+    Stand-in for AsyncIOMotorClient that keeps the databases in memory
+    """
+
+    def __init__(self, host: str = None, *args, databases: dict = None, **kwargs):
+        # tls, pool e event_listeners não se aplicam aqui
+        self.host = host or "memory"
+        self._databases = (
+            memory_servers.setdefault(self.host, {}) if databases is None else databases
+        )
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        return MemoryDatabase(self, name, self._databases.setdefault(name, {}))
+
+    def __getattr__(self, name: str) -> MemoryDatabase:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_database(self, name: str, **kwargs) -> MemoryDatabase:
+        return self[name]
+
+    async def drop_database(self, name: str) -> None:
+        await sleep(0)
+        for collection in self._databases.get(name, {}).values():
+            collection._reset()
+
+    async def list_database_names(self) -> list:
+        await sleep(0)
+        return list(self._databases)
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,377 @@
+"""
+Versioned migrations of the shopping_cart database.
+
+Each migration has a version, a description and an async function that receives
+the DataBase. The last applied version is stored in the migrations collection,
+so only the new ones run at the app startup or from the command line. Runs are
+serialized by a lease document (migration_lock): with several workers starting
+together one applies the migrations while the others wait for it, and a lease
+left by a crashed worker expires after MIGRATION_LOCK_SECONDS:
+
+    python -m server.migrations            (apply the pending migrations)
+    python -m server.migrations --status   (show the applied version)
+"""
+from argparse import ArgumentParser
+from asyncio import run, sleep
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from utils.ids import canonical_id, new_id
+from utils.normalize_email import email_domain
+
+SCHEMA_VERSION_ID = "schema_version"
+MIGRATION_LOCK_ID = "migration_lock"
+MIGRATION_LOCK_SECONDS = 600
+MIGRATION_LOCK_POLL_SECONDS = 1.0
+MIGRATION_BATCH_SIZE = 1000
+INDEX_NOT_FOUND = 27
+
+
+class MigrationError(Exception):
+    pass
+
+
+async def drop_index(collection, index_name: str):
+    # outra execução pode ter removido o índice entre a leitura e o drop
+    try:
+        await collection.drop_index(index_name)
+    except OperationFailure as e:
+        if e.code != INDEX_NOT_FOUND:
+            raise
+
+
+async def create_indexes(database, indexes: dict):
+    # create_indexes não faz nada se o índice já existe com as mesmas opções
+    for collection_name, index_models in indexes.items():
+        await getattr(database, collection_name).create_indexes(index_models)
+
+
+async def migration_0001_initial_indexes(database):
+    await create_indexes(
+        database,
+        {
+            "users_collection": [IndexModel([("email", ASCENDING)], name="email")],
+            "cart_collection": [
+                IndexModel(
+                    [("user._id", ASCENDING), ("paid", ASCENDING)],
+                    name="user_id_paid",
+                )
+            ],
+            "cart_items_collection": [
+                IndexModel([("cart._id", ASCENDING)], name="cart_id"),
+                IndexModel([("product._id", ASCENDING)], name="product_id"),
+            ],
+        },
+    )
+
+
+async def duplicated_emails(database) -> list:
+    # repetidos depois das minúsculas: "Ana@x.com" e "ana@x.com" colidem
+    duplicates = database.users_collection.aggregate(
+        [
+            {"$match": {"email": {"$type": "string"}}},
+            {
+                "$group": {
+                    "_id": {"$toLower": "$email"},
+                    "user_ids": {"$push": "$_id"},
+                    "count": {"$sum": 1},
+                }
+            },
+            {"$match": {"count": {"$gt": 1}}},
+            {"$sort": {"_id": 1}},
+        ]
+    )
+    return await duplicates.to_list(length=None)
+
+
+async def migration_0002_unique_email(database):
+    # emails passam a ser gravados em minúsculas, únicos pelo índice
+    # com repetidos o índice não sobe: falha antes de mudar qualquer coisa
+    duplicates = await duplicated_emails(database)
+    if duplicates:
+        listed = "; ".join(
+            f"{d['_id']}: {', '.join(str(user_id) for user_id in d['user_ids'])}"
+            for d in duplicates
+        )
+        raise MigrationError(
+            f"{len(duplicates)} duplicated email(s), merge or fix the users "
+            f"before the unique index: {listed}"
+        )
+    await database.users_collection.update_many(
+        {"email": {"$type": "string"}}, [{"$set": {"email": {"$toLower": "$email"}}}]
+    )
+    await create_indexes(
+        database,
+        {
+            "users_collection": [
+                IndexModel([("email", ASCENDING)], name="email_unique", unique=True)
+            ],
+        },
+    )
+    # o índice antigo só sai depois que o novo existe
+    await drop_index(database.users_collection, "email")
+
+
+async def migration_0003_cart_items_keyset(database):
+    # a paginação dos itens do carrinho filtra por cart._id e ordena por _id
+    await create_indexes(
+        database,
+        {
+            "cart_items_collection": [
+                IndexModel(
+                    [("cart._id", ASCENDING), ("_id", ASCENDING)], name="cart_id__id"
+                )
+            ],
+        },
+    )
+    await drop_index(database.cart_items_collection, "cart_id")
+
+
+def legacy_id(field: str) -> dict:
+    return {"$or": [{field: {"$type": "objectId"}}, {field: {"$type": "number"}}]}
+
+
+async def migration_0004_string_ids(database):
+    # _id é imutável: documentos com _id legado (ObjectId/int) são regravados
+    # a cópia convive com o original até o delete: o email_unique sai antes
+    # e volta depois, senão a cópia de cada usuário colide com ele mesmo
+    await drop_index(database.users_collection, "email_unique")
+    for collection_name in (
+        "users_collection",
+        "product_collection",
+        "cart_collection",
+        "cart_items_collection",
+    ):
+        collection = getattr(database, collection_name)
+        async for document in collection.find(legacy_id("_id")):
+            old_id = document["_id"]
+            document["_id"] = canonical_id(old_id)
+            await collection.replace_one(
+                {"_id": document["_id"]}, document, upsert=True
+            )
+            await collection.delete_one({"_id": old_id})
+    # recriado mesmo se uma execução anterior parou no meio
+    await create_indexes(
+        database,
+        {
+            "users_collection": [
+                IndexModel([("email", ASCENDING)], name="email_unique", unique=True)
+            ],
+        },
+    )
+
+    references = {
+        "cart_collection": ["user._id"],
+        "cart_items_collection": ["cart._id", "cart.user._id", "product._id"],
+    }
+    for collection_name, fields in references.items():
+        collection = getattr(database, collection_name)
+        for field in fields:
+            async for document in collection.find(legacy_id(field), {field: 1}):
+                reference = document
+                for key in field.split("."):
+                    reference = reference[key]
+                await collection.update_one(
+                    {"_id": document["_id"]},
+                    {"$set": {field: canonical_id(reference)}},
+                )
+
+
+async def migration_0005_cart_items_key(database):
+    # chave do upsert dos itens: um item por produto em cada carrinho
+    await create_indexes(
+        database,
+        {
+            "cart_items_collection": [
+                IndexModel(
+                    [("cart._id", ASCENDING), ("product._id", ASCENDING)],
+                    name="cart_id_product_id",
+                    unique=True,
+                )
+            ],
+        },
+    )
+    await drop_index(database.cart_items_collection, "product_id")
+
+
+async def migration_0006_cart_items_cart_id(database):
+    # itens deixam de embutir o carrinho inteiro (com o usuário), só cart_id
+    collection = database.cart_items_collection
+    for index_name in ("cart_id__id", "cart_id_product_id"):
+        await drop_index(collection, index_name)
+
+    batch = []
+    documents = collection.find({"cart": {"$exists": True}}, {"cart._id": 1})
+    async for document in documents.batch_size(MIGRATION_BATCH_SIZE):
+        batch.append(
+            UpdateOne(
+                {"_id": document["_id"]},
+                {"$set": {"cart_id": document["cart"]["_id"]}, "$unset": {"cart": ""}},
+            )
+        )
+        if len(batch) == MIGRATION_BATCH_SIZE:
+            await collection.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        await collection.bulk_write(batch, ordered=False)
+
+    await create_indexes(
+        database,
+        {
+            "cart_items_collection": [
+                IndexModel(
+                    [("cart_id", ASCENDING), ("_id", ASCENDING)], name="cart_id__id"
+                ),
+                IndexModel(
+                    [("cart_id", ASCENDING), ("product._id", ASCENDING)],
+                    name="cart_id_product_id",
+                    unique=True,
+                ),
+            ],
+        },
+    )
+
+
+async def migration_0007_users_email_domain(database):
+    # domínio separado do email: a busca por domínio deixa de ser um regex
+    # de sufixo (que varre a coleção) e vira igualdade sobre um índice
+    collection = database.users_collection
+    batch = []
+    documents = collection.find({"email_domain": {"$exists": False}}, {"email": 1})
+    async for document in documents.batch_size(MIGRATION_BATCH_SIZE):
+        if not isinstance(document.get("email"), str):
+            continue
+        batch.append(
+            UpdateOne(
+                {"_id": document["_id"]},
+                {"$set": {"email_domain": email_domain(document["email"])}},
+            )
+        )
+        if len(batch) == MIGRATION_BATCH_SIZE:
+            await collection.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        await collection.bulk_write(batch, ordered=False)
+
+    await create_indexes(
+        database,
+        {
+            "users_collection": [
+                IndexModel(
+                    [("email_domain", ASCENDING), ("email", ASCENDING)],
+                    name="email_domain_email",
+                )
+            ],
+        },
+    )
+
+
+MIGRATIONS = [
+    (1, "Indexes of the hot lookups", migration_0001_initial_indexes),
+    (2, "Unique lower-cased users email", migration_0002_unique_email),
+    (3, "Keyset pagination index of cart_items", migration_0003_cart_items_keyset),
+    (4, "String _id and references everywhere", migration_0004_string_ids),
+    (5, "Unique (cart, product) key of cart_items", migration_0005_cart_items_key),
+    (6, "cart_items keep cart_id, not the cart", migration_0006_cart_items_cart_id),
+    (7, "Indexed email_domain of the users", migration_0007_users_email_domain),
+]
+
+
+async def get_schema_version(database) -> int:
+    version = await database.migrations_collection.find_one({"_id": SCHEMA_VERSION_ID})
+    return version.get("version", 0) if version is not None else 0
+
+
+async def acquire_migration_lock(database, owner: str):
+    # o lease vencido (worker que caiu no meio) pode ser tomado por outro
+    while True:
+        now = datetime.utcnow()
+        try:
+            await database.migrations_collection.find_one_and_update(
+                {
+                    "_id": MIGRATION_LOCK_ID,
+                    "$or": [{"owner": owner}, {"expires_at": {"$lt": now}}],
+                },
+                {
+                    "$set": {
+                        "owner": owner,
+                        "expires_at": now + timedelta(seconds=MIGRATION_LOCK_SECONDS),
+                    }
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            return
+        except DuplicateKeyError:
+            # outro worker segura o lock: espera ele terminar
+            await sleep(MIGRATION_LOCK_POLL_SECONDS)
+
+
+async def release_migration_lock(database, owner: str):
+    await database.migrations_collection.delete_one(
+        {"_id": MIGRATION_LOCK_ID, "owner": owner}
+    )
+
+
+async def record_migration(database, version: int, description: str):
+    # só registra em applied quando a versão realmente subiu
+    try:
+        await database.migrations_collection.update_one(
+            {
+                "_id": SCHEMA_VERSION_ID,
+                "$or": [
+                    {"version": {"$lt": version}},
+                    {"version": {"$exists": False}},
+                ],
+            },
+            {
+                "$set": {"version": version},
+                "$push": {"applied": {"version": version, "description": description}},
+            },
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # a versão já era >= version
+        pass
+
+
+async def apply_migrations(database) -> int:
+    owner = new_id()
+    await acquire_migration_lock(database, owner)
+    try:
+        # a versão só é lida com o lock, depois de quem aplicou antes
+        current_version = await get_schema_version(database)
+        for version, description, migration in sorted(MIGRATIONS, key=lambda m: m[0]):
+            if version <= current_version:
+                continue
+            await migration(database)
+            await record_migration(database, version, description)
+            current_version = version
+            # renova o lease a cada migração concluída
+            await acquire_migration_lock(database, owner)
+        return current_version
+    finally:
+        await release_migration_lock(database, owner)
+
+
+async def main(status_only: bool):
+    from server.database import DataBase
+
+    database = DataBase()
+    database.connect_db()
+    try:
+        if status_only:
+            print(f"Schema version: {await get_schema_version(database)}")
+        else:
+            print(f"Schema version: {await apply_migrations(database)}")
+    finally:
+        database.disconnect_db()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Apply the shopping_cart database migrations")
+    parser.add_argument("--status", action="store_true", help="only show the version")
+    args = parser.parse_args()
+    run(main(args.status))
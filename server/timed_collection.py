@@ -0,0 +1,125 @@
+from inspect import isawaitable
+from time import perf_counter
+
+# funções chamadas a cada operação: (collection_name, operation, seconds)
+mongo_observers = []
+
+ASYNC_OPERATIONS = {
+    "bulk_write",
+    "count_documents",
+    "create_index",
+    "create_indexes",
+    "delete_many",
+    "delete_one",
+    "distinct",
+    "drop",
+    "drop_index",
+    "drop_indexes",
+    "estimated_document_count",
+    "find_one",
+    "find_one_and_delete",
+    "find_one_and_replace",
+    "find_one_and_update",
+    "index_information",
+    "insert_many",
+    "insert_one",
+    "replace_one",
+    "update_many",
+    "update_one",
+}
+CURSOR_OPERATIONS = {"aggregate", "find"}
+
+
+def notify(collection_name: str, operation: str, seconds: float) -> None:
+    for observer in mongo_observers:
+        observer(collection_name, operation, seconds)
+
+
+class TimedCursor:
+    """
+    Cursor that times each to_list, and the async iteration as one operation
+    """
+
+    def __init__(self, cursor, collection_name: str, operation: str) -> None:
+        self._cursor = cursor
+        self._collection_name = collection_name
+        self._operation = operation
+        # tempo somado dos __anext__, avisado uma vez no fim da iteração
+        self._iteration_seconds = None
+
+    def __getattr__(self, name):
+        attribute = getattr(self._cursor, name)
+        if not callable(attribute):
+            return attribute
+
+        def chained(*args, **kwargs):
+            # sort, limit, batch_size... devolvem o próprio cursor
+            result = attribute(*args, **kwargs)
+            return self if result is self._cursor else result
+
+        return chained
+
+    async def to_list(self, *args, **kwargs):
+        start = perf_counter()
+        try:
+            return await self._cursor.to_list(*args, **kwargs)
+        finally:
+            notify(self._collection_name, self._operation, perf_counter() - start)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._iteration_seconds is None:
+            self._iteration_seconds = 0.0
+        start = perf_counter()
+        try:
+            document = await self._cursor.__anext__()
+        except BaseException:
+            # esgotado ou com erro: a iteração conta como uma operação
+            self._iteration_seconds += perf_counter() - start
+            self._finish_iteration()
+            raise
+        self._iteration_seconds += perf_counter() - start
+        return document
+
+    async def close(self) -> None:
+        self._finish_iteration()
+        if (close := getattr(self._cursor, "close", None)) is not None:
+            if isawaitable(result := close()):
+                await result
+
+    def _finish_iteration(self) -> None:
+        if self._iteration_seconds is None:
+            return
+        seconds, self._iteration_seconds = self._iteration_seconds, None
+        notify(self._collection_name, self._operation, seconds)
+
+
+class TimedCollection:
+    """
+    Motor collection that reports the time of each operation to mongo_observers
+    """
+
+    def __init__(self, collection) -> None:
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if name in CURSOR_OPERATIONS:
+
+            def cursor_operation(*args, **kwargs):
+                return TimedCursor(attribute(*args, **kwargs), self.name, name)
+
+            return cursor_operation
+        if name in ASYNC_OPERATIONS:
+
+            async def operation(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    return await attribute(*args, **kwargs)
+                finally:
+                    notify(self.name, name, perf_counter() - start)
+
+            return operation
+        return attribute
@@ -5,7 +5,11 @@ from pytest import mark
 from controllers.address_routes import router as address_router
 from controllers.user_routes import router as client_router
 from server.database import get_db
-from server.database_test import drop_databases_to_test, get_db as get_test_db
+from server.database_test import (
+    apply_migrations_to_test,
+    drop_databases_to_test,
+    get_db as get_test_db,
+)
 from utils.generate_fakes import generate_fake_user
 
 app = FastAPI()
@@ -15,6 +19,11 @@ app.include_router(address_router, tags=["address"], prefix="/user/{user_id}/add
 app.dependency_overrides[get_db] = get_test_db
 
 
+@app.on_event("startup")
+async def startup_db_client():
+    await apply_migrations_to_test()
+
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     await drop_databases_to_test()
@@ -48,6 +57,41 @@ async def test_create_address():
         assert user["address"][0].get("is_delivery") is True
 
 
+@mark.asyncio
+async def test_create_address_duplicated():
+    with TestClient(app) as client:
+        address_json = {
+            "street": "Rua Y",
+            "zipcode": "00000-000",
+            "district": "West Zone",
+            "city": "GG",
+            "state": "HH",
+            "is_delivery": True,
+        }
+        user_id = (await generate_fake_user(client)).json().get("_id")
+        client.put(f"/user/{user_id}/address/", json=address_json)
+        response = client.put(f"/user/{user_id}/address/", json=address_json)
+        assert response.status_code == 200
+        assert response.json().get("error_type") == "add_address"
+        assert len(client.get(f"/user/{user_id}/address").json()) == 1
+
+
+@mark.asyncio
+async def test_create_address_unexisting_user():
+    with TestClient(app) as client:
+        response = client.put(
+            "/user/unexisting_id/address/",
+            json={
+                "street": "Rua Y",
+                "zipcode": "00000-000",
+                "district": "West Zone",
+                "city": "GG",
+                "state": "HH",
+            },
+        )
+        assert response.status_code == 404
+
+
 @mark.asyncio
 async def test_create_address_missing_street():
     with TestClient(app) as client:
@@ -126,6 +170,24 @@ async def test_delete_address():
         assert user["address"] == []
 
 
+@mark.asyncio
+async def test_delete_address_not_in_user():
+    with TestClient(app) as client:
+        user_id = (await generate_fake_user(client)).json().get("_id")
+        response = client.delete(
+            f"/user/{user_id}/address/",
+            json={
+                "street": "Rua ZB",
+                "zipcode": "00000-000",
+                "district": "West Zone",
+                "city": "GG",
+                "state": "HH",
+            },
+        )
+        assert response.status_code == 200
+        assert response.json().get("error_type") == "delete_address"
+
+
 @mark.asyncio
 async def test_delete_address_unexisting():
     with TestClient(app) as client:
@@ -1,3 +1,5 @@
+from asyncio import gather
+
 from fastapi import FastAPI
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
@@ -5,15 +7,24 @@ from fastapi.responses import JSONResponse
 from fastapi.testclient import TestClient
 from pytest import mark
 
+import utils.fast_json
 from controllers.cart_items_routes import router as cart_items_router
 from controllers.cart_routes import router as cart_router
 from controllers.product_routes import router as product_router
 from controllers.user_routes import Request
 from controllers.user_routes import router as user_router
 from controllers.user_routes import status
-from project_logs.logging import set_logging
+from models.model_cart_item import create_update_cart_item
+from models.model_product import product_cache
+from project_logs.logging import get_logger
+from schemas.cart_item import CartItemUpdate
 from server.database import get_db
-from server.database_test import drop_databases_to_test, get_db as get_test_db
+from server.database_test import (
+    apply_migrations_to_test,
+    drop_databases_to_test,
+    get_db as get_test_db,
+    shared_db,
+)
 from utils.generate_fakes import (
     generate_fake_cart,
     generate_fake_cart_item,
@@ -30,20 +41,27 @@ app.include_router(cart_items_router, tags=["cart_item"], prefix="/cart/{cart_id
 app.dependency_overrides[get_db] = get_test_db
 
 
+@app.on_event("startup")
+async def startup_db_client():
+    await apply_migrations_to_test()
+
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     await drop_databases_to_test()
+    product_cache.clear()
 
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     project_errors = []
-    project_error = {}
-    error_log = set_logging("errors")
+    error_log = get_logger("errors")
     for error in exc.errors():
-        project_error["error_loc"] = error["loc"]
-        project_error["error_type"] = error["type"]
-        project_error["error_msg"] = error["msg"]
+        project_error = {
+            "error_loc": error["loc"],
+            "error_type": error["type"],
+            "error_msg": error["msg"],
+        }
         project_errors.append(project_error)
         error_log.error(project_error)
     return JSONResponse(
@@ -66,8 +84,8 @@ async def test_create_update_cart_item():
         get_cart_response = client.get("/cart/" + user_id)
         assert response.status_code == 201
         body = response.json()
-        assert body.get("cart").get("_id") == fake_cart.json().get("_id")
-        assert body.get("cart").get("price") == 0
+        assert body.get("cart_id") == fake_cart.json().get("_id")
+        assert body.get("cart") is None
         assert body.get("product").get("price") == 9.99
         assert get_cart_response.json().get("price") == 9.99 * quantity
 
@@ -86,12 +104,98 @@ async def test_create_update_cart_item_with_more_quantity():
         get_cart_response = client.get("/cart/" + user_id)
         assert response.status_code == 201
         body = response.json()
-        assert body.get("cart").get("_id") == fake_cart.json().get("_id")
-        assert body.get("cart").get("price") == 0
+        assert body.get("cart_id") == fake_cart.json().get("_id")
+        assert body.get("cart") is None
         assert body.get("product").get("price") == 9.99
         assert get_cart_response.json().get("price") == 9.99 * quantity
 
 
+@mark.asyncio
+async def test_create_cart_items_concurrently():
+    with TestClient(app) as client:
+        body_client = await generate_fake_user(client)
+        user_id = body_client.json().get("_id")
+        fake_cart = await generate_fake_cart(client, user_id)
+        cart_id = fake_cart.json().get("_id")
+        catalog = [
+            {
+                "_id": f"product-{i}",
+                "name": "Sorvete",
+                "description": "Doce gelado de morango",
+                "price": 2.5,
+            }
+            for i in range(100)
+        ]
+        await shared_db.product_collection.insert_many(catalog)
+        products = [CartItemUpdate(product=p, quantity=1) for p in catalog]
+        await gather(
+            *(create_update_cart_item(shared_db, cart_id, p) for p in products)
+        )
+        get_cart_response = client.get("/cart/" + user_id)
+        assert get_cart_response.json().get("items_quantity") == 100
+        assert get_cart_response.json().get("price") == 250
+
+
+@mark.asyncio
+async def test_create_update_cart_item_uses_catalog_price():
+    with TestClient(app) as client:
+        body_client = await generate_fake_user(client)
+        fake_products = await generate_fake_products(client)
+        user_id = body_client.json().get("_id")
+        fake_cart = await generate_fake_cart(client, user_id)
+        cheaper_product = {**fake_products.json()[0], "price": 0.01}
+        response = await generate_fake_cart_item(
+            client, fake_cart.json(), cheaper_product, 2
+        )
+        assert response.json().get("product").get("price") == 9.99
+        get_cart_response = client.get("/cart/" + user_id)
+        assert get_cart_response.json().get("price") == 19.98
+        response = client.delete(
+            f"/cart/{fake_cart.json().get('_id')}/item/{cheaper_product['_id']}"
+        )
+        assert response.json().get("quantity") == 1
+        get_cart_response = client.get("/cart/" + user_id)
+        assert get_cart_response.json().get("price") == 9.99
+
+        unknown_product = {**cheaper_product, "_id": "unexisting"}
+        response = await generate_fake_cart_item(
+            client, fake_cart.json(), unknown_product
+        )
+        assert response.json().get("error_msg") == "Unknown product"
+
+
+@mark.asyncio
+async def test_create_update_cart_item_rounds_item_price():
+    with TestClient(app) as client:
+        body_client = await generate_fake_user(client)
+        user_id = body_client.json().get("_id")
+        fake_cart = await generate_fake_cart(client, user_id)
+        cart_id = fake_cart.json().get("_id")
+        product = {
+            "_id": "product-cents",
+            "name": "Bala",
+            "description": "Bala de goma de morango",
+            "price": 0.1,
+        }
+        await shared_db.product_collection.insert_one(product)
+        for _ in range(3):
+            cart_item = await create_update_cart_item(
+                shared_db,
+                cart_id,
+                CartItemUpdate(product=product, quantity=1),
+                with_cart=True,
+            )
+        assert cart_item.get("cart").get("_id") == cart_id
+        stored_item = await shared_db.cart_items_collection.find_one(
+            {"cart_id": cart_id, "product._id": "product-cents"}
+        )
+        assert stored_item.get("item_price") == 0.3
+        assert stored_item.get("quantity") == 3
+        assert stored_item.get("product").get("name") == "Bala"
+        assert stored_item.get("_id") == cart_item.get("_id")
+        assert "cart" not in stored_item
+
+
 @mark.asyncio
 async def test_create_update_cart_item_missing_fields():
     with TestClient(app) as client:
@@ -129,10 +233,100 @@ async def test_get_cart_item():
             "/cart/" + fake_cart.json().get("_id") + "/item/" + first_product_id + "/"
         )
         assert get_cart_item_response.status_code == 200
-        assert get_cart_item_response.json().get("cart") == fake_cart.json()
+        assert get_cart_item_response.json().get("cart_id") == fake_cart.json().get(
+            "_id"
+        )
+        assert get_cart_item_response.json().get("cart") is None
         assert get_cart_item_response.json().get("product") == fake_products.json()[0]
 
 
+@mark.asyncio
+async def test_get_cart_item_with_cart():
+    with TestClient(app) as client:
+        body_client = await generate_fake_user(client)
+        fake_products = await generate_fake_products(client)
+        user_id = body_client.json().get("_id")
+        fake_cart = await generate_fake_cart(client, user_id)
+        await generate_fake_cart_item(client, fake_cart.json(), fake_products.json()[0])
+        get_cart_items_response = client.get(
+            "/cart/" + fake_cart.json().get("_id") + "/item/?with_cart=true"
+        )
+        assert get_cart_items_response.status_code == 200
+        cart_items = get_cart_items_response.json().get("items")
+        assert len(cart_items) == 1
+        assert cart_items[0].get("cart").get("_id") == fake_cart.json().get("_id")
+        assert cart_items[0].get("cart").get("price") == 9.99
+        assert cart_items[0].get("cart").get("items_quantity") == 1
+
+
+@mark.asyncio
+async def test_get_cart_items_fields():
+    with TestClient(app) as client:
+        body_client = await generate_fake_user(client)
+        fake_products = await generate_fake_products(client)
+        fake_cart = await generate_fake_cart(client, body_client.json().get("_id"))
+        await generate_fake_cart_item(client, fake_cart.json(), fake_products.json()[0])
+        response = client.get(
+            "/cart/" + fake_cart.json().get("_id") + "/item/?fields=quantity"
+        )
+        assert response.status_code == 200
+        cart_items = response.json().get("items")
+        assert len(cart_items) == 1
+        assert cart_items[0] == {"quantity": 1}
+
+
+@mark.asyncio
+async def test_get_cart_items_fast_json(monkeypatch):
+    with TestClient(app) as client:
+        body_client = await generate_fake_user(client)
+        fake_products = await generate_fake_products(client)
+        fake_cart = await generate_fake_cart(client, body_client.json().get("_id"))
+        await generate_fake_cart_item(client, fake_cart.json(), fake_products.json()[0])
+        urls = [
+            "/cart/" + fake_cart.json().get("_id") + "/item/?with_cart=true",
+            "/cart/" + body_client.json().get("_id") + "/full",
+        ]
+        expected = [client.get(url).json() for url in urls]
+        monkeypatch.setattr(utils.fast_json, "FAST_JSON", True)
+        assert [client.get(url).json() for url in urls] == expected
+
+
+@mark.asyncio
+async def test_get_user_cart_full():
+    with TestClient(app) as client:
+        body_client = await generate_fake_user(client)
+        fake_products = await generate_fake_products(client)
+        user_id = body_client.json().get("_id")
+        fake_cart = await generate_fake_cart(client, user_id)
+        await generate_fake_cart_item(client, fake_cart.json(), fake_products.json()[0])
+        await generate_fake_cart_item(client, fake_cart.json(), fake_products.json()[1])
+        first_page = client.get(f"/cart/{user_id}/full?page_size=1")
+        assert first_page.status_code == 200
+        assert first_page.json().get("_id") == fake_cart.json().get("_id")
+        assert first_page.json().get("items_quantity") == 2
+        assert len(first_page.json().get("items")) == 1
+        assert first_page.json().get("next_cursor") is not None
+
+        second_page = client.get(
+            f"/cart/{user_id}/full?page_size=1&cursor="
+            + first_page.json().get("next_cursor")
+        )
+        assert len(second_page.json().get("items")) == 1
+        assert second_page.json().get("next_cursor") is None
+        product_ids = {
+            first_page.json().get("items")[0].get("product").get("_id"),
+            second_page.json().get("items")[0].get("product").get("_id"),
+        }
+        assert product_ids == {p.get("_id") for p in fake_products.json()}
+
+
+@mark.asyncio
+async def test_get_user_cart_full_unexisting():
+    with TestClient(app) as client:
+        get_cart_response = client.get("/cart/unexisting_id/full")
+        assert get_cart_response.status_code == 404
+
+
 @mark.asyncio
 async def test_get_cart_unexisting():
     with TestClient(app) as client:
@@ -172,6 +366,34 @@ async def test_delete_cart_item_with_more_quantity():
         assert delete_cart_item_response.status_code == 200
 
 
+@mark.asyncio
+async def test_delete_cart_item_updates_totals():
+    with TestClient(app) as client:
+        body_client = await generate_fake_user(client)
+        fake_products = await generate_fake_products(client)
+        user_id = body_client.json().get("_id")
+        first_product_id = fake_products.json()[0].get("_id")
+        fake_cart = await generate_fake_cart(client, user_id)
+        await generate_fake_cart_item(
+            client, fake_cart.json(), fake_products.json()[0], 4
+        )
+        delete_cart_item_response = client.delete(
+            f"""/cart/{fake_cart.json().get("_id")}/item/{first_product_id}?quantity=3"""
+        )
+        assert delete_cart_item_response.json().get("quantity") == 1
+        get_cart_response = client.get("/cart/" + user_id)
+        assert get_cart_response.json().get("items_quantity") == 1
+        assert get_cart_response.json().get("price") == 9.99
+
+        delete_cart_item_response = client.delete(
+            f"""/cart/{fake_cart.json().get("_id")}/item/{first_product_id}?quantity=5"""
+        )
+        assert delete_cart_item_response.status_code == 303
+        get_cart_response = client.get("/cart/" + user_id)
+        assert get_cart_response.json().get("items_quantity") == 0
+        assert get_cart_response.json().get("price") == 0
+
+
 @mark.asyncio
 async def test_delete_cart_item_unexisting():
     with TestClient(app) as client:
@@ -179,6 +401,31 @@ async def test_delete_cart_item_unexisting():
         assert delete_cart_response.status_code == 404
 
 
+@mark.asyncio
+async def test_delete_cart_item_paid_cart():
+    with TestClient(app) as client:
+        body_client = await generate_fake_user(client)
+        fake_products = await generate_fake_products(client)
+        user_id = body_client.json().get("_id")
+        first_product_id = fake_products.json()[0].get("_id")
+        fake_cart = await generate_fake_cart(client, user_id)
+        cart_id = fake_cart.json().get("_id")
+        await generate_fake_cart_item(
+            client, fake_cart.json(), fake_products.json()[0], 4
+        )
+        await shared_db.cart_collection.update_one(
+            {"_id": cart_id}, {"$set": {"paid": True}}
+        )
+        delete_cart_item_response = client.delete(
+            f"/cart/{cart_id}/item/{first_product_id}"
+        )
+        assert delete_cart_item_response.status_code == 404
+        cart_item = await shared_db.cart_items_collection.find_one(
+            {"cart_id": cart_id, "product._id": first_product_id}
+        )
+        assert cart_item.get("quantity") == 4
+
+
 @mark.asyncio
 async def test_delete_user_cascade():
     with TestClient(app) as client:
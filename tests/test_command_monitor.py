@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import controllers.admin_routes
+from controllers.admin_routes import router as admin_router
+from server.command_monitor import command_listener, explain_summary
+from server.database import get_db
+from server.database_test import drop_databases_to_test, get_db as get_test_db
+from utils.request_timing import RequestTiming, request_timing
+
+app = FastAPI()
+app.include_router(admin_router, tags=["admin"], prefix="/admin")
+
+app.dependency_overrides[get_db] = get_test_db
+
+
+@app.on_event("shutdown")
+async def shutdown_db_client():
+    await drop_databases_to_test()
+    command_listener.slow_queries.clear()
+
+
+def run_command(command_name: str, command: dict, duration_ms: float, request_id=1):
+    event = SimpleNamespace(
+        command_name=command_name,
+        command=command,
+        database_name="shopping_cart_test",
+        connection_id=("localhost", 27017),
+        request_id=request_id,
+        duration_micros=int(duration_ms * 1000),
+    )
+    command_listener.started(event)
+    command_listener.succeeded(event)
+
+
+def test_commands_counted_per_request():
+    timing = RequestTiming()
+    token = request_timing.set(timing)
+    try:
+        run_command("find", {"find": "products", "filter": {}}, 2, request_id=1)
+        run_command("insert", {"insert": "carts", "documents": [{}]}, 3, request_id=2)
+    finally:
+        request_timing.reset(token)
+    assert timing.commands == 2
+    assert round(timing.command_seconds, 3) == 0.005
+
+
+def test_slow_queries_endpoint(monkeypatch):
+    monkeypatch.setattr(controllers.admin_routes, "ADMIN_TOKEN", "secret")
+    with TestClient(app) as client:
+        run_command(
+            "find",
+            {"find": "products", "filter": {"name": "x"}, "lsid": {"id": 1}},
+            500,
+            request_id=3,
+        )
+        run_command(
+            "insert", {"insert": "carts", "documents": [{}, {}]}, 400, request_id=4
+        )
+        response = client.get("/admin/slow-queries?limit=2")
+        assert response.status_code == 403
+        response = client.get(
+            "/admin/slow-queries?limit=2", headers={"X-Admin-Token": "secret"}
+        )
+        assert response.status_code == 200
+        insert, find = response.json()
+        assert insert["command"] == {"insert": "carts", "documents": 2}
+        assert find["collection"] == "products"
+        assert find["duration_ms"] == 500
+        assert "lsid" not in find["command"]
+        assert find["explain"] is None
+
+
+def test_slow_queries_closed_without_admin_token(monkeypatch):
+    monkeypatch.setattr(controllers.admin_routes, "ADMIN_TOKEN", None)
+    with TestClient(app) as client:
+        assert client.get("/admin/slow-queries").status_code == 404
+        monkeypatch.setattr(controllers.admin_routes, "ADMIN_ROUTES_OPEN", True)
+        assert client.get("/admin/slow-queries").status_code == 200
+
+
+def test_explain_summary():
+    explain = {
+        "queryPlanner": {
+            "winningPlan": {
+                "stage": "FETCH",
+                "inputStage": {"stage": "IXSCAN", "indexName": "email_domain_email"},
+            }
+        }
+    }
+    assert explain_summary(explain) == "IXSCAN > FETCH (email_domain_email)"
+    collscan = {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}
+    assert explain_summary(collscan) == "COLLSCAN"
@@ -0,0 +1,55 @@
+from asyncio import gather
+
+from pytest import mark
+
+from server.database import RequestDataBase
+from server.database_test import drop_databases_to_test, shared_db
+from utils.data_loader import DataLoader
+
+
+class CountingCollection:
+    def __init__(self, collection):
+        self.collection = collection
+        self.finds = 0
+
+    def find(self, *args, **kwargs):
+        self.finds += 1
+        return self.collection.find(*args, **kwargs)
+
+
+@mark.asyncio
+async def test_loads_in_the_same_tick_share_one_query():
+    shared_db.connect_db()
+    try:
+        await shared_db.users_collection.insert_many(
+            [{"_id": "user-1", "name": "Bruna"}, {"_id": "user-2", "name": "Bruno"}]
+        )
+        users = CountingCollection(shared_db.users_collection)
+        loader = DataLoader(users)
+
+        first, second, unexisting = await gather(
+            loader.load("user-1"), loader.load("user-2"), loader.load("user-3")
+        )
+        assert first.get("name") == "Bruna"
+        assert second.get("name") == "Bruno"
+        assert unexisting is None
+        assert users.finds == 1
+
+        assert (await loader.load("user-1")).get("name") == "Bruna"
+        assert users.finds == 1
+        loader.clear("user-1")
+        await loader.load("user-1")
+        assert users.finds == 2
+    finally:
+        await drop_databases_to_test()
+
+
+@mark.asyncio
+async def test_request_database_keeps_the_shared_collections():
+    shared_db.connect_db()
+    try:
+        database = RequestDataBase(shared_db)
+        assert database.users_collection is shared_db.users_collection
+        assert database.loaders is not RequestDataBase(shared_db).loaders
+    finally:
+        await drop_databases_to_test()
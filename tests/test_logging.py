@@ -0,0 +1,54 @@
+from json import loads
+from logging import INFO, NullHandler, getLogger
+from os import getpid
+
+from pytest import fixture
+
+from project_logs import config
+from project_logs.logging import get_logger, setup_logging, shutdown_logging
+
+
+@fixture
+def logs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "LOGS_DIR", str(tmp_path))
+    yield tmp_path
+    shutdown_logging()
+
+
+def test_setup_logging_once(logs_dir):
+    assert setup_logging() is setup_logging()
+
+
+def test_errors_are_json_lines(logs_dir):
+    setup_logging()
+    get_logger("errors").error(
+        {"event": "validation_error", "error_loc": ["body", "name"]}
+    )
+    get_logger("other").error("not in the errors file")
+    shutdown_logging()
+
+    lines = (logs_dir / "errors.log").read_text().splitlines()
+    assert len(lines) == 1
+    entry = loads(lines[0])
+    assert entry["level"] == "ERROR"
+    assert entry["event"] == "validation_error"
+    assert entry["error_loc"] == ["body", "name"]
+
+
+def test_setup_logging_keeps_other_handlers(logs_dir, monkeypatch):
+    monkeypatch.setattr(config, "LOG_FILE_PER_PROCESS", True)
+    root_logger = getLogger()
+    other_handler = NullHandler()
+    root_logger.addHandler(other_handler)
+    previous_level = root_logger.level
+    try:
+        setup_logging()
+        assert other_handler in root_logger.handlers
+        assert root_logger.level == INFO
+        get_logger("errors").error({"event": "per_process"})
+        shutdown_logging()
+        assert other_handler in root_logger.handlers
+        assert root_logger.level == previous_level
+        assert (logs_dir / f"errors.{getpid()}.log").exists()
+    finally:
+        root_logger.removeHandler(other_handler)
@@ -0,0 +1,199 @@
+from asyncio import gather
+
+from pymongo import ASCENDING, IndexModel, ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pytest import mark, raises
+
+from server.memory_db import AsyncMemoryClient
+
+
+def new_database():
+    # cada teste com os seus dados: nada é compartilhado com o shared_db
+    return AsyncMemoryClient(databases={}).shopping_cart_test
+
+
+@mark.asyncio
+async def test_find_with_operators_projection_sort_and_limit():
+    users = new_database().users
+    await users.insert_many(
+        [
+            {"_id": "1", "name": "Ana", "age": 30, "address": [{"zipcode": "1"}]},
+            {"_id": "2", "name": "Bia", "age": 20, "address": []},
+            {"_id": "3", "name": "Caio", "age": 40},
+        ]
+    )
+    found = users.find({"age": {"$gte": 25}}, {"_id": 0, "name": 1})
+    assert await found.sort("age", -1).to_list(length=10) == [
+        {"name": "Caio"},
+        {"name": "Ana"},
+    ]
+    assert await users.find_one({"address.zipcode": "1"}, {"name": 1}) == {
+        "_id": "1",
+        "name": "Ana",
+    }
+    assert await users.count_documents({"address": {"$exists": False}}) == 1
+    names = [u["name"] async for u in users.find({}).sort("_id").limit(2)]
+    assert names == ["Ana", "Bia"]
+
+
+@mark.asyncio
+async def test_update_operators_and_modified_count():
+    users = new_database().users
+    await users.insert_one({"_id": "1", "address": [], "visits": 1})
+    address = {"street": "Rua A", "zipcode": "1"}
+
+    result = await users.update_one({"_id": "1"}, {"$addToSet": {"address": address}})
+    assert (result.matched_count, result.modified_count) == (1, 1)
+    result = await users.update_one({"_id": "1"}, {"$addToSet": {"address": address}})
+    assert (result.matched_count, result.modified_count) == (1, 0)
+
+    await users.update_one({"_id": "1"}, {"$inc": {"visits": 2}, "$set": {"a.b": 1}})
+    await users.update_one({"_id": "1"}, {"$pull": {"address": address}})
+    assert await users.find_one({"_id": "1"}) == {
+        "_id": "1",
+        "address": [],
+        "visits": 3,
+        "a": {"b": 1},
+    }
+    result = await users.update_one({"_id": "2"}, {"$set": {"visits": 1}})
+    assert (result.matched_count, result.modified_count) == (0, 0)
+
+
+@mark.asyncio
+async def test_upsert_and_pipeline_update():
+    items = new_database().cart_items
+    for _ in range(2):
+        item = await items.find_one_and_update(
+            {"cart_id": "c1", "product._id": "p1"},
+            {
+                "$setOnInsert": {"_id": "i1", "product": {"_id": "p1", "price": 2.5}},
+                "$inc": {"quantity": 2, "item_price": 5.0},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    assert item["quantity"] == 4 and item["cart_id"] == "c1"
+
+    item = await items.find_one_and_update(
+        {"_id": "i1", "quantity": {"$gt": 1}},
+        [
+            {"$set": {"quantity": {"$subtract": ["$quantity", 1]}}},
+            {
+                "$set": {
+                    "item_price": {
+                        "$round": [{"$multiply": ["$product.price", "$quantity"]}, 2]
+                    }
+                }
+            },
+        ],
+        return_document=ReturnDocument.AFTER,
+    )
+    assert (item["quantity"], item["item_price"]) == (3, 7.5)
+
+
+@mark.asyncio
+async def test_unique_index_and_bulk_write_errors():
+    users = new_database().users
+    await users.create_indexes(
+        [IndexModel([("email", ASCENDING)], name="email_unique", unique=True)]
+    )
+    assert "email_unique" in await users.index_information()
+    await users.insert_one({"_id": "1", "email": "a@x.com"})
+    with raises(DuplicateKeyError):
+        await users.insert_one({"_id": "2", "email": "a@x.com"})
+    with raises(DuplicateKeyError):
+        await users.insert_one({"_id": "1", "email": "b@x.com"})
+
+    with raises(BulkWriteError) as error:
+        await users.bulk_write(
+            [
+                ReplaceOne({"_id": "3"}, {"email": "c@x.com"}, upsert=True),
+                UpdateOne({"_id": "3"}, {"$set": {"email": "a@x.com"}}),
+                ReplaceOne({"_id": "4"}, {"email": "d@x.com"}, upsert=True),
+            ],
+            ordered=False,
+        )
+    details = error.value.details
+    assert details["nUpserted"] == 2
+    assert [e["index"] for e in details["writeErrors"]] == [1]
+
+    await users.drop_index("email_unique")
+    await users.insert_one({"_id": "5", "email": "a@x.com"})
+
+
+@mark.asyncio
+async def test_aggregate_group_and_lookup():
+    database = new_database()
+    await database.users.insert_many(
+        [
+            {"_id": "1", "email_domain": "x.com"},
+            {"_id": "2", "email_domain": "y.com"},
+            {"_id": "3", "email_domain": "x.com"},
+        ]
+    )
+    domains = database.users.aggregate(
+        [
+            {"$group": {"_id": "$email_domain", "emails_count": {"$sum": 1}}},
+            {"$sort": {"emails_count": -1, "_id": 1}},
+            {"$project": {"_id": 0, "domain": "$_id", "emails_count": 1}},
+        ]
+    )
+    assert await domains.to_list(length=10) == [
+        {"emails_count": 2, "domain": "x.com"},
+        {"emails_count": 1, "domain": "y.com"},
+    ]
+
+    await database.carts.insert_one({"_id": "c1", "paid": False})
+    await database.cart_items.insert_many(
+        [{"_id": f"i{n}", "cart_id": "c1"} for n in (3, 1, 2)]
+    )
+    carts = database.carts.aggregate(
+        [
+            {"$match": {"paid": False}},
+            {
+                "$lookup": {
+                    "from": "cart_items",
+                    "localField": "_id",
+                    "foreignField": "cart_id",
+                    "pipeline": [{"$sort": {"_id": 1}}, {"$limit": 2}],
+                    "as": "items",
+                }
+            },
+        ]
+    )
+    (cart,) = await carts.to_list(length=1)
+    assert [item["_id"] for item in cart["items"]] == ["i1", "i2"]
+
+
+@mark.asyncio
+async def test_pages_sorted_by_id():
+    products = new_database().products
+    await products.insert_many([{"_id": f"p{n}", "price": n} for n in (3, 1, 4, 2, 5)])
+    first = await products.find({}).sort("_id", ASCENDING).limit(2).to_list(2)
+    assert [p["_id"] for p in first] == ["p1", "p2"]
+    await products.delete_one({"_id": "p3"})
+    after = {"$and": [{"price": {"$gte": 1}}, {"_id": {"$gt": "p2"}}]}
+    second = await products.find(after).sort("_id", ASCENDING).limit(2).to_list(2)
+    assert [p["_id"] for p in second] == ["p4", "p5"]
+    last = await products.find({}).sort("_id", -1).limit(1).to_list(1)
+    assert last[0]["_id"] == "p5"
+
+
+@mark.asyncio
+async def test_concurrent_operations_interleave():
+    carts = new_database().carts
+    await carts.insert_one({"_id": "c1", "price": 0.0, "items_quantity": 0})
+
+    async def read_modify_write():
+        cart = await carts.find_one({"_id": "c1"})
+        await carts.update_one({"_id": "c1"}, {"$set": {"price": cart["price"] + 2.5}})
+
+    async def increment():
+        await carts.update_one({"_id": "c1"}, {"$inc": {"items_quantity": 1}})
+
+    await gather(*(read_modify_write() for _ in range(100)))
+    await gather(*(increment() for _ in range(100)))
+    cart = await carts.find_one({"_id": "c1"})
+    # as leituras intercalam e as escritas se sobrepõem; o $inc é atômico
+    assert cart["price"] < 250.0
+    assert cart["items_quantity"] == 100
@@ -0,0 +1,114 @@
+from json import dump
+from os import path, utime
+from time import time
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+from pytest import mark
+
+from controllers.product_routes import router as product_router
+from models.model_product import product_cache
+from server.database import get_db
+from server.database_test import (
+    apply_migrations_to_test,
+    drop_databases_to_test,
+    get_db as get_test_db,
+)
+from utils import metrics
+from utils.generate_fakes import generate_fake_products
+from utils.request_timing import TimingMiddleware
+
+app = FastAPI()
+app.add_middleware(TimingMiddleware)
+app.include_router(product_router, tags=["product"], prefix="/products")
+metrics.register_cache("products", product_cache)
+
+app.dependency_overrides[get_db] = get_test_db
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def route_metrics():
+    return PlainTextResponse(metrics.collect(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.on_event("startup")
+async def startup_db_client():
+    await apply_migrations_to_test()
+
+
+@app.on_event("shutdown")
+async def shutdown_db_client():
+    await drop_databases_to_test()
+    product_cache.clear()
+
+
+def sample(text: str, name: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+@mark.asyncio
+async def test_metrics_of_routes_mongo_and_cache():
+    with TestClient(app) as client:
+        products = (await generate_fake_products(client)).json()
+        before = client.get("/metrics").text
+        route = 'http_requests_total{method="GET",route="/products/{product_id}",status="200"}'
+        for _ in range(2):
+            client.get("/products/" + products[0].get("_id"))
+        after = client.get("/metrics")
+        assert after.headers["content-type"].startswith(metrics.CONTENT_TYPE)
+        assert sample(after.text, route) - sample(before, route) == 2
+        assert (
+            'http_request_duration_seconds_bucket{method="GET",'
+            'route="/products/{product_id}",le="+Inf"}' in after.text
+        )
+        assert 'mongo_operations_total{collection="products",operation="find"}' in (
+            after.text
+        )
+        assert 'cache_hit_ratio{cache="products"}' in after.text
+        in_flight = sample(after.text, 'http_requests_in_flight{method="GET"}')
+        assert in_flight == 1
+
+
+def test_metrics_of_all_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_MULTIPROC_DIR", str(tmp_path))
+    metrics.mongo_operations.inc("workers_test", "find_one", amount=3)
+    own_total = sample(
+        metrics.collect(),
+        'mongo_operations_total{collection="workers_test",operation="find_one"}',
+    )
+    with open(tmp_path / "metrics_1.json", "w") as other_worker:
+        dump(
+            {
+                "mongo_operations_total": {"workers_test|find_one": 2},
+                "cache_hits_total": {"products": 3},
+                "cache_misses_total": {"products": 1},
+            },
+            other_worker,
+        )
+    text = metrics.collect()
+    assert (
+        sample(
+            text,
+            'mongo_operations_total{collection="workers_test",operation="find_one"}',
+        )
+        == own_total + 2
+    )
+
+
+@mark.asyncio
+async def test_metrics_skip_stopped_and_stale_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_MULTIPROC_DIR", str(tmp_path))
+    metrics.cache_size.set("workers_test", value=5)
+    with open(tmp_path / "metrics_1.json", "w") as dead_worker:
+        dump({"cache_size": {"workers_test": 7}}, dead_worker)
+    old = time() - metrics.METRICS_STALE_FLUSHES * metrics.METRICS_FLUSH_INTERVAL - 1
+    utime(tmp_path / "metrics_1.json", (old, old))
+    assert sample(metrics.collect(), 'cache_size{cache="workers_test"}') == 5
+
+    assert path.exists(metrics.worker_file())
+    await metrics.stop_metrics_flush()
+    assert not path.exists(metrics.worker_file())
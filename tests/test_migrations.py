@@ -0,0 +1,178 @@
+from asyncio import gather
+
+from bson.objectid import ObjectId
+from pytest import mark, raises
+
+from server import migrations
+from server.database_test import DataBaseTest, drop_databases_to_test, shared_db
+from server.migrations import (
+    MIGRATIONS,
+    MigrationError,
+    apply_migrations,
+    get_schema_version,
+)
+
+
+@mark.asyncio
+async def test_apply_migrations():
+    shared_db.connect_db()
+    try:
+        version = await apply_migrations(shared_db)
+        assert version == max(m[0] for m in MIGRATIONS)
+        assert await get_schema_version(shared_db) == version
+
+        users_indexes = await shared_db.users_collection.index_information()
+        cart_indexes = await shared_db.cart_collection.index_information()
+        cart_items_indexes = await shared_db.cart_items_collection.index_information()
+        assert "email_unique" in users_indexes
+        assert "email_domain_email" in users_indexes
+        assert "user_id_paid" in cart_indexes
+        assert "cart_id__id" in cart_items_indexes
+        assert "cart_id_product_id" in cart_items_indexes
+    finally:
+        await drop_databases_to_test()
+
+
+@mark.asyncio
+async def test_apply_migrations_twice():
+    shared_db.connect_db()
+    try:
+        first_version = await apply_migrations(shared_db)
+        second_version = await apply_migrations(shared_db)
+        assert first_version == second_version
+        schema_version = await shared_db.migrations_collection.find_one(
+            {"_id": "schema_version"}
+        )
+        assert len(schema_version.get("applied")) == len(MIGRATIONS)
+    finally:
+        await drop_databases_to_test()
+
+
+@mark.asyncio
+async def test_apply_migrations_concurrent_workers(monkeypatch):
+    monkeypatch.setattr(migrations, "MIGRATION_LOCK_POLL_SECONDS", 0.01)
+    shared_db.connect_db()
+    other_worker_db = DataBaseTest()
+    other_worker_db.connect_db()
+    try:
+        versions = await gather(
+            apply_migrations(shared_db), apply_migrations(other_worker_db)
+        )
+        assert versions == [max(m[0] for m in MIGRATIONS)] * 2
+        schema_version = await shared_db.migrations_collection.find_one(
+            {"_id": "schema_version"}
+        )
+        applied = [m["version"] for m in schema_version.get("applied")]
+        assert applied == sorted(m[0] for m in MIGRATIONS)
+        assert (
+            await shared_db.migrations_collection.find_one({"_id": "migration_lock"})
+            is None
+        )
+    finally:
+        other_worker_db.client.close()
+        await drop_databases_to_test()
+
+
+@mark.asyncio
+async def test_apply_migrations_rewrites_legacy_ids():
+    shared_db.connect_db()
+    try:
+        cart_id = ObjectId()
+        await shared_db.cart_collection.insert_one(
+            {"_id": cart_id, "user": {"_id": "user-1"}, "paid": False}
+        )
+        await shared_db.cart_items_collection.insert_one(
+            {
+                "cart": {"_id": cart_id, "user": {"_id": "user-1"}},
+                "product": {"_id": 10},
+            }
+        )
+        await apply_migrations(shared_db)
+
+        cart = await shared_db.cart_collection.find_one({"_id": str(cart_id)})
+        assert cart is not None
+        assert await shared_db.cart_collection.count_documents({}) == 1
+        cart_item = await shared_db.cart_items_collection.find_one(
+            {"cart_id": str(cart_id)}
+        )
+        assert "cart" not in cart_item
+        assert isinstance(cart_item.get("_id"), str)
+        assert cart_item.get("product").get("_id") == "10"
+    finally:
+        await drop_databases_to_test()
+
+
+@mark.asyncio
+async def test_apply_migrations_backfills_email_domain():
+    shared_db.connect_db()
+    try:
+        await shared_db.users_collection.insert_one(
+            {"_id": "user-1", "name": "Bruna", "email": "Bruna@Hotmail.com"}
+        )
+        await apply_migrations(shared_db)
+
+        user = await shared_db.users_collection.find_one({"_id": "user-1"})
+        assert user.get("email") == "bruna@hotmail.com"
+        assert user.get("email_domain") == "hotmail.com"
+    finally:
+        await drop_databases_to_test()
+
+
+@mark.asyncio
+async def test_apply_migrations_rewrites_legacy_users_with_unique_email():
+    shared_db.connect_db()
+    try:
+        user_id, cart_id = ObjectId(), ObjectId()
+        await shared_db.users_collection.insert_many(
+            [
+                {"_id": user_id, "name": "Ana", "email": "a@b.com"},
+                {"_id": ObjectId(), "name": "Bia", "email": "b@b.com"},
+            ]
+        )
+        await shared_db.cart_collection.insert_one(
+            {"_id": cart_id, "user": {"_id": user_id}, "paid": False}
+        )
+        await shared_db.cart_items_collection.insert_one(
+            {
+                "_id": ObjectId(),
+                "cart": {"_id": cart_id, "user": {"_id": user_id}},
+                "product": {"_id": 10},
+            }
+        )
+        await apply_migrations(shared_db)
+
+        user = await shared_db.users_collection.find_one({"email": "a@b.com"})
+        assert user.get("_id") == str(user_id)
+        assert await shared_db.users_collection.count_documents({}) == 2
+        assert "email_unique" in await shared_db.users_collection.index_information()
+        cart = await shared_db.cart_collection.find_one({"_id": str(cart_id)})
+        assert cart.get("user").get("_id") == str(user_id)
+        cart_item = await shared_db.cart_items_collection.find_one(
+            {"cart_id": str(cart_id)}
+        )
+        assert isinstance(cart_item.get("_id"), str)
+    finally:
+        await drop_databases_to_test()
+
+
+@mark.asyncio
+async def test_apply_migrations_lists_duplicated_emails():
+    shared_db.connect_db()
+    try:
+        await shared_db.users_collection.insert_many(
+            [
+                {"_id": "user-1", "email": "Ana@x.com"},
+                {"_id": "user-2", "email": "ana@x.com"},
+                {"_id": "user-3", "email": "bia@x.com"},
+            ]
+        )
+        with raises(MigrationError, match="ana@x.com: user-1, user-2"):
+            await apply_migrations(shared_db)
+
+        # nada mudou: emails e o índice antigo continuam lá
+        user = await shared_db.users_collection.find_one({"_id": "user-1"})
+        assert user.get("email") == "Ana@x.com"
+        assert "email" in await shared_db.users_collection.index_information()
+        assert await get_schema_version(shared_db) == 1
+    finally:
+        await drop_databases_to_test()
@@ -1,11 +1,20 @@
+from json import dumps, loads
+
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
 from pytest import mark
 
+import utils.fast_json
 from controllers.product_routes import router as product_router
+from models.model_product import product_cache
 from server.database import get_db
-from server.database_test import drop_databases_to_test, get_db as get_test_db
+from server.database_test import (
+    apply_migrations_to_test,
+    drop_databases_to_test,
+    get_db as get_test_db,
+)
 from utils.generate_fakes import generate_fake_product, generate_fake_products
+from utils.lru_ttl_cache import LruTtlCache
 
 app = FastAPI()
 app.include_router(product_router, tags=["product"], prefix="/products")
@@ -13,9 +22,15 @@ app.include_router(product_router, tags=["product"], prefix="/products")
 app.dependency_overrides[get_db] = get_test_db
 
 
+@app.on_event("startup")
+async def startup_db_client():
+    await apply_migrations_to_test()
+
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     await drop_databases_to_test()
+    product_cache.clear()
 
 
 @mark.asyncio
@@ -30,6 +45,101 @@ async def test_create_products():
         assert "_id" in body[0]
 
 
+@mark.asyncio
+async def test_create_products_with_duplicated_id():
+    with TestClient(app) as client:
+        await generate_fake_products(client)
+        response = client.post(
+            "/products/",
+            json=[
+                {"_id": 10, "name": "Sorvete", "description": "Doce", "price": 9.99},
+                {"_id": 30, "name": "Pipoca", "description": "Salgado", "price": 3.99},
+            ],
+        )
+        assert response.status_code == 207
+        body = response.json()
+        assert body[0].get("error_type") == "create_products"
+        assert body[0].get("error_msg") == "Product with ID 10 already exists"
+        assert body[1].get("_id") == "30"
+        assert body[1].get("name") == "Pipoca"
+
+
+@mark.asyncio
+async def test_create_products_all_failed():
+    with TestClient(app) as client:
+        await generate_fake_products(client)
+        response = client.post(
+            "/products/",
+            json=[{"_id": 10, "name": "Sorvete", "description": "Doce", "price": 9.99}],
+        )
+        assert response.status_code == 207
+        assert response.json().get("error_type") == "create_products"
+        response = client.post(
+            "/products/",
+            json={"_id": 10, "name": "Sorvete", "description": "Doce", "price": 9.99},
+        )
+        assert response.status_code == 400
+        assert response.json().get("error_msg") == "Product with ID 10 already exists"
+
+
+@mark.asyncio
+async def test_import_products_ndjson(monkeypatch):
+    monkeypatch.setattr("models.model_product.PRODUCTS_IMPORT_BATCH_SIZE", 2)
+    lines = [
+        {"_id": "import-1", "name": "Sorvete", "description": "Doce", "price": 9.99},
+        {"_id": "import-2", "name": "Pipoca", "description": "Salgado", "price": 3.99},
+        {"_id": "import-3", "name": "Bolacha", "description": "Biscoito"},
+        {"_id": "import-1", "name": "Sorvete", "description": "Doce", "price": 8.99},
+    ]
+    with TestClient(app) as client:
+        response = client.post(
+            "/products/import",
+            data="\n".join(dumps(line) for line in lines) + "\n\n",
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        body = [loads(line) for line in response.text.splitlines()]
+        assert body[0] == {"processed": 2, "upserted": 2, "modified": 0, "errors": 0}
+        assert body[1].get("line") == 3
+        assert body[1].get("error_type") == "import_products"
+        assert body[1].get("error_msg") == "price: field required"
+        assert body[-1] == {
+            "processed": 4,
+            "upserted": 2,
+            "modified": 1,
+            "errors": 1,
+            "done": True,
+        }
+        assert client.get("/products/import-1").json().get("price") == 8.99
+
+
+@mark.asyncio
+async def test_import_products_twice():
+    lines = [
+        {"_id": "import-1", "name": "Sorvete", "description": "Doce", "price": 9.99},
+        {"name": "Pipoca", "description": "Salgado", "price": 3.99},
+    ]
+    data = "\n".join(dumps(line) for line in lines)
+    with TestClient(app) as client:
+        for _ in range(2):
+            response = client.post("/products/import", data=data)
+            body = [loads(line) for line in response.text.splitlines()]
+            assert body[0].get("line") == 2
+            assert body[0].get("error_msg") == "_id: field required"
+        assert body[-1].get("upserted") == 0
+        assert len(client.get("/products/").json().get("items")) == 1
+
+
+@mark.asyncio
+async def test_import_products_invalid_json():
+    with TestClient(app) as client:
+        response = client.post("/products/import", data="{not json")
+        body = [loads(line) for line in response.text.splitlines()]
+        assert body[0].get("line") == 1
+        assert body[-1].get("errors") == 1
+        assert body[-1].get("upserted") == 0
+
+
 @mark.asyncio
 async def test_create_product_missing_name():
     with TestClient(app) as product:
@@ -65,6 +175,105 @@ async def test_get_product():
         assert get_product_response.json() == new_product
 
 
+@mark.asyncio
+async def test_list_products_fields():
+    with TestClient(app) as client:
+        await generate_fake_products(client)
+        response = client.get("/products/?fields=name,price")
+        assert response.status_code == 200
+        items = response.json().get("items")
+        assert len(items) == 2
+        assert all(set(item) == {"_id", "name", "price"} for item in items)
+
+
+@mark.asyncio
+async def test_list_products_by_ids():
+    with TestClient(app) as client:
+        products = (await generate_fake_products(client)).json()
+        first_id, second_id = products[0].get("_id"), products[1].get("_id")
+        client.get(f"/products/{second_id}")
+        response = client.get(f"/products/batch?ids={second_id},unexisting,{first_id}")
+        assert response.status_code == 200
+        assert response.json() == {
+            "items": [products[1], products[0]],
+            "missing_ids": ["unexisting"],
+        }
+
+
+@mark.asyncio
+async def test_list_products_by_ids_empty():
+    with TestClient(app) as client:
+        response = client.get("/products/batch?ids=,")
+        assert response.status_code == 400
+
+
+@mark.asyncio
+async def test_list_products_fast_json(monkeypatch):
+    with TestClient(app) as client:
+        await generate_fake_products(client)
+        expected = client.get("/products/").json()
+        monkeypatch.setattr(utils.fast_json, "FAST_JSON", True)
+        assert client.get("/products/").json() == expected
+
+
+@mark.asyncio
+async def test_list_products_by_cursor():
+    with TestClient(app) as client:
+        await generate_fake_products(client)
+        await generate_fake_product(client)
+        first_page = client.get("/products/?page_size=2")
+        assert first_page.status_code == 200
+        assert len(first_page.json().get("items")) == 2
+        assert first_page.json().get("next_cursor") is not None
+
+        second_page = client.get(
+            "/products/?page_size=2&cursor=" + first_page.json().get("next_cursor")
+        )
+        assert second_page.status_code == 200
+        assert len(second_page.json().get("items")) == 1
+        assert second_page.json().get("next_cursor") is None
+        names = [
+            p.get("name")
+            for p in first_page.json().get("items") + second_page.json().get("items")
+        ]
+        assert sorted(names) == ["Bolacha", "Sabonete", "Sorvete"]
+
+
+@mark.asyncio
+async def test_list_products_invalid_cursor():
+    with TestClient(app) as client:
+        response = client.get("/products/?cursor=invalid")
+        assert response.status_code == 400
+
+
+@mark.asyncio
+async def test_get_product_from_cache():
+    with TestClient(app) as client:
+        new_product = await generate_fake_product(client)
+        product_id = new_product.json().get("_id")
+        client.get("/products/" + product_id)
+        hits = client.get("/products/cache/stats").json().get("hits")
+        get_product_response = client.get("/products/" + product_id)
+        assert get_product_response.json() == new_product.json()
+        assert client.get("/products/cache/stats").json().get("hits") == hits + 1
+
+
+@mark.asyncio
+async def test_update_product_invalidates_cache():
+    with TestClient(app) as client:
+        new_product = await generate_fake_product(client)
+        product_id = new_product.json().get("_id")
+        client.get("/products/" + product_id)
+        client.get("/products/")
+        client.put("/products/" + product_id, json={"name": "Sabonete líquido"})
+        get_product_response = client.get("/products/" + product_id)
+        assert get_product_response.json().get("name") == "Sabonete líquido"
+        list_products_response = client.get("/products/")
+        assert list_products_response.json().get("items")[0].get("name") == (
+            "Sabonete líquido"
+        )
+
+
 @mark.asyncio
 async def test_get_product_unexisting():
     with TestClient(app) as product:
@@ -113,5 +322,18 @@ async def test_delete_product_unexisting():
         assert delete_product_response.status_code == 404
 
 
+def test_product_cache_returns_copies():
+    cache = LruTtlCache(max_size=10, ttl=60)
+    page = {"items": [{"_id": "1", "price": 9.99}], "next_cursor": None}
+    cache.set(("list", None), page)
+    page["next_cursor"] = "changed after set"
+    cached_page = cache.get(("list", None))
+    cached_page["items"][0]["price"] = 0
+    assert cache.get(("list", None)) == {
+        "items": [{"_id": "1", "price": 9.99}],
+        "next_cursor": None,
+    }
+
+
 if __name__ == "__main__":
     test_update_product()
@@ -0,0 +1,82 @@
+from logging import INFO
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pytest import mark
+
+from controllers.product_routes import router as product_router
+from models.model_product import product_cache
+from server.database import get_db
+from server.database_test import (
+    apply_migrations_to_test,
+    drop_databases_to_test,
+    get_db as get_test_db,
+)
+from server.memory_db import AsyncMemoryClient
+from server.timed_collection import TimedCollection
+from utils.generate_fakes import generate_fake_products
+from utils.request_timing import TimingMiddleware, access_log
+
+app = FastAPI()
+app.add_middleware(TimingMiddleware)
+app.include_router(product_router, tags=["product"], prefix="/products")
+
+app.dependency_overrides[get_db] = get_test_db
+
+
+@app.on_event("startup")
+async def startup_db_client():
+    await apply_migrations_to_test()
+
+
+@app.on_event("shutdown")
+async def shutdown_db_client():
+    await drop_databases_to_test()
+    product_cache.clear()
+
+
+@mark.asyncio
+async def test_server_timing_header(caplog):
+    with TestClient(app) as client:
+        await generate_fake_products(client)
+        product_cache.clear()
+        caplog.set_level(INFO, logger=access_log.name)
+        response = client.get("/products/?page_size=5")
+        assert response.status_code == 200
+        server_timing = dict(
+            metric.strip().split(";dur=")
+            for metric in response.headers["Server-Timing"].split(",")
+        )
+        assert set(server_timing) == {"total", "app", "db", "serialize"}
+        assert float(server_timing["db"]) > 0
+
+        access = [r.msg for r in caplog.records if r.name == access_log.name]
+        assert access[-1]["route"] == "/products/"
+        assert access[-1]["status"] == 200
+        assert access[-1]["db_operations"] == 1
+        assert access[-1]["total_ms"] >= access[-1]["app_ms"]
+
+
+@mark.asyncio
+async def test_access_log_unknown_route(caplog):
+    with TestClient(app) as client:
+        caplog.set_level(INFO, logger=access_log.name)
+        response = client.get("/unknown")
+        assert response.status_code == 404
+        access = [r.msg for r in caplog.records if r.name == access_log.name]
+        assert access[-1]["route"] is None
+        assert access[-1]["path"] == "/unknown"
+
+
+@mark.asyncio
+async def test_cursor_counted_once(monkeypatch):
+    operations = []
+    monkeypatch.setattr(
+        "server.timed_collection.mongo_observers",
+        [lambda collection, operation, _: operations.append(operation)],
+    )
+    products = TimedCollection(AsyncMemoryClient(databases={}).shop.products)
+    await products.insert_many([{"_id": str(n)} for n in range(5)])
+    assert [p["_id"] async for p in products.find({})] == ["0", "1", "2", "3", "4"]
+    await products.find({}).to_list(length=None)
+    assert operations == ["insert_many", "find", "find"]
@@ -5,7 +5,11 @@ from pytest import mark
 from controllers.cart_routes import router as cart_router
 from controllers.user_routes import router as user_router
 from server.database import get_db
-from server.database_test import drop_databases_to_test, get_db as get_test_db
+from server.database_test import (
+    apply_migrations_to_test,
+    drop_databases_to_test,
+    get_db as get_test_db,
+)
 from utils.generate_fakes import generate_fake_cart, generate_fake_user
 
 app = FastAPI()
@@ -15,6 +19,11 @@ app.include_router(user_router, tags=["user"], prefix="/user")
 app.dependency_overrides[get_db] = get_test_db
 
 
+@app.on_event("startup")
+async def startup_db_client():
+    await apply_migrations_to_test()
+
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     await drop_databases_to_test()
@@ -61,6 +70,20 @@ async def test_get_cart():
         assert get_cart_response.json() == response.json()
 
 
+@mark.asyncio
+async def test_get_cart_fields():
+    with TestClient(app) as client:
+        user_id = (await generate_fake_user(client)).json().get("_id")
+        response = await generate_fake_cart(client, user_id)
+        get_cart_response = client.get(f"/cart/{user_id}?fields=price,items_quantity")
+        assert get_cart_response.status_code == 200
+        assert get_cart_response.json() == {
+            "_id": response.json().get("_id"),
+            "price": response.json().get("price"),
+            "items_quantity": response.json().get("items_quantity"),
+        }
+
+
 @mark.asyncio
 async def test_get_cart_unexisting():
     with TestClient(app) as client:
@@ -6,13 +6,23 @@ from pytest import mark
 from controllers.user_routes import router as client_router
 from schemas.project_errors import ProjectErrors
 from server.database import get_db
-from server.database_test import drop_databases_to_test, get_db as get_test_db
+from server.database_test import (
+    apply_migrations_to_test,
+    drop_databases_to_test,
+    get_db as get_test_db,
+    shared_db,
+)
 
 app = FastAPI()
 app.include_router(client_router, tags=["user"], prefix="/user")
 app.dependency_overrides[get_db] = get_test_db
 
 
+@app.on_event("startup")
+async def startup_db_client():
+    await apply_migrations_to_test()
+
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     await drop_databases_to_test()
@@ -58,6 +68,20 @@ async def test_create_user_missing_name():
         assert response.status_code == 422
 
 
+@mark.asyncio
+async def test_create_user_duplicated_email():
+    with TestClient(app) as client:
+        client.post(
+            "/user/", json={"name": "Bruna", "email": "teste@gmail.com", "pwd": "265"}
+        )
+        response = client.post(
+            "/user/", json={"name": "Bruno", "email": "TESTE@gmail.com", "pwd": "365"}
+        )
+        assert response.status_code == 201
+        assert validate_model(ProjectErrors, response.json())[2] is None
+        assert response.json().get("error_type") == "create_user"
+
+
 @mark.asyncio
 async def test_get_user():
     with TestClient(app) as client:
@@ -70,6 +94,73 @@ async def test_get_user():
         assert get_user_response.json() == new_user
 
 
+@mark.asyncio
+async def test_get_users_by_ids():
+    with TestClient(app) as client:
+        users = [
+            client.post(
+                "/user/", json={"name": name, "email": email, "pwd": "165"}
+            ).json()
+            for name, email in (
+                ("Joao", "teste2@gmail.com"),
+                ("Jorge", "teste3@gmail.com"),
+            )
+        ]
+        ids = ",".join([users[1].get("_id"), "unexisting", users[0].get("_id")])
+        response = client.get(f"/user/batch?ids={ids}")
+        assert response.status_code == 200
+        assert response.json() == {
+            "items": [users[1], users[0]],
+            "missing_ids": ["unexisting"],
+        }
+
+
+@mark.asyncio
+async def test_get_user_fields():
+    with TestClient(app) as client:
+        new_user = client.post(
+            "/user/", json={"name": "Joao", "email": "teste2@gmail.com", "pwd": "165"}
+        ).json()
+        response = client.get(f"/user/{new_user.get('_id')}?fields=name,email")
+        assert response.status_code == 200
+        assert response.json() == {
+            "_id": new_user.get("_id"),
+            "name": "Joao",
+            "email": "teste2@gmail.com",
+        }
+
+
+@mark.asyncio
+async def test_get_user_unknown_fields():
+    with TestClient(app) as client:
+        new_user = client.post(
+            "/user/", json={"name": "Joao", "email": "teste2@gmail.com", "pwd": "165"}
+        ).json()
+        response = client.get(f"/user/{new_user.get('_id')}?fields=name,salary")
+        assert response.status_code == 400
+        assert (
+            response.json().get("detail").get("error_msg") == "Unknown fields: salary"
+        )
+
+
+@mark.asyncio
+async def test_list_users_by_cursor():
+    with TestClient(app) as client:
+        for email in ("teste5@gmail.com", "teste6@gmail.com", "teste7@gmail.com"):
+            client.post("/user/", json={"name": "Maria", "email": email, "pwd": "465"})
+        first_page = client.get("/user/?page_size=2")
+        assert first_page.status_code == 200
+        assert len(first_page.json().get("items")) == 2
+
+        second_page = client.get(
+            "/user/?page_size=2&cursor=" + first_page.json().get("next_cursor")
+        )
+        assert len(second_page.json().get("items")) == 1
+        assert second_page.json().get("next_cursor") is None
+        emails = [u.get("email") for u in first_page.json().get("items")]
+        assert second_page.json().get("items")[0].get("email") not in emails
+
+
 @mark.asyncio
 async def test_get_user_unexisting():
     with TestClient(app) as client:
@@ -90,6 +181,61 @@ async def test_get_user_emails_by_domain_name():
         get_emails_response = client.get("/user/emails/?domain_name=@hotmail.com")
         assert get_emails_response.status_code == 200
         assert validate_model(ProjectErrors, get_emails_response.json())[2] is not None
+        assert get_emails_response.json().get("emails_count") == 2
+        assert get_emails_response.json().get("next_cursor") is None
+
+
+@mark.asyncio
+async def test_get_user_emails_by_domain_name_pages():
+    with TestClient(app) as client:
+        for n in range(3):
+            client.post(
+                "/user/",
+                json={"name": "Bruna", "email": f"teste{n}@hotmail.com", "pwd": "2"},
+            )
+        first_page = client.get("/user/emails/?domain_name=@hotmail.com&page_size=2")
+        assert first_page.json().get("emails_count") == 3
+        assert first_page.json().get("emails_list") == [
+            "teste0@hotmail.com",
+            "teste1@hotmail.com",
+        ]
+        second_page = client.get(
+            "/user/emails/?domain_name=@hotmail.com&page_size=2&cursor="
+            + first_page.json().get("next_cursor")
+        )
+        assert second_page.json().get("emails_list") == ["teste2@hotmail.com"]
+        assert second_page.json().get("next_cursor") is None
+
+
+@mark.asyncio
+async def test_count_emails_by_domain():
+    with TestClient(app) as client:
+        for name, email in (
+            ("Bruna", "bruna@hotmail.com"),
+            ("Bruno", "bruno@Hotmail.com"),
+            ("Jorge", "jorge@gmail.com"),
+        ):
+            client.post("/user/", json={"name": name, "email": email, "pwd": "265"})
+        response = client.get("/user/emails/domains")
+        assert response.status_code == 200
+        assert response.json() == [
+            {"domain": "hotmail.com", "emails_count": 2},
+            {"domain": "gmail.com", "emails_count": 1},
+        ]
+
+
+@mark.asyncio
+async def test_count_emails_by_domain_without_domain():
+    with TestClient(app) as client:
+        client.post(
+            "/user/", json={"name": "Bruna", "email": "bruna@hotmail.com", "pwd": "265"}
+        )
+        await shared_db.users_collection.insert_one(
+            {"_id": "legacy-user", "name": "Jorge", "email": "jorge@gmail.com"}
+        )
+        response = client.get("/user/emails/domains")
+        assert response.status_code == 200
+        assert response.json() == [{"domain": "hotmail.com", "emails_count": 1}]
 
 
 @mark.asyncio
@@ -102,6 +248,23 @@ async def test_update_user():
         assert response.status_code == 303
 
 
+@mark.asyncio
+async def test_update_user_duplicated_email():
+    with TestClient(app) as client:
+        client.post(
+            "/user/", json={"name": "Jorge", "email": "teste3@gmail.com", "pwd": "465"}
+        )
+        new_user = client.post(
+            "/user/",
+            json={"name": "Jorgina", "email": "teste4@gmail.com", "pwd": "565"},
+        ).json()
+        response = client.put(
+            "/user/" + new_user.get("_id"), json={"email": "Teste3@Gmail.com"}
+        )
+        assert response.status_code == 200
+        assert response.json().get("error_type") == "update_user"
+
+
 @mark.asyncio
 async def test_delete_user():
     with TestClient(app) as client:
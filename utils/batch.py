@@ -0,0 +1,33 @@
+from typing import List
+
+from fastapi import HTTPException, status
+
+MAX_BATCH_IDS = 100
+IDS_DESCRIPTION = f"Comma separated IDs, up to {MAX_BATCH_IDS}"
+
+
+def parse_ids(ids: str) -> List[str]:
+    # repetidos saem uma vez só, na primeira posição em que aparecem
+    parsed_ids = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+    if not parsed_ids or len(parsed_ids) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error_type": "parse_ids",
+                "error_msg": f"Send from 1 to {MAX_BATCH_IDS} IDs",
+            },
+        )
+    return parsed_ids
+
+
+async def find_by_ids(collection, ids: List[str]) -> dict:
+    # um só $in; o banco não garante a ordem, então ela é refeita aqui
+    documents = collection.find({"_id": {"$in": ids}})
+    documents = {
+        document["_id"]: document
+        for document in await documents.to_list(length=len(ids))
+    }
+    return {
+        "items": [documents[i] for i in ids if i in documents],
+        "missing_ids": [i for i in ids if i not in documents],
+    }
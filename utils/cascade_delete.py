@@ -1,4 +1,3 @@
-from bson.objectid import ObjectId
 from fastapi import status
 from fastapi.exceptions import HTTPException
 
@@ -6,7 +5,7 @@ from fastapi.exceptions import HTTPException
 async def delete_all_cart_items(database, cart_id: str):
     try:
         deleted_cart_item = await database.cart_items_collection.delete_many(
-            {"cart._id": cart_id}
+            {"cart_id": cart_id}
         )
         return deleted_cart_item.deleted_count
     except Exception:
@@ -18,22 +17,6 @@ async def delete_all_cart_items(database, cart_id: str):
 
 async def delete_a_cart(database, user_id):
     try:
-        if ObjectId.is_valid(user_id):
-            deleted_cart = await database.cart_collection.delete_one(
-                {
-                    "$or": [
-                        {"$and": [{"user._id": user_id}, {"paid": False}]},
-                        {"$and": [{"user._id": ObjectId(user_id)}, {"paid": False}]},
-                    ]
-                }
-            )
-            if deleted_cart.deleted_count == 1:
-                return {"status": "success", "msg": "Deleted the user cart"}
-            return {
-                "error_type": "delete_cart_item",
-                "error_msg": "Delete error. Contact the administrator",
-            }
-
         deleted_cart = await database.cart_collection.delete_one(
             {"$and": [{"user._id": user_id}, {"paid": False}]}
         )
@@ -0,0 +1,97 @@
+from asyncio import create_task, gather, get_running_loop
+from typing import List
+
+
+class DataLoader:
+    """
+    Loader of documents by _id of one collection, for a single request
+    """
+
+    def __init__(self, collection) -> None:
+        self.collection = collection
+        self._futures = {}
+        self._pending = {}
+        # o loop só guarda referência fraca das tasks: sem esta, o GC pode
+        # recolher o _dispatch e deixar as futures esperando para sempre
+        self._tasks = set()
+
+    async def load(self, key):
+        if (future := self._futures.get(key)) is None:
+            future = self._futures[key] = get_running_loop().create_future()
+            self._pending[key] = future
+            # as buscas feitas antes do próximo ciclo do loop vão no mesmo $in
+            if len(self._pending) == 1:
+                task = create_task(self._dispatch())
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        return await future
+
+    async def load_many(self, keys: List) -> List:
+        return list(await gather(*[self.load(key) for key in keys]))
+
+    def prime(self, key, document) -> None:
+        future = self._futures[key] = get_running_loop().create_future()
+        future.set_result(document)
+
+    def clear(self, key) -> None:
+        self._futures.pop(key, None)
+
+    async def _dispatch(self) -> None:
+        futures, self._pending = self._pending, {}
+        try:
+            documents = self.collection.find({"_id": {"$in": list(futures)}})
+            documents = {
+                document["_id"]: document
+                for document in await documents.to_list(length=len(futures))
+            }
+        except Exception as e:
+            for key, future in futures.items():
+                if self._futures.get(key) is future:
+                    del self._futures[key]
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, future in futures.items():
+            # a requisição que esperava pode ter sido cancelada
+            if not future.done():
+                future.set_result(documents.get(key))
+
+
+class DataLoaders:
+    """
+    DataLoaders of a request, one per collection looked up by _id
+    """
+
+    def __init__(self, database) -> None:
+        self.users = DataLoader(database.users_collection)
+        self.carts = DataLoader(database.cart_collection)
+        self.products = DataLoader(database.product_collection)
+        self.cart_items = DataLoader(database.cart_items_collection)
+
+
+# os models também são chamados fora de uma requisição (migrations, scripts,
+# testes) com o DataBase puro: sem loaders, a busca vai direto na coleção
+LOADER_COLLECTIONS = {
+    "users": "users_collection",
+    "carts": "cart_collection",
+    "products": "product_collection",
+    "cart_items": "cart_items_collection",
+}
+
+
+async def load_by_id(database, loader_name: str, key):
+    if (loaders := getattr(database, "loaders", None)) is None:
+        collection = getattr(database, LOADER_COLLECTIONS[loader_name])
+        return await collection.find_one({"_id": key})
+    return await getattr(loaders, loader_name).load(key)
+
+
+def prime_loader(database, loader_name: str, document) -> None:
+    if (loaders := getattr(database, "loaders", None)) is not None:
+        if document is not None:
+            getattr(loaders, loader_name).prime(document["_id"], document)
+
+
+def clear_loader(database, loader_name: str, key) -> None:
+    if (loaders := getattr(database, "loaders", None)) is not None:
+        getattr(loaders, loader_name).clear(key)
@@ -0,0 +1,45 @@
+from decimal import Decimal
+from os import getenv
+from typing import Any, Type
+
+import orjson
+from bson.objectid import ObjectId
+from dotenv import load_dotenv
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, SecretStr
+
+load_dotenv()
+# opt-in: FAST_JSON=1 no .env troca o encoder padrão pelo orjson
+FAST_JSON = getenv("FAST_JSON", "0") == "1"
+
+
+def orjson_default(value: Any):
+    # o orjson já trata datetime, uuid e dataclasses; o resto segue o jsonable_encoder
+    if isinstance(value, BaseModel):
+        return value.dict(by_alias=True)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (ObjectId, SecretStr)):
+        return str(value)
+    raise TypeError
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered by orjson
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content, default=orjson_default, option=orjson.OPT_NON_STR_KEYS
+        )
+
+
+def model_response(model: Type[BaseModel], content):
+    # sem FAST_JSON (ou com erro) o response_model da rota valida e codifica;
+    # com ele, o documento é validado uma vez e vai direto para o orjson
+    if not FAST_JSON or (isinstance(content, dict) and "error_type" in content):
+        return content
+    if not isinstance(content, BaseModel):
+        content = model.parse_obj(content)
+    return FastJSONResponse(content)
@@ -1,6 +1,6 @@
-async def generate_fake_user(client):
+async def generate_fake_user(client, email="teste@gmail.com"):
     body_client = client.post(
-        "/user/", json={"name": "Bruna", "email": "teste@gmail.com", "pwd": "265"}
+        "/user/", json={"name": "Bruna", "email": email, "pwd": "265"}
     )
     return body_client
 
@@ -0,0 +1,10 @@
+from uuid import uuid4
+
+
+def new_id() -> str:
+    return str(uuid4())
+
+
+def canonical_id(value) -> str:
+    # todos os _id são gravados como string (uuid4); ObjectId/int legados viram str
+    return str(value)
@@ -0,0 +1,61 @@
+from collections import OrderedDict
+from copy import deepcopy
+from time import monotonic
+
+
+class LruTtlCache:
+    """
+    In-process cache with a bounded number of keys (LRU) and a time to live.
+    Values are copied in and out, so callers may change what they get
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < monotonic():
+            if entry is not None:
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        # quem recebe pode mexer (next_cursor, projeção): o cache não muda
+        return deepcopy(entry[1])
+
+    def set(self, key, value) -> None:
+        self._entries[key] = (monotonic() + self.ttl, deepcopy(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key) -> None:
+        self._entries.pop(key, None)
+
+    def invalidate_prefix(self, prefix) -> None:
+        # chaves são tuplas, o primeiro elemento agrupa (ex.: todas as páginas)
+        for key in [k for k in self._entries if k[0] == prefix]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / requests, 4) if requests else 0.0,
+        }
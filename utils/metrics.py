@@ -0,0 +1,286 @@
+"""
+Prometheus text format metrics of the API, kept in plain dicts of the worker.
+
+The event loop is the only writer, so the counters need no locks. With
+METRICS_MULTIPROC_DIR set, each uvicorn worker saves its snapshot to a JSON
+file of that folder every METRICS_FLUSH_INTERVAL seconds, and /metrics sums
+the files of all the workers. A worker removes its file when it stops, and
+files not flushed for a few intervals (killed workers) are left out.
+"""
+from asyncio import CancelledError, create_task, sleep
+from json import dump, load
+from os import getenv, getpid, listdir, path, remove, replace
+from time import time
+
+from dotenv import load_dotenv
+
+from server.timed_collection import mongo_observers
+from utils.request_timing import request_observers
+
+load_dotenv()
+METRICS_MULTIPROC_DIR = getenv("METRICS_MULTIPROC_DIR")
+METRICS_FLUSH_INTERVAL = float(getenv("METRICS_FLUSH_INTERVAL", "5"))
+# arquivo sem flush há esse tanto de intervalos é de um worker que morreu
+METRICS_STALE_FLUSHES = 3
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+class Metric:
+    """
+    Samples of one metric by label values
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def snapshot(self) -> dict:
+        return {"|".join(labels): value for labels, value in self.values.items()}
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float) -> None:
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, *labels, value: float) -> None:
+        # [contagem de cada bucket (não cumulativa), soma, total]
+        if (sample := self.values.get(labels)) is None:
+            sample = self.values[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                sample[0][index] += 1
+                break
+        sample[1] += value
+        sample[2] += 1
+
+
+http_requests = Counter(
+    "http_requests_total",
+    "Requests by route template, method and status",
+    ("method", "route", "status"),
+)
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template",
+    ("method", "route"),
+)
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight", "Requests being served", ("method",)
+)
+mongo_operations = Counter(
+    "mongo_operations_total",
+    "MongoDB operations by collection",
+    ("collection", "operation"),
+)
+mongo_operation_duration = Histogram(
+    "mongo_operation_duration_seconds",
+    "MongoDB operation latency by collection",
+    ("collection", "operation"),
+)
+cache_hits = Counter("cache_hits_total", "Cache hits", ("cache",))
+cache_misses = Counter("cache_misses_total", "Cache misses", ("cache",))
+cache_evictions = Counter("cache_evictions_total", "Cache evictions", ("cache",))
+cache_size = Gauge("cache_size", "Keys in the cache", ("cache",))
+
+METRICS = (
+    http_requests,
+    http_request_duration,
+    http_requests_in_flight,
+    mongo_operations,
+    mongo_operation_duration,
+    cache_hits,
+    cache_misses,
+    cache_evictions,
+    cache_size,
+)
+caches = {}
+
+
+def register_cache(name: str, cache) -> None:
+    # os contadores do LruTtlCache são lidos na hora do snapshot
+    caches[name] = cache
+
+
+class RequestMetrics:
+    def request_started(self, scope) -> None:
+        http_requests_in_flight.inc(scope["method"])
+
+    def request_finished(self, scope, status_code: int, timing) -> None:
+        # sem rota (404) o path não vira label, para não explodir as séries
+        route = timing.route or "unmatched"
+        http_requests_in_flight.dec(scope["method"])
+        http_requests.inc(scope["method"], route, str(status_code))
+        http_request_duration.observe(
+            scope["method"], route, value=timing.durations()["total"]
+        )
+
+
+def observe_mongo(collection_name: str, operation: str, seconds: float) -> None:
+    mongo_operations.inc(collection_name, operation)
+    mongo_operation_duration.observe(collection_name, operation, value=seconds)
+
+
+request_observers.append(RequestMetrics())
+mongo_observers.append(observe_mongo)
+
+
+def snapshot() -> dict:
+    for name, cache in caches.items():
+        stats = cache.stats()
+        cache_hits.values[(name,)] = stats["hits"]
+        cache_misses.values[(name,)] = stats["misses"]
+        cache_evictions.values[(name,)] = stats["evictions"]
+        cache_size.set(name, value=stats["size"])
+    return {metric.name: metric.snapshot() for metric in METRICS}
+
+
+def merge(snapshots) -> dict:
+    merged = {metric.name: {} for metric in METRICS}
+    for worker_snapshot in snapshots:
+        for metric in METRICS:
+            samples = merged[metric.name]
+            for labels, value in worker_snapshot.get(metric.name, {}).items():
+                if labels not in samples:
+                    samples[labels] = value
+                elif isinstance(metric, Histogram):
+                    buckets, total, count = samples[labels]
+                    samples[labels] = [
+                        [a + b for a, b in zip(buckets, value[0])],
+                        total + value[1],
+                        count + value[2],
+                    ]
+                else:
+                    samples[labels] = samples[labels] + value
+    return merged
+
+
+def format_labels(metric: Metric, labels: str, **extra) -> str:
+    values = labels.split("|") if metric.labelnames else []
+    pairs = list(zip(metric.labelnames, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+def render(merged: dict) -> str:
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for labels, value in sorted(merged[metric.name].items()):
+            if not isinstance(metric, Histogram):
+                lines.append(f"{metric.name}{format_labels(metric, labels)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets, value[0]):
+                cumulative += count
+                bucket_labels = format_labels(metric, labels, le=bound)
+                lines.append(f"{metric.name}_bucket{bucket_labels} {cumulative}")
+            inf_labels = format_labels(metric, labels, le="+Inf")
+            lines.append(f"{metric.name}_bucket{inf_labels} {value[2]}")
+            lines.append(f"{metric.name}_sum{format_labels(metric, labels)} {value[1]}")
+            lines.append(
+                f"{metric.name}_count{format_labels(metric, labels)} {value[2]}"
+            )
+
+    # razão calculada depois da soma dos workers, não a média das razões
+    lines.append("# HELP cache_hit_ratio Cache hits / (hits + misses)")
+    lines.append("# TYPE cache_hit_ratio gauge")
+    for labels, hits in sorted(merged[cache_hits.name].items()):
+        requests = hits + merged[cache_misses.name].get(labels, 0)
+        ratio = round(hits / requests, 4) if requests else 0.0
+        lines.append(f"cache_hit_ratio{format_labels(cache_hits, labels)} {ratio}")
+    return "\n".join(lines) + "\n"
+
+
+def worker_file() -> str:
+    return path.join(METRICS_MULTIPROC_DIR, f"metrics_{getpid()}.json")
+
+
+def flush() -> None:
+    # escreve num temporário e troca: quem lê nunca vê um arquivo pela metade
+    temporary_file = f"{worker_file()}.tmp"
+    with open(temporary_file, "w") as metrics_file:
+        dump(snapshot(), metrics_file)
+    replace(temporary_file, worker_file())
+
+
+def collect() -> str:
+    if not METRICS_MULTIPROC_DIR:
+        return render(merge([snapshot()]))
+    flush()
+    snapshots = []
+    stale_before = time() - METRICS_STALE_FLUSHES * METRICS_FLUSH_INTERVAL
+    for file_name in listdir(METRICS_MULTIPROC_DIR):
+        if file_name.startswith("metrics_") and file_name.endswith(".json"):
+            file_path = path.join(METRICS_MULTIPROC_DIR, file_name)
+            try:
+                # worker reiniciado ou de um deploy antigo: não soma mais
+                if path.getmtime(file_path) < stale_before:
+                    continue
+                with open(file_path) as metrics_file:
+                    snapshots.append(load(metrics_file))
+            except (OSError, ValueError):
+                continue
+    return render(merge(snapshots))
+
+
+async def flush_periodically() -> None:
+    try:
+        while True:
+            await sleep(METRICS_FLUSH_INTERVAL)
+            flush()
+    except CancelledError:
+        flush()
+        raise
+
+
+flush_task = None
+
+
+def start_metrics_flush() -> None:
+    global flush_task
+    if METRICS_MULTIPROC_DIR and flush_task is None:
+        flush_task = create_task(flush_periodically())
+
+
+async def stop_metrics_flush() -> None:
+    global flush_task
+    if flush_task is not None:
+        flush_task.cancel()
+        try:
+            await flush_task
+        except CancelledError:
+            pass
+        flush_task = None
+    # o worker parou: os seus números saem da soma dos outros
+    if METRICS_MULTIPROC_DIR:
+        try:
+            remove(worker_file())
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,40 @@
+from json import dumps
+from typing import AsyncIterator
+
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class NdjsonStreamingResponse(StreamingResponse):
+    """
+    Streaming response for generators that are still reading the request body
+    """
+
+    media_type = NDJSON_MEDIA_TYPE
+
+    async def __call__(self, scope, receive, send) -> None:
+        # o StreamingResponse escuta desconexão consumindo o receive, o que
+        # roubaria as mensagens do corpo que o gerador ainda está lendo
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def iter_ndjson_lines(stream: AsyncIterator[bytes]):
+    # os pedaços do corpo não respeitam quebras de linha: guarda o resto
+    line_number = 0
+    pending = b""
+    async for chunk in stream:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield line_number, line
+    if pending.strip():
+        yield line_number + 1, pending
+
+
+def ndjson_line(data: dict) -> str:
+    return dumps(data) + "\n"
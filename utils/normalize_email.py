@@ -0,0 +1,7 @@
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+def email_domain(email: str) -> str:
+    # parte depois do @, já normalizada: buscas por domínio viram igualdade
+    return normalize_email(email).rsplit("@", 1)[-1]
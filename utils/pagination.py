@@ -0,0 +1,44 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as Base64Error
+
+from fastapi import HTTPException, status
+from pymongo import ASCENDING
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(last_id: str) -> str:
+    return urlsafe_b64encode(last_id.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        return urlsafe_b64decode(cursor.encode()).decode()
+    except (Base64Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error_type": "decode_cursor", "error_msg": "Invalid cursor"},
+        )
+
+
+async def find_page(
+    collection,
+    query: dict,
+    cursor: str = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    projection: dict = None,
+):
+    if cursor:
+        after = {"_id": {"$gt": decode_cursor(cursor)}}
+        query = {"$and": [query, after]} if query else after
+    items = (
+        collection.find(query, projection).sort("_id", ASCENDING).limit(page_size + 1)
+    )
+    items = await items.to_list(length=page_size + 1)
+    return {
+        "items": items[:page_size],
+        "next_cursor": encode_cursor(items[page_size - 1]["_id"])
+        if len(items) > page_size
+        else None,
+    }
@@ -0,0 +1,58 @@
+from functools import lru_cache
+from typing import Optional, Type
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, create_model
+
+from schemas.page import Page
+
+FIELDS_DESCRIPTION = "Comma separated fields to return, i.e. name,price"
+
+
+def fields_projection(fields: Optional[str], model: Type[BaseModel]) -> Optional[dict]:
+    if not fields:
+        return None
+    aliases = {}
+    for field in model.__fields__.values():
+        aliases[field.name] = field.alias
+        aliases[field.alias] = field.alias
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    if unknown := [name for name in requested if name not in aliases]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error_type": "fields_projection",
+                "error_msg": f"Unknown fields: {', '.join(unknown)}",
+            },
+        )
+    # o _id sempre vem: identifica o documento e é o cursor das páginas
+    return {"_id": 1, **{aliases[name]: 1 for name in requested}}
+
+
+@lru_cache(maxsize=None)
+def narrowed_model(model: Type[BaseModel], fields: frozenset) -> Type[BaseModel]:
+    # mesmo schema, só com os campos pedidos e todos opcionais
+    return create_model(
+        f"{model.__name__}Fields",
+        **{
+            field.name: (Optional[field.outer_type_], Field(None, alias=field.alias))
+            for field in model.__fields__.values()
+            if field.alias in fields
+        },
+    )
+
+
+def narrowed_response(content, model: Type[BaseModel], projection, page=False):
+    # sem projeção (ou com erro) o response_model da rota valida como sempre
+    if projection is None or not isinstance(content, dict) or "error_type" in content:
+        return content
+    response_model = narrowed_model(model, frozenset(projection))
+    if page:
+        response_model = Page[response_model]
+    return JSONResponse(
+        content=jsonable_encoder(
+            response_model.parse_obj(content), by_alias=True, exclude_unset=True
+        )
+    )
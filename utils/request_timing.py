@@ -0,0 +1,157 @@
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+from time import perf_counter
+from typing import Callable, Optional
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+
+from project_logs.logging import get_logger
+from server.timed_collection import mongo_observers
+
+access_log = get_logger("access")
+# objetos com request_started(scope) e request_finished(scope, status, timing)
+request_observers = []
+
+
+class RequestTiming:
+    """
+    Where the time of one request goes: handler, MongoDB and serialization
+    """
+
+    def __init__(self) -> None:
+        self.start = perf_counter()
+        self.route = None
+        self.handler_end = None
+        self.response_start = None
+        self.end = None
+        self.handler = 0.0
+        self.mongo = 0.0
+        self.mongo_operations = 0
+        # comandos enviados ao servidor, contados pelo CommandListener
+        self.commands = 0
+        self.command_seconds = 0.0
+
+    def add_mongo(self, collection_name: str, operation: str, seconds: float):
+        self.mongo += seconds
+        self.mongo_operations += 1
+
+    def add_command(self, seconds: float) -> None:
+        self.commands += 1
+        self.command_seconds += seconds
+
+    @property
+    def serialization(self) -> float:
+        # do retorno do endpoint até o início da resposta: response_model,
+        # jsonable_encoder e render do response_class
+        if self.handler_end is None or self.response_start is None:
+            return 0.0
+        return max(self.response_start - self.handler_end, 0.0)
+
+    def durations(self) -> dict:
+        until = self.end or self.response_start or perf_counter()
+        return {
+            "total": until - self.start,
+            "app": self.handler,
+            "db": self.mongo,
+            "serialize": self.serialization,
+        }
+
+    def server_timing(self) -> str:
+        return ", ".join(
+            f"{name};dur={seconds * 1000:.2f}"
+            for name, seconds in self.durations().items()
+        )
+
+
+request_timing: ContextVar[Optional[RequestTiming]] = ContextVar(
+    "request_timing", default=None
+)
+
+
+def add_mongo_time(collection_name: str, operation: str, seconds: float) -> None:
+    # o contextvar segue nas tasks criadas pela requisição (ex.: DataLoader)
+    if (timing := request_timing.get()) is not None:
+        timing.add_mongo(collection_name, operation, seconds)
+
+
+mongo_observers.append(add_mongo_time)
+
+
+class TimedRoute(APIRoute):
+    """
+    APIRoute that tells the request timing its template and the handler time
+    """
+
+    def get_route_handler(self) -> Callable:
+        call = self.dependant.call
+        if iscoroutinefunction(call):
+            route_path = self.path
+
+            @wraps(call)
+            async def timed_call(*args, **kwargs):
+                if (timing := request_timing.get()) is None:
+                    return await call(*args, **kwargs)
+                timing.route = route_path
+                start = perf_counter()
+                try:
+                    return await call(*args, **kwargs)
+                finally:
+                    timing.handler_end = perf_counter()
+                    timing.handler += timing.handler_end - start
+
+            self.dependant.call = timed_call
+        return super().get_route_handler()
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware with the Server-Timing header and the access log line
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timing = RequestTiming()
+        token = request_timing.set(timing)
+        status_code = 500
+        for observer in request_observers:
+            observer.request_started(scope)
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                timing.response_start = perf_counter()
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timing.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            timing.end = perf_counter()
+            request_timing.reset(token)
+            for observer in request_observers:
+                observer.request_finished(scope, status_code, timing)
+            access_log.info(
+                {
+                    "event": "access",
+                    "method": scope["method"],
+                    "route": timing.route,
+                    "path": scope["path"],
+                    "status": status_code,
+                    "db_operations": timing.mongo_operations,
+                    "db_commands": timing.commands,
+                    "db_command_ms": round(timing.command_seconds * 1000, 2),
+                    **{
+                        f"{name}_ms": round(seconds * 1000, 2)
+                        for name, seconds in timing.durations().items()
+                    },
+                }
+            )